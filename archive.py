@@ -0,0 +1,258 @@
+
+import argparse
+import glob
+import logging
+import os
+import re
+from datetime import date, timedelta
+
+
+logger = logging.getLogger(__name__)
+
+
+class TransactionArchive:
+    """Closed years of Transactions, moved out of the live database into one file per year.
+
+    The live database keeps only the hot rows, so its tables and indexes stay
+    small enough to live in the page cache. Archive files are attached to a
+    connection only when a query's date range reaches into them, and
+    source() hands back a TEMP view that UNION ALLs the live table with the
+    attached years. Archived rows keep their ids, so ids stay unique across
+    the view.
+
+    The years are recorded in the live database's ArchivedYears table, not
+    taken from the files on disk, so a restored backup brings back its own
+    list: one taken before a year was archived still holds that year's rows
+    and does not read them from the archive file as well.
+    """
+
+    VIEW_NAME = 'TransactionHistory'
+
+    def __init__(self, db, archive_dir=None, hot_months=3, batch_size=50000):
+        self.db = db
+        self.archive_dir = archive_dir or os.path.join(os.path.dirname(os.path.abspath(db.db_name)), 'archive')
+        self.hot_months = hot_months
+        self.batch_size = batch_size
+
+    @property
+    def prefix(self):
+        return os.path.splitext(os.path.basename(self.db.db_name))[0]
+
+    def archive_path(self, year):
+        return os.path.join(self.archive_dir, f'{self.prefix}-transactions-{year}.db')
+
+    @staticmethod
+    def alias(year):
+        return f'archive_{year}'
+
+    def create_schema(self, cursor):
+        """Create ArchivedYears; when it is new, record the archive files already on disk.
+
+        A file only counts when the live table holds no rows of its year;
+        otherwise it was left by an interrupted run (or the database was
+        restored since) and archiving the year again completes it.
+        """
+        created = cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'ArchivedYears'"
+        ).fetchone() is None
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ArchivedYears (
+            year INTEGER PRIMARY KEY,
+            row_count INTEGER NOT NULL,
+            archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
+        if not created:
+            return
+        for year in self.archive_files():
+            live = cursor.execute('SELECT 1 FROM main.Transactions WHERE date >= ? AND date < ? LIMIT 1',
+                                  (f'{year}-01-01', f'{year + 1}-01-01')).fetchone()
+            if live:
+                logger.warning(f"Not using {self.archive_path(year)}: the database still has {year} "
+                               f"transactions, archive the year again")
+                continue
+            cursor.execute('INSERT INTO ArchivedYears (year, row_count) VALUES (?, 0)', (year,))
+
+    def archived_years(self):
+        """Years whose transactions are read from their archive file"""
+        with self.db.get_connection() as conn:
+            return [row[0] for row in conn.execute('SELECT year FROM main.ArchivedYears ORDER BY year')]
+
+    def archive_files(self):
+        """Years with an archive file on disk"""
+        pattern = re.compile(re.escape(self.prefix) + r'-transactions-(\d{4})\.db$')
+        years = []
+        for path in glob.glob(os.path.join(self.archive_dir, f'{self.prefix}-transactions-*.db')):
+            match = pattern.search(os.path.basename(path))
+            if match:
+                years.append(int(match.group(1)))
+        return sorted(years)
+
+    def closed_years(self):
+        """Years still in the live database that ended more than hot_months ago"""
+        last_closed = (date.today() - timedelta(days=31 * self.hot_months)).year - 1
+        with self.db.get_connection() as conn:
+            first = conn.execute('SELECT MIN(date) FROM main.Transactions').fetchone()[0]
+        if not first:
+            return []
+        return list(range(int(first[:4]), last_closed + 1))
+
+    def attach(self, cursor, year):
+        """ATTACH one year's archive to the cursor's connection unless it already is"""
+        attached = {row[1] for row in cursor.execute('PRAGMA database_list').fetchall()}
+        if self.alias(year) not in attached:
+            cursor.execute('ATTACH DATABASE ? AS ' + self.alias(year), (self.archive_path(year),))
+
+    def create_archive_schema(self, cursor, year):
+        """Give an attached archive the live Transactions table and its indexes"""
+        alias = self.alias(year)
+        archived = dict(cursor.execute(f"SELECT name, sql FROM {alias}.sqlite_master WHERE type = 'index'").fetchall())
+        for name, sql in cursor.execute('''
+            SELECT name, sql FROM main.sqlite_master
+            WHERE tbl_name = 'Transactions' AND sql IS NOT NULL
+            ORDER BY type DESC
+        ''').fetchall():
+            if archived.get(name, sql) != sql:
+                # Redefined since this archive was made
+                cursor.execute(f'DROP INDEX {alias}.{name}')
+            sql = re.sub(r'^CREATE TABLE\s+"?Transactions"?',
+                         f'CREATE TABLE IF NOT EXISTS {alias}.Transactions', sql)
+            sql = re.sub(r'^CREATE INDEX\s+(\w+)', rf'CREATE INDEX IF NOT EXISTS {alias}.\1', sql)
+            if sql.startswith(('CREATE TABLE IF NOT EXISTS', 'CREATE INDEX IF NOT EXISTS')):
+                cursor.execute(sql)
+
+    def archive_year(self, year, progress=None):
+        """Move every Transactions row dated in `year` into that year's archive file.
+
+        Rows are first copied to the archive, then the year is recorded in
+        ArchivedYears, and only then deleted from the live database, one id
+        range at a time, so writers are only held up for one short batch.
+        source() reads the year from the live table until it is recorded and
+        from the archive afterwards, so no row is missing or counted twice
+        at any point. WAL commits across attached databases are not atomic
+        as a set; copying with INSERT OR IGNORE and deleting only ids
+        already present in the archive makes an interrupted run safe to
+        repeat. The bulk delete bypasses this connection's AuditLog triggers:
+        archiving moves rows, it does not delete business data.
+        """
+        from database_new_Architecture import Database
+
+        os.makedirs(self.archive_dir, exist_ok=True)
+        start, end = f'{year}-01-01', f'{year + 1}-01-01'
+        alias = self.alias(year)
+        moved = 0
+
+        with self.db.get_connection() as conn:
+            cursor = conn.cursor()
+            self.attach(cursor, year)
+            self.create_archive_schema(cursor, year)
+            conn.commit()
+
+            first, last = cursor.execute(
+                'SELECT MIN(id), MAX(id) FROM main.Transactions WHERE date >= ? AND date < ?', (start, end)
+            ).fetchone()
+            if first is None:
+                return 0
+
+            for low in range(first - 1, last, self.batch_size):
+                high = min(low + self.batch_size, last)
+                cursor.execute(f'''
+                INSERT OR IGNORE INTO {alias}.Transactions
+                SELECT * FROM main.Transactions
+                WHERE id > ? AND id <= ? AND date >= ? AND date < ?
+                ''', (low, high, start, end))
+                conn.commit()
+
+            row_count = cursor.execute(f'SELECT COUNT(*) FROM {alias}.Transactions').fetchone()[0]
+            cursor.execute('''
+            INSERT INTO main.ArchivedYears (year, row_count) VALUES (?, ?)
+            ON CONFLICT(year) DO UPDATE SET row_count = excluded.row_count, archived_at = CURRENT_TIMESTAMP
+            ''', (year, row_count))
+            conn.commit()
+
+            for low in range(first - 1, last, self.batch_size):
+                high = min(low + self.batch_size, last)
+                # The audit triggers are TEMP triggers, so dropping them leaves
+                # every other connection audited
+                cursor.execute('BEGIN IMMEDIATE')
+                Database.drop_audit_triggers(cursor)
+                cursor.execute(f'''
+                DELETE FROM main.Transactions
+                WHERE id IN (SELECT id FROM {alias}.Transactions WHERE id > ? AND id <= ?)
+                ''', (low, high))
+                moved += cursor.rowcount
+                Database.create_audit_triggers(cursor)
+                conn.commit()
+
+                if progress:
+                    progress(year, high - first + 1, last - first + 1)
+
+        logger.info(f"Archived {moved} transactions from {year} to {self.archive_path(year)}")
+        return moved
+
+    def archive_closed_years(self, progress=None):
+        """Archive every closed year; returns {year: rows moved}"""
+        return {year: self.archive_year(year, progress) for year in self.closed_years()}
+
+    def source(self, start_date=None, end_date=None):
+        """Name of the relation to read Transactions from for a date range.
+
+        'Transactions' when the range stays inside the live database, otherwise
+        a TEMP view over the live table and every recorded archive attached to
+        this thread's connection; the live table's rows of those years are
+        left out. Must run on the thread that executes the query.
+        """
+        recorded = self.archived_years()
+        years = [year for year in recorded
+                 if (not start_date or f'{year + 1}-01-01' > str(start_date))
+                 and (not end_date or f'{year}-01-01' <= str(end_date))]
+        if not years:
+            return 'Transactions'
+
+        with self.db.get_connection() as conn:
+            cursor = conn.cursor()
+            for year in years:
+                self.attach(cursor, year)
+            # A year attached before a restore dropped it from ArchivedYears stays out
+            attached = {row[1] for row in cursor.execute('PRAGMA database_list').fetchall()}
+            years = [year for year in recorded if self.alias(year) in attached]
+            live = 'SELECT * FROM main.Transactions WHERE ' + ' AND '.join(
+                f"NOT (date >= '{year}-01-01' AND date < '{year + 1}-01-01')" for year in years
+            )
+            sql = ' UNION ALL '.join([live] + [f'SELECT * FROM {self.alias(year)}.Transactions' for year in years])
+            view = cursor.execute(
+                "SELECT sql FROM temp.sqlite_master WHERE type = 'view' AND name = ?", (self.VIEW_NAME,)
+            ).fetchone()
+            if view is None or not view[0].endswith(sql):
+                cursor.execute(f'DROP VIEW IF EXISTS temp.{self.VIEW_NAME}')
+                cursor.execute(f'CREATE TEMP VIEW {self.VIEW_NAME} AS ' + sql)
+        return self.VIEW_NAME
+
+
+def main(argv=None):
+    from database_new_Architecture import Database
+
+    parser = argparse.ArgumentParser(description="Move closed years of Transactions into yearly archive files")
+    parser.add_argument('--db', default='medicine_warehouse.db', help="database file")
+    parser.add_argument('--dir', help="archive directory (default: 'archive' next to the database)")
+    parser.add_argument('--hot-months', type=int, default=3,
+                        help="keep a year in the live database until it ended this many months ago")
+    parser.add_argument('--year', type=int, action='append', help="archive only this year (repeatable)")
+    parser.add_argument('--vacuum', action='store_true', help="VACUUM the live database afterwards")
+    args = parser.parse_args(argv)
+
+    db = Database(args.db)
+    archive = TransactionArchive(db, archive_dir=args.dir, hot_months=args.hot_months)
+    years = args.year or archive.closed_years()
+    for year in years:
+        print(f"{year}: {archive.archive_year(year)} transactions archived to {archive.archive_path(year)}")
+    if not years:
+        print("No closed years to archive")
+
+    if args.vacuum:
+        with db.get_connection() as conn:
+            conn.execute('VACUUM')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,450 @@
+
+import argparse
+import glob
+import gzip
+import hashlib
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+
+logger = logging.getLogger(__name__)
+
+# Tables rebuilt from AuditLog images by restore_to_point. Transactions and
+# StockAlerts are append-only and are copied over from themselves instead;
+# the only later change to an alert, its resolution, is applied by timestamp.
+REPLAYED_TABLES = ('Medicines', 'Suppliers', 'Users')
+
+# Password hashes are not in the audit images (see AUDIT_SECRET_COLUMNS), so a
+# replayed user keeps its current credentials, or failing that the base
+# backup's, together with the parameters the hash was made with. A user with
+# neither gets an empty hash and must have its password reset.
+CREDENTIAL_COLUMNS = {'Users': ('password_hash', 'salt', 'password_algorithm', 'password_cost')}
+
+
+class BackupManager:
+    """Online backups of the warehouse database.
+
+    The copy is made with sqlite3's Connection.backup() a few pages at a time,
+    sleeping between steps. The source connection holds one read transaction
+    for the whole copy, so under WAL the backup works from a fixed snapshot:
+    writers are never blocked and their commits don't restart the copy
+    (without the pinned snapshot SQLite starts over after every write made
+    through another connection, and a busy till never lets it finish).
+    Each backup is checked with PRAGMA quick_check, gzip-compressed, given a
+    sha256sum-compatible checksum file and rotated so only the newest `keep`
+    backups remain.
+    """
+
+    def __init__(self, db, backup_dir='backups', keep=14, pages=16, sleep=0.005):
+        self.db = db
+        self.backup_dir = backup_dir
+        self.keep = keep
+        self.pages = pages
+        self.sleep = sleep
+        self.lock = threading.Lock()
+
+    @property
+    def prefix(self):
+        return os.path.splitext(os.path.basename(self.db.db_name))[0]
+
+    def create_backup(self, progress=None):
+        """Back up the live database and return the path of the compressed copy.
+
+        `progress(remaining_pages, total_pages)` is called after every step.
+        """
+        with self.lock:
+            os.makedirs(self.backup_dir, exist_ok=True)
+            stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+            raw_path = os.path.join(self.backup_dir, f'.{self.prefix}-{stamp}.db.tmp')
+            backup_path = os.path.join(self.backup_dir, f'{self.prefix}-{stamp}.db.gz')
+
+            started = time.perf_counter()
+            try:
+                self.copy_database(raw_path, progress)
+                self.check_database(raw_path)
+                checksum = self.compress(raw_path, backup_path)
+            finally:
+                if os.path.exists(raw_path):
+                    os.remove(raw_path)
+
+            with open(backup_path + '.sha256', 'w') as f:
+                f.write(f'{checksum}  {os.path.basename(backup_path)}\n')
+
+            logger.info(f"Backup {backup_path} created in {time.perf_counter() - started:.1f}s")
+            self.rotate()
+            return backup_path
+
+    def copy_database(self, target_path, progress=None):
+        source = sqlite3.connect(self.db.db_name, isolation_level=None)
+        target = sqlite3.connect(target_path)
+        try:
+            def on_step(status, remaining, total):
+                if progress:
+                    progress(remaining, total)
+                # backup() itself only sleeps when the source is busy, so
+                # yield here to keep the copy from starving the UI thread
+                time.sleep(self.sleep)
+
+            # Pin the snapshot: the read transaction stays open across steps
+            source.execute('BEGIN')
+            source.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()
+            source.backup(target, pages=self.pages, progress=on_step)
+            source.execute('COMMIT')
+        finally:
+            target.close()
+            source.close()
+
+    @staticmethod
+    def check_database(path):
+        conn = sqlite3.connect(path)
+        try:
+            result = conn.execute('PRAGMA quick_check').fetchone()[0]
+        finally:
+            conn.close()
+        if result != 'ok':
+            raise sqlite3.DatabaseError(f"Backup copy failed integrity check: {result}")
+
+    def compress(self, raw_path, backup_path, chunk_size=64 * 1024):
+        """gzip raw_path into backup_path and return the SHA-256 of the compressed file"""
+        partial_path = backup_path + '.partial'
+        with open(raw_path, 'rb') as source, open(partial_path, 'wb') as target:
+            digest = HashingWriter(target)
+            with gzip.GzipFile(filename=os.path.basename(raw_path), mode='wb',
+                               compresslevel=6, fileobj=digest) as gz:
+                for chunk in iter(lambda: source.read(chunk_size), b''):
+                    gz.write(chunk)
+                    time.sleep(self.sleep)
+        os.replace(partial_path, backup_path)
+        return digest.hexdigest()
+
+    def list_backups(self):
+        """Backups on disk, newest first"""
+        pattern = os.path.join(self.backup_dir, f'{self.prefix}-*.db.gz')
+        backups = []
+        for path in sorted(glob.glob(pattern), reverse=True):
+            stamp = os.path.basename(path)[len(self.prefix) + 1:-len('.db.gz')]
+            try:
+                created = datetime.strptime(stamp, '%Y%m%d-%H%M%S')
+            except ValueError:
+                continue
+            backups.append({'path': path, 'created': created, 'size': os.path.getsize(path)})
+        return backups
+
+    def latest_backup(self):
+        backups = self.list_backups()
+        return backups[0] if backups else None
+
+    def rotate(self):
+        for backup in self.list_backups()[self.keep:]:
+            for path in (backup['path'], backup['path'] + '.sha256'):
+                if os.path.exists(path):
+                    os.remove(path)
+            logger.info(f"Rotated out old backup {backup['path']}")
+
+    def verify_backup(self, path):
+        """Check a backup file against its recorded checksum"""
+        checksum_path = path + '.sha256'
+        if not os.path.exists(checksum_path):
+            raise FileNotFoundError(f"No checksum recorded for {path}")
+        with open(checksum_path) as f:
+            expected = f.read().split()[0]
+
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest() == expected
+
+    def extract_backup(self, path, target_path):
+        """Verify and decompress a backup to target_path"""
+        if not self.verify_backup(path):
+            raise ValueError(f"Checksum mismatch, refusing to use {path}")
+        with gzip.open(path, 'rb') as source, open(target_path, 'wb') as target:
+            shutil.copyfileobj(source, target, 1024 * 1024)
+        self.check_database(target_path)
+
+    def restore_backup(self, path=None):
+        """Restore the live database from a backup (the latest one by default).
+
+        The current database is backed up first, and the restored pages are
+        written into the live file through the backup API, so open
+        connections simply see the restored contents on their next query.
+        """
+        if path is None:
+            latest = self.latest_backup()
+            if latest is None:
+                raise FileNotFoundError(f"No backups found in {self.backup_dir}")
+            path = latest['path']
+
+        raw_path = os.path.join(self.backup_dir, '.restore.db.tmp')
+        try:
+            self.extract_backup(path, raw_path)
+            self.upgrade_database(raw_path)
+            self.replace_live_database(raw_path)
+        finally:
+            if os.path.exists(raw_path):
+                os.remove(raw_path)
+
+        logger.info(f"Database restored from {path}")
+        return path
+
+    def upgrade_database(self, raw_path):
+        """Bring an extracted backup up to the current schema.
+
+        A backup older than ArchivedYears gets it filled from the live
+        database's archive files first; its own path has none next to it.
+        """
+        from archive import TransactionArchive
+        from database_new_Architecture import Database
+
+        conn = sqlite3.connect(raw_path)
+        try:
+            TransactionArchive(self.db).create_schema(conn.cursor())
+            conn.commit()
+        finally:
+            conn.close()
+        Database(raw_path).close_connection()
+
+    def replace_live_database(self, raw_path):
+        """Overwrite the live database with raw_path, keeping a safety backup of the current state"""
+        safety_backup = self.create_backup()
+        logger.info(f"Current database saved to {safety_backup} before restore")
+
+        with self.lock:
+            source = sqlite3.connect(raw_path)
+            target = sqlite3.connect(self.db.db_name, timeout=30)
+            try:
+                source.backup(target)
+            finally:
+                target.close()
+                source.close()
+
+    def base_backup_for(self, until):
+        """Newest backup taken at or before `until` (local time)"""
+        for backup in self.list_backups():
+            if backup['created'] <= until:
+                return backup
+        return None
+
+    def restore_to_point(self, until, batch_size=20000, progress=None):
+        """Restore the database as it was at `until` (a naive local datetime).
+
+        The newest base backup taken before `until` is extracted, then the
+        live database's AuditLog and append-only tables are replayed onto it
+        up to that moment, `batch_size` ids per statement, and the result
+        replaces the live database. Audit entries are applied set-wise:
+        within a batch only the last image of each record is written.
+        `progress(rows_done, rows_total)` is called after every batch.
+        """
+        from valuation import InventoryValuation
+
+        base = self.base_backup_for(until)
+        if base is None:
+            raise FileNotFoundError(f"No backup in {self.backup_dir} was taken before {until:%Y-%m-%d %H:%M:%S}")
+
+        # Timestamps in the database are CURRENT_TIMESTAMP, i.e. UTC
+        until_utc = until.astimezone(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        raw_path = os.path.join(self.backup_dir, '.pitr.db.tmp')
+        started = time.perf_counter()
+        try:
+            self.extract_backup(base['path'], raw_path)
+            # Bring an older base up to the current schema before replaying into it
+            self.upgrade_database(raw_path)
+
+            conn = sqlite3.connect(raw_path)
+            try:
+                cursor = conn.cursor()
+                # A plain connection has no audit triggers, so the replay is not logged again
+                cursor.execute('ATTACH DATABASE ? AS live', (self.db.db_name,))
+
+                # Replay range per table: everything after the base, up to `until`
+                ranges = []
+                # Thumbnails are not copied; ThumbnailService.backfill remakes them
+                for table, time_column in (('AuditLog', 'timestamp'), ('Transactions', 'date'),
+                                           ('StockAlerts', 'created_at'), ('MedicineImages', 'created_at')):
+                    first = cursor.execute(f'SELECT COALESCE(MAX(id), 0) FROM main.{table}').fetchone()[0]
+                    # Rows are appended in time order, so walk back from the newest
+                    last = cursor.execute(f'SELECT id FROM live.{table} WHERE {time_column} <= ? '
+                                          f'ORDER BY id DESC LIMIT 1', (until_utc,)).fetchone()
+                    last = last[0] if last else 0
+                    ranges.append((table, time_column, first, max(first, last)))
+
+                # Alerts in the base resolved by `until`; done first, so a copied
+                # alert never meets an open one of the same type
+                cursor.execute('''
+                UPDATE main.StockAlerts SET is_resolved = 1, resolved_at = l.resolved_at
+                FROM live.StockAlerts l
+                WHERE l.id = StockAlerts.id AND StockAlerts.is_resolved = 0
+                  AND l.is_resolved = 1 AND l.resolved_at <= :until
+                ''', {'until': until_utc})
+
+                total = sum(last - first for _, _, first, last in ranges)
+                done = 0
+                for table, time_column, first, last in ranges:
+                    columns = [row[1] for row in cursor.execute(f'PRAGMA main.table_info({table})').fetchall()]
+                    # An alert resolved after `until` was still open then
+                    still_open = {'is_resolved': '0', 'resolved_at': 'NULL'} if table == 'StockAlerts' else {}
+                    values = [f'CASE WHEN resolved_at <= :until THEN {column} ELSE {still_open[column]} END'
+                              if column in still_open else column for column in columns]
+                    for low in range(first, last, batch_size):
+                        high = min(low + batch_size, last)
+                        if table == 'AuditLog':
+                            for replayed in REPLAYED_TABLES:
+                                self.apply_audit_batch(cursor, replayed, low, high)
+                        cursor.execute(f'''
+                        INSERT INTO main.{table} ({', '.join(columns)})
+                        SELECT {', '.join(values)} FROM live.{table}
+                        WHERE id > :low AND id <= :high AND {time_column} <= :until
+                        ''', {'low': low, 'high': high, 'until': until_utc})
+                        done += high - low
+                        if progress:
+                            progress(done, total)
+
+                # INSERT OR REPLACE deletes without firing the delete triggers, so the
+                # replayed Medicines rows were added to InventoryValue on top of the old
+                InventoryValuation.rebuild(cursor)
+                conn.commit()
+                cursor.execute('DETACH DATABASE live')
+            finally:
+                conn.close()
+
+            self.check_database(raw_path)
+            self.replace_live_database(raw_path)
+        finally:
+            if os.path.exists(raw_path):
+                os.remove(raw_path)
+
+        logger.info(f"Database restored to {until:%Y-%m-%d %H:%M:%S} from {base['path']} "
+                    f"plus {total} logged rows in {time.perf_counter() - started:.1f}s")
+        return base['path']
+
+    @staticmethod
+    def apply_audit_batch(cursor, table, low, high):
+        """Write the last audited image of each `table` record changed in AuditLog ids (low, high]"""
+        from database_new_Architecture import AUDIT_SECRET_COLUMNS
+
+        columns = [row[1] for row in cursor.execute(f'PRAGMA main.table_info({table})').fetchall()]
+        values = []
+        for column in columns:
+            value = f"json_extract(new_values, '$.{column}')"
+            if column in CREDENTIAL_COLUMNS.get(table, ()):
+                logged = "''" if column in AUDIT_SECRET_COLUMNS.get(table, ()) else value
+                value = (f'COALESCE((SELECT {column} FROM live.{table} WHERE id = record_id), '
+                         f'(SELECT {column} FROM main.{table} WHERE id = record_id), {logged})')
+            values.append(value)
+        latest = '''
+            SELECT MAX(id) FROM live.AuditLog
+            WHERE id > ? AND id <= ? AND table_name = ?
+            GROUP BY record_id
+        '''
+        cursor.execute(f'''
+        DELETE FROM main.{table} WHERE id IN (
+            SELECT record_id FROM live.AuditLog
+            WHERE id IN ({latest}) AND action = 'DELETE'
+        )
+        ''', (low, high, table))
+        cursor.execute(f'''
+        INSERT OR REPLACE INTO main.{table} ({', '.join(columns)})
+        SELECT {', '.join(values)}
+        FROM live.AuditLog
+        WHERE id IN ({latest}) AND action != 'DELETE'
+        ''', (low, high, table))
+
+
+class HashingWriter:
+    """File wrapper that hashes everything written through it"""
+
+    def __init__(self, file):
+        self.file = file
+        self.digest = hashlib.sha256()
+
+    def write(self, data):
+        self.digest.update(data)
+        return self.file.write(data)
+
+    def flush(self):
+        self.file.flush()
+
+    def hexdigest(self):
+        return self.digest.hexdigest()
+
+
+class BackupScheduler:
+    """Background thread that takes a backup once per interval, waiting for an idle moment.
+
+    `is_idle()` is polled from the worker thread, so it must only read plain
+    Python state (no Tk calls).
+    """
+
+    def __init__(self, manager, is_idle=lambda: True, interval=timedelta(hours=24), check_seconds=60):
+        self.manager = manager
+        self.is_idle = is_idle
+        self.interval = interval
+        self.check_seconds = check_seconds
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, name='backup-scheduler', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def backup_due(self):
+        latest = self.manager.latest_backup()
+        return latest is None or datetime.now() - latest['created'] >= self.interval
+
+    def run(self):
+        while not self.stop_event.wait(self.check_seconds):
+            try:
+                if self.backup_due() and self.is_idle():
+                    self.manager.create_backup()
+            except Exception as e:
+                logger.error(f"Scheduled backup failed: {e}")
+
+
+def main(argv=None):
+    from database_new_Architecture import Database
+
+    parser = argparse.ArgumentParser(description="Back up or restore the medicine warehouse database")
+    parser.add_argument('command', choices=['backup', 'list', 'verify', 'restore'])
+    parser.add_argument('file', nargs='?', help="backup file for verify/restore (default: latest)")
+    parser.add_argument('--db', default='medicine_warehouse.db', help="database file")
+    parser.add_argument('--dir', default='backups', help="backup directory")
+    parser.add_argument('--keep', type=int, default=14, help="number of backups to keep")
+    parser.add_argument('--until', type=datetime.fromisoformat,
+                        help="restore: replay the audit log up to this local time, e.g. '2024-05-01 13:59'")
+    args = parser.parse_args(argv)
+
+    manager = BackupManager(Database(args.db), backup_dir=args.dir, keep=args.keep)
+
+    if args.command == 'backup':
+        print(manager.create_backup())
+    elif args.command == 'list':
+        for backup in manager.list_backups():
+            print(f"{backup['created']:%Y-%m-%d %H:%M:%S}  {backup['size']:>12,}  {backup['path']}")
+    elif args.command == 'verify':
+        path = args.file or (manager.latest_backup() or {}).get('path')
+        if not path:
+            parser.error("no backups found")
+        ok = manager.verify_backup(path)
+        print(f"{path}: {'OK' if ok else 'CHECKSUM MISMATCH'}")
+        raise SystemExit(0 if ok else 1)
+    elif args.command == 'restore' and args.until:
+        base = manager.restore_to_point(args.until)
+        print(f"Restored to {args.until:%Y-%m-%d %H:%M:%S} from {base}")
+    elif args.command == 'restore':
+        print(f"Restored from {manager.restore_backup(args.file)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,296 @@
+
+import argparse
+import logging
+import time
+from collections import defaultdict, deque
+
+
+logger = logging.getLogger(__name__)
+
+
+class CostLedger:
+    """FIFO inventory cost layers and the cost of goods sold, kept by triggers.
+
+    Every incoming transaction opens a CostLayers row at its unit_price (the
+    purchase cost). Every outgoing transaction consumes the oldest open
+    layers of its medicine, recording what it took in CostAllocations, and
+    adds its revenue and COGS to that day's DailyProfit row. The triggers
+    run inside the posting transaction, so the ledger is updated
+    incrementally by whatever inserts a Transactions row: Stock Operations,
+    imports or BackupManager.restore_to_point. Nothing is recomputed from
+    history, and any period's P&L is a sum over at most one row per day.
+
+    A sale larger than the open layers is costed, for the shortfall, at the
+    medicine's most recent layer cost, or at its sale price when it has
+    never been received; those allocations have no layer_id.
+    """
+
+    TABLES = ('CostLayers', 'CostAllocations', 'DailyProfit')
+
+    def __init__(self, db):
+        self.db = db
+
+    @staticmethod
+    def create_schema(cursor):
+        """Create the ledger tables and triggers; True if they did not exist yet"""
+        created = cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'CostLayers'"
+        ).fetchone() is None
+
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS CostLayers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            medicine_id INTEGER NOT NULL,
+            transaction_id INTEGER NOT NULL,
+            received_at TIMESTAMP NOT NULL,
+            unit_cost FLOAT NOT NULL,
+            quantity INTEGER NOT NULL,
+            remaining INTEGER NOT NULL CHECK (remaining >= 0),
+            FOREIGN KEY (medicine_id) REFERENCES Medicines(id),
+            FOREIGN KEY (transaction_id) REFERENCES Transactions(id)
+        )
+        ''')
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS CostAllocations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            transaction_id INTEGER NOT NULL,
+            medicine_id INTEGER NOT NULL,
+            layer_id INTEGER,
+            quantity INTEGER NOT NULL,
+            unit_cost FLOAT NOT NULL,
+            FOREIGN KEY (transaction_id) REFERENCES Transactions(id),
+            FOREIGN KEY (layer_id) REFERENCES CostLayers(id)
+        )
+        ''')
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS DailyProfit (
+            day DATE PRIMARY KEY,
+            sales_count INTEGER NOT NULL DEFAULT 0,
+            quantity_sold INTEGER NOT NULL DEFAULT 0,
+            revenue FLOAT NOT NULL DEFAULT 0,
+            cogs FLOAT NOT NULL DEFAULT 0,
+            purchases FLOAT NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+        ''')
+        # The open layers stay few per medicine however long the history gets
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_cost_layers_open ON CostLayers(medicine_id, id) '
+                       'WHERE remaining > 0')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_cost_layers_medicine ON CostLayers(medicine_id, id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_cost_allocations_transaction '
+                       'ON CostAllocations(transaction_id)')
+
+        # Recreated every time, so a database keeps no older version of the rules
+        cursor.execute('DROP TRIGGER IF EXISTS cost_layers_incoming')
+        cursor.execute('''
+        CREATE TRIGGER cost_layers_incoming
+        AFTER INSERT ON Transactions
+        WHEN NEW.transaction_type = 'incoming'
+        BEGIN
+            INSERT INTO CostLayers (medicine_id, transaction_id, received_at, unit_cost, quantity, remaining)
+            VALUES (NEW.medicine_id, NEW.id, NEW.date,
+                    COALESCE(NEW.unit_price, NEW.total_amount / NEW.quantity, 0), NEW.quantity, NEW.quantity);
+
+            INSERT INTO DailyProfit (day, purchases)
+            VALUES (substr(NEW.date, 1, 10), COALESCE(NEW.total_amount, NEW.quantity * NEW.unit_price, 0))
+            ON CONFLICT(day) DO UPDATE SET purchases = purchases + excluded.purchases;
+        END
+        ''')
+        # Window functions are allowed in trigger bodies, WITH clauses are not
+        cursor.execute('DROP TRIGGER IF EXISTS cost_layers_outgoing')
+        cursor.execute('''
+        CREATE TRIGGER cost_layers_outgoing
+        AFTER INSERT ON Transactions
+        WHEN NEW.transaction_type = 'outgoing'
+        BEGIN
+            -- Take from the oldest open layers until the quantity is covered
+            INSERT INTO CostAllocations (transaction_id, medicine_id, layer_id, quantity, unit_cost)
+            SELECT NEW.id, NEW.medicine_id, id, MIN(remaining, NEW.quantity - taken_before), unit_cost
+            FROM (
+                SELECT id, remaining, unit_cost,
+                       SUM(remaining) OVER (ORDER BY id) - remaining AS taken_before
+                FROM CostLayers
+                WHERE medicine_id = NEW.medicine_id AND remaining > 0
+            )
+            WHERE taken_before < NEW.quantity;
+
+            -- Any shortfall, at the most recent cost known for the medicine
+            INSERT INTO CostAllocations (transaction_id, medicine_id, layer_id, quantity, unit_cost)
+            SELECT NEW.id, NEW.medicine_id, NULL, NEW.quantity - covered,
+                   COALESCE((SELECT unit_cost FROM CostLayers WHERE medicine_id = NEW.medicine_id
+                             ORDER BY id DESC LIMIT 1), NEW.unit_price, 0)
+            FROM (SELECT COALESCE(SUM(quantity), 0) AS covered FROM CostAllocations
+                  WHERE transaction_id = NEW.id)
+            WHERE covered < NEW.quantity;
+
+            UPDATE CostLayers
+            SET remaining = remaining - (SELECT quantity FROM CostAllocations
+                                         WHERE transaction_id = NEW.id AND layer_id = CostLayers.id)
+            WHERE id IN (SELECT layer_id FROM CostAllocations WHERE transaction_id = NEW.id);
+
+            INSERT INTO DailyProfit (day, sales_count, quantity_sold, revenue, cogs)
+            VALUES (substr(NEW.date, 1, 10), 1, NEW.quantity,
+                    COALESCE(NEW.total_amount, NEW.quantity * NEW.unit_price, 0),
+                    (SELECT COALESCE(SUM(quantity * unit_cost), 0) FROM CostAllocations
+                     WHERE transaction_id = NEW.id))
+            ON CONFLICT(day) DO UPDATE SET
+                sales_count = sales_count + 1,
+                quantity_sold = quantity_sold + excluded.quantity_sold,
+                revenue = revenue + excluded.revenue,
+                cogs = cogs + excluded.cogs;
+        END
+        ''')
+        return created
+
+    @staticmethod
+    def rebuild(cursor, source='Transactions', batch_size=10000):
+        """Replay every transaction in source, by id, into empty ledger tables.
+
+        For databases that predate the ledger. Same rules as the triggers, in
+        one pass that keeps only the open layers in memory; layers are
+        written once their final remaining quantity is known.
+        tests/test_costing.py checks that both give the same ledger.
+        """
+        started = time.perf_counter()
+        for table in CostLedger.TABLES:
+            cursor.execute(f'DELETE FROM {table}')
+        cursor.execute("DELETE FROM sqlite_sequence WHERE name IN ('CostLayers', 'CostAllocations')")
+
+        open_layers = defaultdict(deque)  # medicine_id -> [layer row as a list], oldest first
+        last_cost = {}
+        closed_layers = []
+        allocations = []
+        days = defaultdict(lambda: [0, 0, 0.0, 0.0, 0.0])
+        next_layer_id = 1
+        movements = 0
+
+        def flush(final=False):
+            if final:
+                for layers in open_layers.values():
+                    closed_layers.extend(layers)
+            cursor.executemany('''
+            INSERT INTO CostLayers (id, medicine_id, transaction_id, received_at, unit_cost, quantity, remaining)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', closed_layers)
+            cursor.executemany('''
+            INSERT INTO CostAllocations (transaction_id, medicine_id, layer_id, quantity, unit_cost)
+            VALUES (?, ?, ?, ?, ?)
+            ''', allocations)
+            closed_layers.clear()
+            allocations.clear()
+
+        # A cursor of its own, since the batches are written while it is read
+        rows = cursor.connection.execute(f'''
+        SELECT id, medicine_id, transaction_type, quantity, unit_price, total_amount, date
+        FROM {source} ORDER BY id
+        ''')
+        for transaction_id, medicine_id, transaction_type, quantity, unit_price, total_amount, date in rows:
+            movements += 1
+            amount = total_amount if total_amount is not None else quantity * (unit_price or 0)
+            day = days[date[:10]]
+            if transaction_type == 'incoming':
+                if unit_price is not None:
+                    unit_cost = unit_price
+                else:
+                    # SQL's division by zero is NULL, which the trigger turns into 0
+                    unit_cost = (total_amount or 0) / quantity if quantity else 0
+                layer = [next_layer_id, medicine_id, transaction_id, date, unit_cost, quantity, quantity]
+                # The trigger only ever takes from layers with remaining > 0
+                (open_layers[medicine_id] if quantity > 0 else closed_layers).append(layer)
+                last_cost[medicine_id] = unit_cost
+                next_layer_id += 1
+                day[4] += amount
+                continue
+
+            needed = quantity
+            cogs = 0.0
+            layers = open_layers[medicine_id]
+            while needed and layers:
+                layer = layers[0]
+                taken = min(layer[6], needed)
+                layer[6] -= taken
+                needed -= taken
+                cogs += taken * layer[4]
+                allocations.append((transaction_id, medicine_id, layer[0], taken, layer[4]))
+                if layer[6] == 0:
+                    closed_layers.append(layers.popleft())
+            if needed:
+                unit_cost = last_cost.get(medicine_id, unit_price or 0)
+                cogs += needed * unit_cost
+                allocations.append((transaction_id, medicine_id, None, needed, unit_cost))
+            day[0] += 1
+            day[1] += quantity
+            day[2] += amount
+            day[3] += cogs
+
+            if len(allocations) >= batch_size:
+                flush()
+        rows.close()
+
+        flush(final=True)
+        cursor.execute("UPDATE sqlite_sequence SET seq = ? WHERE name = 'CostLayers'", (next_layer_id - 1,))
+        if cursor.rowcount == 0 and next_layer_id > 1:
+            cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('CostLayers', ?)", (next_layer_id - 1,))
+        cursor.executemany('''
+        INSERT INTO DailyProfit (day, sales_count, quantity_sold, revenue, cogs, purchases)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ''', [(day,) + tuple(totals) for day, totals in days.items()])
+        logger.info(f"Cost ledger rebuilt from {movements} transactions in {time.perf_counter() - started:.1f}s")
+        return movements
+
+    def open_layers(self, medicine_id):
+        """A medicine's layers still holding stock, oldest first"""
+        with self.db.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+            SELECT id, transaction_id, received_at, unit_cost, quantity, remaining
+            FROM CostLayers WHERE medicine_id = ? AND remaining > 0 ORDER BY id
+            ''', (medicine_id,))
+            return cursor.fetchall()
+
+    def transaction_cogs(self, transaction_id):
+        """Cost of goods sold of one outgoing transaction"""
+        with self.db.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT COALESCE(SUM(quantity * unit_cost), 0) FROM CostAllocations '
+                           'WHERE transaction_id = ?', (transaction_id,))
+            return cursor.fetchone()[0]
+
+
+def main(argv=None):
+    from database_new_Architecture import Database
+    from archive import TransactionArchive
+
+    parser = argparse.ArgumentParser(description="Inspect or rebuild the FIFO cost ledger")
+    parser.add_argument('command', choices=['show', 'rebuild'])
+    parser.add_argument('--db', default='medicine_warehouse.db', help="database file")
+    parser.add_argument('--medicine', type=int, help="show: list this medicine's open layers")
+    args = parser.parse_args(argv)
+
+    db = Database(args.db)
+    ledger = CostLedger(db)
+    if args.command == 'rebuild':
+        with db.get_connection() as conn:
+            cursor = conn.cursor()
+            # Stock Operations waits rather than posting into a half-built ledger
+            cursor.execute('BEGIN IMMEDIATE')
+            movements = ledger.rebuild(cursor, TransactionArchive(db).source())
+            conn.commit()
+        print(f"Rebuilt from {movements} transactions")
+
+    if args.medicine:
+        for layer in ledger.open_layers(args.medicine):
+            print(f"  layer {layer['id']}: {layer['remaining']}/{layer['quantity']} at "
+                  f"{layer['unit_cost']:.2f}, received {layer['received_at']}")
+    with db.get_connection() as conn:
+        layers, units, value = conn.execute('''
+            SELECT COUNT(*), COALESCE(SUM(remaining), 0), COALESCE(SUM(remaining * unit_cost), 0)
+            FROM CostLayers WHERE remaining > 0
+        ''').fetchone()
+        revenue, cogs = conn.execute('SELECT COALESCE(SUM(revenue), 0), COALESCE(SUM(cogs), 0) '
+                                     'FROM DailyProfit').fetchone()
+    print(f"{layers} open layers holding {units} units at cost {value:,.2f}")
+    print(f"All-time revenue {revenue:,.2f}, COGS {cogs:,.2f}, gross profit {revenue - cogs:,.2f}")
+
+
+if __name__ == '__main__':
+    main()
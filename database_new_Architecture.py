@@ -1,42 +1,105 @@
 
 import sqlite3
 import hashlib
+import os
+import json
 import logging
+import threading
 from datetime import datetime, timedelta
 from tkinter import messagebox
 from contextlib import contextmanager
+from archive import TransactionArchive
+from costing import CostLedger
+from valuation import InventoryValuation
+from passwords import PasswordHasher
 
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Stock status of a Medicines row. Shared by the report query and the expression
+# index on Medicines, so it must stay textually identical in both places.
+STOCK_STATUS_SQL = ("CASE WHEN quantity <= minimum_stock THEN 'LOW' "
+                    "WHEN quantity >= maximum_stock THEN 'OVERSTOCKED' "
+                    "ELSE 'NORMAL' END")
+
+# Tables whose row changes are captured in AuditLog by triggers (see
+# Database.create_audit_triggers). The new_values images double as the change
+# journal replayed by BackupManager.restore_to_point. The triggers are TEMP
+# triggers of the application's own connections, so writes made through any
+# other connection (the sqlite3 shell, a script) are neither audited nor
+# replayed by a point-in-time restore.
+AUDITED_TABLES = ('Medicines', 'Suppliers', 'Users', 'Transactions')
+
+# Columns kept out of the AuditLog images. The audit screen is open to
+# accountants, so password hashes and salts are never written there: an update
+# that changes them records CHANGED_MARKER instead of the value.
+AUDIT_SECRET_COLUMNS = {'Users': ('password_hash', 'salt')}
+CHANGED_MARKER = '<changed>'
+
+# Updates that change only these columns are not audited (every login sets last_login)
+AUDIT_UNLOGGED_COLUMNS = {'Users': ('last_login',)}
+
+# Order in which open lots are used: first expiry first out, lots without an
+# expiry date last. idx_medicine_lots_open returns rows in this order.
+LOT_ORDER = 'expiry_date NULLS LAST, id'
+
+
 class Database:
-    def __init__(self, db_name='medicine_warehouse.db'):
+    def __init__(self, db_name='medicine_warehouse.db', setup=True):
         self.db_name = db_name
-        self.setup_database()
+        self.acting_user_id = None  # recorded in AuditLog.user_id, set at login
+        self.local = threading.local()
+        if setup:
+            self.setup_database()
 
     def connect_db(self):
         conn = sqlite3.connect(self.db_name)
+        self.register_audit_functions(conn)
         cursor = conn.cursor()
         return conn, cursor
 
     @contextmanager
     def get_connection(self):
-        """Context manager for database connections"""
-        conn = None
-        try:
+        """Context manager for database connections.
+
+        Each thread keeps one open connection: opening a connection re-parses
+        the whole schema, audit triggers included, which cost more than the
+        small writes themselves. Work left uncommitted when the outermost
+        block exits is rolled back, as closing the connection used to do.
+
+        Nested blocks on one thread therefore share a connection and its
+        transaction: a commit in an inner block commits the outer block's
+        writes too, and an error in an inner block rolls nothing back until
+        the outermost block exits. Callers that nest (create_default_admin,
+        update_stock) commit their own work before calling in.
+        """
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
             conn = sqlite3.connect(self.db_name)
             conn.row_factory = sqlite3.Row  # Enable column access by name
+            self.register_audit_functions(conn)
+            self.local.conn = conn
+            self.local.depth = 0
+
+        self.local.depth += 1
+        try:
             yield conn
         except sqlite3.Error as e:
-            if conn:
-                conn.rollback()
             logger.error(f"Database error: {e}")
             raise
         finally:
-            if conn:
-                conn.close()
+            self.local.depth -= 1
+            if self.local.depth == 0 and conn.in_transaction:
+                conn.rollback()
+
+    def close_connection(self):
+        """Close the calling thread's connection"""
+        conn = getattr(self.local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self.local.conn = None
 
     def setup_database(self):
         """Initialize database with all tables"""
@@ -46,6 +109,14 @@ class Database:
     def create_database(self):
         with self.get_connection() as conn:
             cursor = conn.cursor()
+
+            # WAL lets readers (reports, online backups) run alongside writers
+            # without either side waiting on the other's lock.
+            cursor.execute('PRAGMA journal_mode=WAL')
+
+            # The audit triggers used to be part of the schema; they are per
+            # connection now (see register_audit_functions)
+            self.drop_audit_triggers(cursor, 'main')
             
             # Enhanced Medicines table with additional fields
             cursor.execute('''
@@ -121,6 +192,23 @@ class Database:
             )
             ''')
 
+            # Each hash records its own parameters; hashes created before they
+            # were stored are PBKDF2-SHA256 at 100,000 iterations
+            user_columns = [row[1] for row in cursor.execute('PRAGMA table_info(Users)').fetchall()]
+            if 'password_iterations' in user_columns:
+                cursor.execute('ALTER TABLE Users RENAME COLUMN password_iterations TO password_cost')
+            self.add_column_if_missing(cursor, 'Users', 'password_algorithm', "TEXT DEFAULT 'pbkdf2_sha256'")
+            self.add_column_if_missing(cursor, 'Users', 'password_cost', 'INTEGER DEFAULT 100000')
+
+            # Site-wide settings such as the password hashing policy (see passwords.py)
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS Settings (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            ''')
+
             # Remove Stock table - redundant with Medicines quantity
             cursor.execute('DROP TABLE IF EXISTS Stock')
 
@@ -153,16 +241,419 @@ class Database:
             )
             ''')
 
+            # Product and packaging pictures (see MedicineImage). `data` is last so
+            # the metadata columns sit on the row's first page and listing images
+            # never reads the blob's overflow pages. Not audited: the JSON images
+            # in AuditLog cannot hold blobs.
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS MedicineImages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                medicine_id INTEGER NOT NULL,
+                kind TEXT NOT NULL DEFAULT 'product' CHECK (kind IN ('product', 'packaging')),
+                file_name TEXT,
+                mime_type TEXT,
+                size INTEGER NOT NULL,
+                sha256 TEXT NOT NULL,
+                width INTEGER,
+                height INTEGER,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                data BLOB NOT NULL,
+                FOREIGN KEY (medicine_id) REFERENCES Medicines(id)
+            )
+            ''')
+
+            # Precomputed thumbnails, kept apart so writing one never rewrites the original
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS MedicineImageThumbnails (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                image_id INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                width INTEGER NOT NULL,
+                height INTEGER NOT NULL,
+                data BLOB NOT NULL,
+                UNIQUE (image_id, size),
+                FOREIGN KEY (image_id) REFERENCES MedicineImages(id)
+            )
+            ''')
+
+            # Years moved out to archive files (see TransactionArchive); needed
+            # before the rebuilds below read Transactions through source()
+            TransactionArchive(self).create_schema(cursor)
+
+            # Running purchase totals per medicine, kept by the purchase_totals_insert
+            # trigger so the supplier spend summary never scans Transactions.
+            # Rolled up per supplier through Medicines.supplier_id when read, so
+            # moving a medicine to another supplier moves its history with it.
+            purchase_totals_exist = cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'MedicinePurchaseTotals'"
+            ).fetchone()
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS MedicinePurchaseTotals (
+                medicine_id INTEGER PRIMARY KEY,
+                quantity INTEGER NOT NULL DEFAULT 0,
+                spend FLOAT NOT NULL DEFAULT 0,
+                purchase_count INTEGER NOT NULL DEFAULT 0,
+                first_purchase TIMESTAMP,
+                last_purchase TIMESTAMP,
+                FOREIGN KEY (medicine_id) REFERENCES Medicines(id)
+            )
+            ''')
+            cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS purchase_totals_insert
+            AFTER INSERT ON Transactions
+            WHEN NEW.transaction_type = 'incoming'
+            BEGIN
+                INSERT INTO MedicinePurchaseTotals (medicine_id, quantity, spend, purchase_count,
+                                                    first_purchase, last_purchase)
+                VALUES (NEW.medicine_id, NEW.quantity,
+                        COALESCE(NEW.total_amount, NEW.quantity * NEW.unit_price, 0), 1, NEW.date, NEW.date)
+                ON CONFLICT(medicine_id) DO UPDATE SET
+                    quantity = quantity + excluded.quantity,
+                    spend = spend + excluded.spend,
+                    purchase_count = purchase_count + 1,
+                    first_purchase = MIN(first_purchase, excluded.first_purchase),
+                    last_purchase = MAX(last_purchase, excluded.last_purchase);
+            END
+            ''')
+            if not purchase_totals_exist:
+                self.rebuild_purchase_totals(cursor, TransactionArchive(self).source())
+
+            # Outgoing quantity and revenue per medicine per (UTC) day, kept by the
+            # daily_sales_insert trigger; the per-medicine and per-category revenue
+            # series (revenue.py) load from here instead of from Transactions
+            daily_sales_exist = cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'MedicineDailySales'"
+            ).fetchone()
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS MedicineDailySales (
+                medicine_id INTEGER NOT NULL,
+                day DATE NOT NULL,
+                sales_count INTEGER NOT NULL DEFAULT 0,
+                quantity INTEGER NOT NULL DEFAULT 0,
+                revenue FLOAT NOT NULL DEFAULT 0,
+                PRIMARY KEY (medicine_id, day),
+                FOREIGN KEY (medicine_id) REFERENCES Medicines(id)
+            ) WITHOUT ROWID
+            ''')
+            cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS daily_sales_insert
+            AFTER INSERT ON Transactions
+            WHEN NEW.transaction_type = 'outgoing'
+            BEGIN
+                INSERT INTO MedicineDailySales (medicine_id, day, sales_count, quantity, revenue)
+                VALUES (NEW.medicine_id, substr(NEW.date, 1, 10), 1, NEW.quantity,
+                        COALESCE(NEW.total_amount, NEW.quantity * NEW.unit_price, 0))
+                ON CONFLICT(medicine_id, day) DO UPDATE SET
+                    sales_count = sales_count + 1,
+                    quantity = quantity + excluded.quantity,
+                    revenue = revenue + excluded.revenue;
+            END
+            ''')
+            if not daily_sales_exist:
+                self.rebuild_daily_sales(cursor, TransactionArchive(self).source())
+
+            # Stock per lot (batch and expiry). Incoming transactions add to their
+            # lot, outgoing ones are split first-expiry-first-out over the open lots
+            # by triggers, so every way of posting a transaction keeps the lots
+            # current. A lot is a (medicine, batch, expiry); receipts missing a
+            # batch number or expiry date each open their own.
+            lots_exist = cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'MedicineLots'"
+            ).fetchone()
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS MedicineLots (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                medicine_id INTEGER NOT NULL,
+                batch_number TEXT,
+                expiry_date DATE,
+                quantity INTEGER NOT NULL,
+                remaining INTEGER NOT NULL CHECK (remaining >= 0),
+                received_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE (medicine_id, batch_number, expiry_date),
+                FOREIGN KEY (medicine_id) REFERENCES Medicines(id)
+            )
+            ''')
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS LotAllocations (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                transaction_id INTEGER NOT NULL,
+                lot_id INTEGER NOT NULL,
+                quantity INTEGER NOT NULL,
+                FOREIGN KEY (transaction_id) REFERENCES Transactions(id),
+                FOREIGN KEY (lot_id) REFERENCES MedicineLots(id)
+            )
+            ''')
+            # FEFO reads the open lots in (expiry_date NULLS LAST, id) order straight
+            # from this index; lots without an expiry date are used last
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_medicine_lots_open ON MedicineLots(medicine_id, expiry_date) '
+                           'WHERE remaining > 0')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_lot_allocations_transaction '
+                           'ON LotAllocations(transaction_id)')
+            cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS lots_incoming
+            AFTER INSERT ON Transactions
+            WHEN NEW.transaction_type = 'incoming'
+            BEGIN
+                INSERT INTO MedicineLots (medicine_id, batch_number, expiry_date, quantity, remaining, received_at)
+                VALUES (NEW.medicine_id, NEW.batch_number, NEW.expiry_date, NEW.quantity, NEW.quantity, NEW.date)
+                ON CONFLICT(medicine_id, batch_number, expiry_date) DO UPDATE SET
+                    quantity = quantity + excluded.quantity,
+                    remaining = remaining + excluded.remaining;
+            END
+            ''')
+            # Stock that is in no lot (posted before the lot triggers) is not allocated
+            cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS lots_outgoing
+            AFTER INSERT ON Transactions
+            WHEN NEW.transaction_type = 'outgoing'
+            BEGIN
+                INSERT INTO LotAllocations (transaction_id, lot_id, quantity)
+                SELECT NEW.id, id, MIN(remaining, NEW.quantity - taken_before)
+                FROM (
+                    SELECT id, remaining, SUM(remaining) OVER (ORDER BY {LOT_ORDER}) - remaining AS taken_before
+                    FROM MedicineLots
+                    WHERE medicine_id = NEW.medicine_id AND remaining > 0
+                )
+                WHERE taken_before < NEW.quantity;
+
+                UPDATE MedicineLots
+                SET remaining = remaining - (SELECT quantity FROM LotAllocations
+                                             WHERE transaction_id = NEW.id AND lot_id = MedicineLots.id)
+                WHERE id IN (SELECT lot_id FROM LotAllocations WHERE transaction_id = NEW.id);
+            END
+            ''')
+            if not lots_exist:
+                # Each medicine's stock so far becomes one opening lot
+                cursor.execute('''
+                INSERT INTO MedicineLots (medicine_id, batch_number, expiry_date, quantity, remaining, received_at)
+                SELECT id, batch_number, expiry_date, quantity, quantity, COALESCE(updated_at, created_at)
+                FROM Medicines
+                WHERE quantity > 0
+                ''')
+                logger.info(f"Opening lots created for {cursor.rowcount} medicines")
+
+            # FIFO cost layers, COGS and daily profit, posted by triggers (see costing.py)
+            if CostLedger.create_schema(cursor):
+                CostLedger.rebuild(cursor, TransactionArchive(self).source())
+            # Inventory value per category, kept by triggers (see valuation.py)
+            if InventoryValuation.create_schema(cursor):
+                InventoryValuation.rebuild(cursor)
+
+            # Filter columns pulled out of the AuditLog JSON images. VIRTUAL, so they
+            # cost nothing on insert unless an index covers them.
+            self.add_column_if_missing(cursor, 'AuditLog', 'record_name', '''
+                TEXT GENERATED ALWAYS AS (json_extract(COALESCE(new_values, old_values),
+                    CASE table_name WHEN 'Users' THEN '$.username' ELSE '$.name' END)) VIRTUAL
+            ''')
+            self.add_column_if_missing(cursor, 'AuditLog', 'medicine_id', '''
+                INTEGER GENERATED ALWAYS AS (CASE table_name
+                    WHEN 'Medicines' THEN record_id
+                    WHEN 'Transactions' THEN json_extract(COALESCE(new_values, old_values), '$.medicine_id')
+                END) VIRTUAL
+            ''')
+
+            # ChangeJournal was superseded by AuditLog.new_values
+            for table in ('medicines', 'suppliers', 'users'):
+                for operation in ('insert', 'update', 'delete'):
+                    cursor.execute(f'DROP TRIGGER IF EXISTS journal_{table}_{operation}')
+            cursor.execute('DROP TABLE IF EXISTS ChangeJournal')
+
             # Create indexes for better performance
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_medicines_name ON Medicines(name)')
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_medicines_supplier ON Medicines(supplier_id)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_transactions_medicine ON Transactions(medicine_id)')
+            # A medicine's purchases (or sales) in a date range, e.g. for one supplier's
+            # medicines; the old idx_transactions_medicine is a prefix of it
+            cursor.execute('DROP INDEX IF EXISTS idx_transactions_medicine')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_transactions_medicine_type_date '
+                           'ON Transactions(medicine_id, transaction_type, date)')
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_transactions_user ON Transactions(user_id)')
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_transactions_date ON Transactions(date)')
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_username ON Users(username)')
-            
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_medicine_images_medicine ON MedicineImages(medicine_id, kind)')
+
+            # Indexes backing the sortable report grid columns (see Reports.*_COLUMNS).
+            # Every index implicitly ends with the rowid, which is also the
+            # tiebreaker used by the report queries, so a re-sort never needs a temp b-tree.
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_medicines_quantity ON Medicines(quantity)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_medicines_minimum_stock ON Medicines(minimum_stock)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_medicines_price ON Medicines(price)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_medicines_batch ON Medicines(batch_number)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_medicines_expiry ON Medicines(expiry_date)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_medicines_stock_value ON Medicines(quantity * price)')
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_medicines_stock_status ON Medicines({STOCK_STATUS_SQL})')
+            # Covers the monthly sales queries and the purchase report, which then
+            # read only index pages. Its (transaction_type, date) prefix replaces the
+            # old index; id comes next so it still ends in the rowid tiebreaker.
+            cursor.execute('DROP INDEX IF EXISTS idx_transactions_type_date')
+            self.create_index(cursor, 'idx_transactions_sales', 'Transactions('
+                              'transaction_type, date, id, medicine_id, quantity, total_amount, unit_price)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_transactions_quantity ON Transactions(quantity)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_transactions_total ON Transactions(total_amount)')
+            # AuditTrail pages through these newest-first with a (timestamp, id) keyset
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_audit_log_record ON AuditLog(table_name, record_id, timestamp)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_audit_log_user ON AuditLog(user_id, timestamp)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_audit_log_medicine ON AuditLog(medicine_id, timestamp)')
+            # restore_to_point finds its cut-off by scanning back from the newest id,
+            # so no timestamp index needs to be paid for on every write
+            cursor.execute('DROP INDEX IF EXISTS idx_stock_alerts_created')
+            # At most one open alert of each type per medicine, which makes the
+            # INSERT OR IGNOREs in check_stock_alerts skip a repeat. Alerts raised
+            # again before it existed count as resolved when the next one was.
+            cursor.execute('''
+            UPDATE StockAlerts
+            SET is_resolved = 1,
+                resolved_at = (SELECT MIN(n.created_at) FROM StockAlerts n
+                               WHERE n.medicine_id = StockAlerts.medicine_id
+                                 AND n.alert_type = StockAlerts.alert_type
+                                 AND n.is_resolved = 0 AND n.id > StockAlerts.id)
+            WHERE is_resolved = 0 AND EXISTS (
+                SELECT 1 FROM StockAlerts n
+                WHERE n.medicine_id = StockAlerts.medicine_id AND n.alert_type = StockAlerts.alert_type
+                  AND n.is_resolved = 0 AND n.id > StockAlerts.id
+            )
+            ''')
+            cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_stock_alerts_open '
+                           'ON StockAlerts(medicine_id, alert_type) WHERE is_resolved = 0')
+
+            self.create_audit_triggers(cursor)
+            self.scrub_audit_secrets(cursor)
+
             conn.commit()
 
+    @staticmethod
+    def create_index(cursor, name, definition):
+        """CREATE INDEX name ON definition, replacing an index of that name defined differently"""
+        sql = f'CREATE INDEX {name} ON {definition}'
+        existing = cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'index' AND name = ?",
+                                  (name,)).fetchone()
+        if existing and existing[0] == sql:
+            return
+        if existing:
+            logger.info(f"Rebuilding index {name} with its new definition")
+            cursor.execute(f'DROP INDEX {name}')
+        cursor.execute(sql)
+
+    @staticmethod
+    def add_column_if_missing(cursor, table, column, definition):
+        """ALTER TABLE ADD COLUMN unless the column already exists"""
+        columns = [row[1] for row in cursor.execute(f'PRAGMA table_xinfo({table})').fetchall()]
+        if column not in columns:
+            cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
+    @staticmethod
+    def rebuild_purchase_totals(cursor, source='Transactions'):
+        """Recompute MedicinePurchaseTotals from every incoming transaction in source"""
+        cursor.execute('DELETE FROM MedicinePurchaseTotals')
+        cursor.execute(f'''
+        INSERT INTO MedicinePurchaseTotals (medicine_id, quantity, spend, purchase_count,
+                                            first_purchase, last_purchase)
+        SELECT medicine_id, SUM(quantity), SUM(COALESCE(total_amount, quantity * unit_price, 0)),
+               COUNT(*), MIN(date), MAX(date)
+        FROM {source}
+        WHERE transaction_type = 'incoming'
+        GROUP BY medicine_id
+        ''')
+        logger.info(f"Purchase totals rebuilt for {cursor.rowcount} medicines")
+
+    @staticmethod
+    def rebuild_daily_sales(cursor, source='Transactions'):
+        """Recompute MedicineDailySales from every outgoing transaction in source"""
+        cursor.execute('DELETE FROM MedicineDailySales')
+        cursor.execute(f'''
+        INSERT INTO MedicineDailySales (medicine_id, day, sales_count, quantity, revenue)
+        SELECT medicine_id, substr(date, 1, 10), COUNT(*), SUM(quantity),
+               SUM(COALESCE(total_amount, quantity * unit_price, 0))
+        FROM {source}
+        WHERE transaction_type = 'outgoing'
+        GROUP BY 1, 2
+        ''')
+        logger.info(f"Daily sales rebuilt for {cursor.rowcount} medicine-days")
+
+    @staticmethod
+    def create_audit_triggers(cursor):
+        """(Re)create the cursor's connection's AuditLog triggers from the audited tables' current columns.
+
+        They are TEMP triggers, so they exist only on this connection, next
+        to the function they call; tables that do not exist yet are skipped.
+        Old and new rows are stored as json_object() images, without the
+        AUDIT_SECRET_COLUMNS. The acting user comes from the connection's
+        acting_user_id() function (see register_audit_functions); Transactions
+        fall back to their own user_id.
+        """
+        for table in AUDITED_TABLES:
+            columns = [row[1] for row in cursor.execute(f'PRAGMA main.table_info({table})').fetchall()]
+            if not columns:
+                continue
+            secrets = [column for column in AUDIT_SECRET_COLUMNS.get(table, ()) if column in columns]
+            logged = [column for column in columns if column not in AUDIT_UNLOGGED_COLUMNS.get(table, ())]
+
+            def image(row):
+                return 'json_object(' + ', '.join(f"'{column}', {row}.{column}"
+                                                  for column in columns if column not in secrets) + ')'
+
+            new_image = image('NEW')
+            if secrets:
+                changed = ' OR '.join(f'OLD.{column} IS NOT NEW.{column}' for column in secrets)
+                markers = ', '.join(f"'$.{column}', '{CHANGED_MARKER}'" for column in secrets)
+                new_image = f'CASE WHEN {changed} THEN json_set({new_image}, {markers}) ELSE {new_image} END'
+            when = ''
+            if len(logged) < len(columns):
+                when = 'WHEN ' + ' OR '.join(f'OLD.{column} IS NOT NEW.{column}' for column in logged)
+
+            for action, row, old_values, new_values, condition in (
+                ('INSERT', 'NEW', 'NULL', image('NEW'), ''),
+                ('UPDATE', 'NEW', image('OLD'), new_image, when),
+                ('DELETE', 'OLD', image('OLD'), 'NULL', ''),
+            ):
+                user = f'COALESCE(acting_user_id(), {row}.user_id)' if table == 'Transactions' else 'acting_user_id()'
+                cursor.execute(f'DROP TRIGGER IF EXISTS temp.audit_{table.lower()}_{action.lower()}')
+                cursor.execute(f'''
+                CREATE TEMP TRIGGER audit_{table.lower()}_{action.lower()}
+                AFTER {action} ON {table}
+                {condition}
+                BEGIN
+                    INSERT INTO AuditLog (table_name, record_id, action, old_values, new_values, user_id)
+                    VALUES ('{table}', {row}.id, '{action}', {old_values}, {new_values}, {user});
+                END
+                ''')
+
+    @staticmethod
+    def scrub_audit_secrets(cursor):
+        """Take AUDIT_SECRET_COLUMNS values out of images logged before they were excluded"""
+        for table, secrets in AUDIT_SECRET_COLUMNS.items():
+            paths = ', '.join(f"'$.{column}'" for column in secrets)
+            markers = ', '.join(f"'$.{column}', '{CHANGED_MARKER}'" for column in secrets)
+            changed = ' OR '.join(f"json_extract(old_values, '$.{column}') IS NOT json_extract(new_values, '$.{column}')"
+                                  for column in secrets)
+            logged = ' OR '.join(f"json_type({image}, '$.{column}') IS NOT NULL"
+                                 for image in ('old_values', 'new_values') for column in secrets)
+            cursor.execute(f'''
+            UPDATE AuditLog
+            SET old_values = json_remove(old_values, {paths}),
+                new_values = CASE WHEN action = 'UPDATE' AND ({changed})
+                                  THEN json_set(new_values, {markers})
+                                  ELSE json_remove(new_values, {paths}) END
+            WHERE table_name = ? AND ({logged})
+              AND json_extract(new_values, '$.{secrets[0]}') IS NOT '{CHANGED_MARKER}'
+            ''', (table,))
+            if cursor.rowcount:
+                logger.info(f"Removed {table} credentials from {cursor.rowcount} audit entries")
+
+    @staticmethod
+    def drop_audit_triggers(cursor, schema='temp'):
+        for table in AUDITED_TABLES:
+            for action in ('insert', 'update', 'delete'):
+                cursor.execute(f'DROP TRIGGER IF EXISTS {schema}.audit_{table.lower()}_{action}')
+
+    def register_audit_functions(self, conn):
+        """Give a connection the acting_user_id() function and the audit triggers that call it.
+
+        Keeping both on the connection leaves the database file free of
+        application functions, so any other tool can still write to it.
+        """
+        conn.create_function('acting_user_id', 0, lambda: self.acting_user_id)
+        self.create_audit_triggers(conn.cursor())
+
     def create_default_admin(self):
         """Create default admin user if none exists"""
         with self.get_connection() as conn:
@@ -176,24 +667,10 @@ class Database:
 
 class SecurityMixin:
     """Mixin class for password hashing and security features"""
-    
-    @staticmethod
-    def hash_password(password, salt=None):
-        """Hash password with salt"""
-        if salt is None:
-            salt = hashlib.sha256(str(datetime.now()).encode()).hexdigest()[:16]
-        
-        password_hash = hashlib.pbkdf2_hmac('sha256', 
-                                          password.encode('utf-8'), 
-                                          salt.encode('utf-8'), 
-                                          100000)
-        return password_hash.hex(), salt
 
-    @staticmethod
-    def verify_password(password, stored_hash, salt):
-        """Verify password against stored hash"""
-        password_hash, _ = SecurityMixin.hash_password(password, salt)
-        return password_hash == stored_hash
+    def password_hasher(self):
+        """Hasher for the site's current policy, read fresh so calibration applies at once"""
+        return PasswordHasher.from_settings(self.db)
 
     def check_account_lockout(self, user_data):
         """Check if account is locked due to failed attempts"""
@@ -212,15 +689,16 @@ class User(SecurityMixin):
 
     def create_user(self, username, password, role, full_name=None, email=None):
         """Create new user with hashed password"""
-        password_hash, salt = self.hash_password(password)
+        password_hash, salt, algorithm, cost = self.password_hasher().hash(password)
         
         with self.db.get_connection() as conn:
             cursor = conn.cursor()
             try:
                 cursor.execute('''
-                INSERT INTO Users (username, password_hash, salt, role, full_name, email) 
-                VALUES (?, ?, ?, ?, ?, ?)
-                ''', (username, password_hash, salt, role, full_name, email))
+                INSERT INTO Users (username, password_hash, salt, password_algorithm, password_cost,
+                                   role, full_name, email) 
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (username, password_hash, salt, algorithm, cost, role, full_name, email))
                 conn.commit()
                 logger.info(f"User {username} created successfully")
                 return cursor.lastrowid
@@ -231,6 +709,17 @@ class User(SecurityMixin):
 
     def authenticate(self, username, password):
         """Authenticate user with security checks"""
+        user_dict, error = self.check_credentials(username, password)
+        if error:
+            messagebox.showerror("Error", error)
+        return user_dict
+
+    def check_credentials(self, username, password):
+        """Authenticate without touching the UI; returns (user, error message).
+
+        Safe to call from a worker thread: the password hashing runs outside any
+        transaction and releases the GIL, so the Tk thread keeps running.
+        """
         with self.db.get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('SELECT * FROM Users WHERE username = ? AND is_active = 1', (username,))
@@ -238,18 +727,19 @@ class User(SecurityMixin):
             
             if not user_data:
                 logger.warning(f"Authentication failed for {username}: User not found")
-                return None
+                return None, None
             
             user_dict = dict(user_data)
             
             # Check account lockout
             if self.check_account_lockout(user_dict):
                 logger.warning(f"Authentication failed for {username}: Account locked")
-                messagebox.showerror("Error", "Account is temporarily locked due to multiple failed attempts")
-                return None
+                return None, "Account is temporarily locked due to multiple failed attempts"
             
             # Verify password
-            if self.verify_password(password, user_dict['password_hash'], user_dict['salt']):
+            hasher = self.password_hasher()
+            algorithm, cost = user_dict['password_algorithm'], user_dict['password_cost']
+            if hasher.verify(password, user_dict['password_hash'], user_dict['salt'], algorithm, cost):
                 # Reset failed attempts and update last login
                 cursor.execute('''
                 UPDATE Users 
@@ -259,7 +749,20 @@ class User(SecurityMixin):
                 ''', (user_dict['id'],))
                 conn.commit()
                 logger.info(f"User {username} authenticated successfully")
-                return user_dict
+
+                # The plain password is only available now: bring the hash up
+                # to the current policy. Hashing happens before the UPDATE so
+                # the write lock is not held while it runs.
+                if hasher.needs_rehash(algorithm, cost):
+                    password_hash, salt, algorithm, cost = hasher.hash(password)
+                    cursor.execute('''
+                    UPDATE Users
+                    SET password_hash = ?, salt = ?, password_algorithm = ?, password_cost = ?
+                    WHERE id = ?
+                    ''', (password_hash, salt, algorithm, cost, user_dict['id']))
+                    conn.commit()
+                    logger.info(f"Rehashed password for {username} with {algorithm} at cost {cost}")
+                return user_dict, None
             else:
                 # Increment failed attempts
                 new_attempts = user_dict['failed_login_attempts'] + 1
@@ -276,7 +779,7 @@ class User(SecurityMixin):
                 conn.commit()
                 
                 logger.warning(f"Authentication failed for {username}: Invalid password")
-                return None
+                return None, None
 
     def update_user(self, user_id, username=None, password=None, role=None, full_name=None, email=None):
         """Update user with proper validation"""
@@ -287,10 +790,11 @@ class User(SecurityMixin):
             updates.append("username = ?")
             parameters.append(username)
         if password:
-            password_hash, salt = self.hash_password(password)
             updates.append("password_hash = ?")
             updates.append("salt = ?")
-            parameters.extend([password_hash, salt])
+            updates.append("password_algorithm = ?")
+            updates.append("password_cost = ?")
+            parameters.extend(self.password_hasher().hash(password))
         if role:
             updates.append("role = ?")
             parameters.append(role)
@@ -363,8 +867,16 @@ class Medicine:
             return medicine_id
 
     def update_stock(self, medicine_id, quantity_change, transaction_type, user_id, 
-                    batch_number=None, expiry_date=None, reason=None):
-        """Update medicine stock with transaction logging"""
+                    batch_number=None, expiry_date=None, reason=None, unit_cost=None):
+        """Update medicine stock with transaction logging.
+
+        Incoming stock is recorded at unit_cost, the purchase price, which opens
+        its FIFO cost layer; without one it is assumed to cost what the last
+        delivery did. It goes into the lot of batch_number and expiry_date; a
+        receipt with neither opens a lot of its own, never the one that
+        expires first. Outgoing stock is recorded at
+        the medicine's sale price and taken from the lots that expire first.
+        """
         with self.db.get_connection() as conn:
             cursor = conn.cursor()
             
@@ -393,6 +905,14 @@ class Medicine:
             WHERE id = ?
             ''', (new_quantity, medicine_id))
             
+            if transaction_type == 'incoming':
+                if unit_cost is None:
+                    cursor.execute('SELECT unit_cost FROM CostLayers WHERE medicine_id = ? '
+                                   'ORDER BY id DESC LIMIT 1', (medicine_id,))
+                    last_layer = cursor.fetchone()
+                    unit_cost = last_layer[0] if last_layer else unit_price
+                unit_price = unit_cost
+
             # Log transaction
             total_amount = quantity_change * unit_price if unit_price else None
             cursor.execute('''
@@ -401,6 +921,7 @@ class Medicine:
             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
             ''', (medicine_id, transaction_type, quantity_change, unit_price, total_amount,
                   batch_number, expiry_date, reason, user_id))
+            MedicineLot.sync_medicine(cursor, medicine_id)
             
             conn.commit()
             
@@ -411,7 +932,7 @@ class Medicine:
             return True
 
     def check_stock_alerts(self, medicine_id):
-        """Check and create stock alerts"""
+        """Raise the stock alerts that apply to a medicine and resolve the ones that no longer do"""
         with self.db.get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('''
@@ -422,13 +943,11 @@ class Medicine:
             
             if result:
                 name, quantity, min_stock, expiry_date = result
+                alerts = {}
                 
                 # Low stock alert
                 if quantity <= min_stock:
-                    cursor.execute('''
-                    INSERT OR IGNORE INTO StockAlerts (medicine_id, alert_type, message)
-                    VALUES (?, 'low_stock', ?)
-                    ''', (medicine_id, f"Low stock alert: {name} has only {quantity} units left"))
+                    alerts['low_stock'] = f"Low stock alert: {name} has only {quantity} units left"
                 
                 # Expiry alerts
                 if expiry_date:
@@ -436,15 +955,22 @@ class Medicine:
                     days_to_expiry = (expiry_dt - datetime.now()).days
                     
                     if days_to_expiry <= 0:
-                        cursor.execute('''
-                        INSERT OR IGNORE INTO StockAlerts (medicine_id, alert_type, message)
-                        VALUES (?, 'expired', ?)
-                        ''', (medicine_id, f"EXPIRED: {name} expired on {expiry_date}"))
+                        alerts['expired'] = f"EXPIRED: {name} expired on {expiry_date}"
                     elif days_to_expiry <= 30:
-                        cursor.execute('''
-                        INSERT OR IGNORE INTO StockAlerts (medicine_id, alert_type, message)
-                        VALUES (?, 'expiry_warning', ?)
-                        ''', (medicine_id, f"Expiry warning: {name} expires in {days_to_expiry} days"))
+                        alerts['expiry_warning'] = f"Expiry warning: {name} expires in {days_to_expiry} days"
+
+                # Restocked, or the expiring lot is gone: close the open alert so
+                # RetentionPurger can remove it
+                placeholders = ', '.join('?' * len(alerts))
+                cursor.execute(f'''
+                UPDATE StockAlerts SET is_resolved = 1, resolved_at = CURRENT_TIMESTAMP
+                WHERE medicine_id = ? AND is_resolved = 0 AND alert_type NOT IN ({placeholders})
+                ''', (medicine_id, *alerts))
+                # idx_stock_alerts_open ignores an alert that is already open
+                cursor.executemany('''
+                INSERT OR IGNORE INTO StockAlerts (medicine_id, alert_type, message)
+                VALUES (?, ?, ?)
+                ''', [(medicine_id, alert_type, message) for alert_type, message in alerts.items()])
                 
                 conn.commit()
 
@@ -550,41 +1076,524 @@ class Supplier:
             return cursor.fetchall()
 
 
-class Reports:
+class MedicineLot:
+    """Stock per lot in MedicineLots, allocated first-expiry-first-out.
+
+    The lots_incoming and lots_outgoing triggers on Transactions keep the
+    lots; an outgoing transaction's split is recorded in LotAllocations.
+    allocate() posts an outgoing movement only when the lots cover all of
+    it and returns the split.
+    """
+
     def __init__(self, db):
         self.db = db
 
-    def get_stock_report(self):
-        """Generate comprehensive stock report"""
+    @staticmethod
+    def plan(cursor, medicine_id, quantity):
+        """FEFO split of quantity over a medicine's open lots, without taking it.
+
+        One pass over idx_medicine_lots_open in LOT_ORDER: the running total of
+        the lots before each one decides what is taken from it. The rows may
+        cover less than quantity.
+        """
+        cursor.execute(f'''
+        SELECT id, batch_number, expiry_date, remaining, MIN(remaining, ? - taken_before) as quantity
+        FROM (
+            SELECT id, batch_number, expiry_date, remaining,
+                   SUM(remaining) OVER (ORDER BY {LOT_ORDER}) - remaining AS taken_before
+            FROM MedicineLots
+            WHERE medicine_id = ? AND remaining > 0
+        )
+        WHERE taken_before < ?
+        ''', (quantity, medicine_id, quantity))
+        return cursor.fetchall()
+
+    @staticmethod
+    def sync_medicine(cursor, medicine_id):
+        """Show the next lot to expire as the medicine's batch and expiry date"""
+        cursor.execute(f'''
+        UPDATE Medicines
+        SET batch_number = lot.batch_number, expiry_date = lot.expiry_date
+        FROM (
+            SELECT batch_number, expiry_date FROM MedicineLots
+            WHERE medicine_id = ? AND remaining > 0
+            ORDER BY {LOT_ORDER} LIMIT 1
+        ) AS lot
+        WHERE Medicines.id = ?
+          AND (Medicines.batch_number IS NOT lot.batch_number OR Medicines.expiry_date IS NOT lot.expiry_date)
+        ''', (medicine_id, medicine_id))
+
+    def allocate(self, medicine_id, quantity, user_id, reason=None):
+        """Take quantity out of stock across as many lots as needed, all or nothing.
+
+        Returns the lots used, soonest expiry first, as Rows of (lot_id,
+        batch_number, expiry_date, quantity). Raises ValueError, leaving the
+        stock untouched, when the medicine's lots hold less than quantity.
+        """
+        if quantity <= 0:
+            raise ValueError("Quantity must be positive")
+        with self.db.get_connection() as conn:
+            cursor = conn.cursor()
+            # Nothing can be taken from the lots between the plan and the post
+            cursor.execute('BEGIN IMMEDIATE')
+            try:
+                cursor.execute('SELECT name, quantity, price FROM Medicines WHERE id = ?', (medicine_id,))
+                medicine = cursor.fetchone()
+                if not medicine:
+                    raise ValueError("Medicine not found")
+                available = sum(lot['quantity'] for lot in self.plan(cursor, medicine_id, quantity))
+                if available < quantity or medicine['quantity'] < quantity:
+                    raise ValueError(f"Only {min(available, medicine['quantity'])} units of "
+                                     f"{medicine['name']} are available in lots")
+
+                cursor.execute('''
+                UPDATE Medicines
+                SET quantity = quantity - ?, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+                ''', (quantity, medicine_id))
+                unit_price = medicine['price']
+                cursor.execute('''
+                INSERT INTO Transactions (medicine_id, transaction_type, quantity, unit_price,
+                                          total_amount, reason, user_id)
+                VALUES (?, 'outgoing', ?, ?, ?, ?, ?)
+                ''', (medicine_id, quantity, unit_price, quantity * unit_price if unit_price else None,
+                      reason, user_id))
+                transaction_id = cursor.lastrowid
+                self.sync_medicine(cursor, medicine_id)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+        Medicine(self.db).check_stock_alerts(medicine_id)
+        logger.info(f"Stock allocated for medicine {medicine_id}: {quantity} from transaction {transaction_id}")
+        return self.get_allocations(transaction_id)
+
+    def get_allocations(self, transaction_id):
+        """Lots an outgoing transaction was taken from, soonest expiry first"""
         with self.db.get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('''
-            SELECT 
+            SELECT a.lot_id, l.batch_number, l.expiry_date, a.quantity
+            FROM LotAllocations a
+            JOIN MedicineLots l ON l.id = a.lot_id
+            WHERE a.transaction_id = ?
+            ORDER BY l.expiry_date NULLS LAST, l.id
+            ''', (transaction_id,))
+            return cursor.fetchall()
+
+    def get_lots(self, medicine_id, open_only=True):
+        """A medicine's lots in the order they are used"""
+        with self.db.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+            SELECT id, batch_number, expiry_date, quantity, remaining, received_at
+            FROM MedicineLots
+            WHERE medicine_id = ? {'AND remaining > 0' if open_only else ''}
+            ORDER BY {LOT_ORDER}
+            ''', (medicine_id,))
+            return cursor.fetchall()
+
+
+class MedicineImage:
+    """Product and packaging pictures stored as BLOBs in MedicineImages.
+
+    Originals go in and out in CHUNK_SIZE pieces through Connection.blobopen:
+    the row is inserted with a zeroblob of the file's size and filled in
+    place, so a large picture is never held in memory whole. Thumbnails are
+    made from the blob by thumbnails.ThumbnailService.
+    """
+    CHUNK_SIZE = 64 * 1024
+    MAX_SIZE = 32 * 1024 * 1024
+    METADATA_COLUMNS = 'id, medicine_id, kind, file_name, mime_type, size, sha256, width, height, created_at'
+
+    def __init__(self, db):
+        self.db = db
+
+    def add_image(self, medicine_id, path, kind='product', mime_type=None, width=None, height=None):
+        """Store the file at path for a medicine; returns the image id.
+
+        The same file added twice for a medicine returns the existing image.
+        """
+        size = os.path.getsize(path)
+        if size == 0 or size > self.MAX_SIZE:
+            raise ValueError(f"Image must be between 1 byte and {self.MAX_SIZE // (1024 * 1024)} MB")
+
+        # Hashed before the insert: changing the row afterwards would rewrite every page of the blob
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(self.CHUNK_SIZE), b''):
+                digest.update(chunk)
+        sha256 = digest.hexdigest()
+
+        with self.db.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT id FROM MedicineImages WHERE medicine_id = ? AND sha256 = ?',
+                           (medicine_id, sha256))
+            existing = cursor.fetchone()
+            if existing:
+                return existing[0]
+
+            cursor.execute('''
+            INSERT INTO MedicineImages (medicine_id, kind, file_name, mime_type, size, sha256,
+                                        width, height, data)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, zeroblob(?))
+            ''', (medicine_id, kind, os.path.basename(path), mime_type, size, sha256, width, height, size))
+            image_id = cursor.lastrowid
+            with open(path, 'rb') as f, conn.blobopen('MedicineImages', 'data', image_id) as blob:
+                for chunk in iter(lambda: f.read(self.CHUNK_SIZE), b''):
+                    blob.write(chunk)
+            conn.commit()
+            logger.info(f"Image {image_id} ({size:,} bytes) added for medicine {medicine_id}")
+            return image_id
+
+    @contextmanager
+    def open_image(self, image_id):
+        """Read-only file-like Blob over an original, e.g. for PIL.Image.open"""
+        with self.db.get_connection() as conn:
+            with conn.blobopen('MedicineImages', 'data', image_id, readonly=True) as blob:
+                yield blob
+
+    def export_image(self, image_id, path):
+        """Copy an original to a file"""
+        with self.open_image(image_id) as blob, open(path, 'wb') as f:
+            for chunk in iter(lambda: blob.read(self.CHUNK_SIZE), b''):
+                f.write(chunk)
+
+    def get_image(self, image_id):
+        """Metadata of one image, without the data"""
+        with self.db.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'SELECT {self.METADATA_COLUMNS} FROM MedicineImages WHERE id = ?', (image_id,))
+            return cursor.fetchone()
+
+    def get_images(self, medicine_id, kind=None):
+        """Metadata of a medicine's images, oldest first"""
+        query = f'SELECT {self.METADATA_COLUMNS} FROM MedicineImages WHERE medicine_id = ?'
+        params = [medicine_id]
+        if kind:
+            query += ' AND kind = ?'
+            params.append(kind)
+        with self.db.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query + ' ORDER BY id', params)
+            return cursor.fetchall()
+
+    def get_primary_images(self, medicine_ids):
+        """{medicine_id: (image_id, sha256)} of the first product picture, else packaging, of each medicine"""
+        medicine_ids = list(medicine_ids)
+        if not medicine_ids:
+            return {}
+        with self.db.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+            SELECT medicine_id, id, sha256 FROM MedicineImages
+            WHERE medicine_id IN ({', '.join('?' * len(medicine_ids))})
+            ORDER BY medicine_id, kind = 'packaging', id
+            ''', medicine_ids)
+            primary = {}
+            for medicine_id, image_id, sha256 in cursor.fetchall():
+                primary.setdefault(medicine_id, (image_id, sha256))
+            return primary
+
+    def delete_image(self, image_id):
+        with self.db.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM MedicineImageThumbnails WHERE image_id = ?', (image_id,))
+            cursor.execute('DELETE FROM MedicineImages WHERE id = ?', (image_id,))
+            conn.commit()
+            return cursor.rowcount > 0
+
+    def get_thumbnail(self, image_id, size):
+        """PNG bytes of a stored thumbnail, or None"""
+        with self.db.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT data FROM MedicineImageThumbnails WHERE image_id = ? AND size = ?',
+                           (image_id, size))
+            row = cursor.fetchone()
+            return row[0] if row else None
+
+    def save_thumbnail(self, image_id, size, width, height, data):
+        with self.db.get_connection() as conn:
+            conn.execute('''
+            INSERT INTO MedicineImageThumbnails (image_id, size, width, height, data)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(image_id, size) DO UPDATE SET
+                width = excluded.width, height = excluded.height, data = excluded.data
+            ''', (image_id, size, width, height, data))
+            conn.commit()
+
+    def get_images_without_thumbnail(self, size, after_id=0, limit=100):
+        """Next `limit` (id, sha256) of images with no thumbnail at size, by id after after_id"""
+        with self.db.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+            SELECT i.id, i.sha256 FROM MedicineImages i
+            WHERE i.id > ? AND NOT EXISTS (
+                SELECT 1 FROM MedicineImageThumbnails t WHERE t.image_id = i.id AND t.size = ?
+            )
+            ORDER BY i.id LIMIT ?
+            ''', (after_id, size, limit))
+            return cursor.fetchall()
+
+
+class AuditTrail:
+    # Equality filters that lead one of the AuditLog (..., timestamp) indexes.
+    # With any of them present a page is read straight off that index in
+    # timestamp order; otherwise the table is walked backwards by id, which
+    # gives the same newest-first order because entries are appended in time order.
+    INDEXED_FILTERS = (('table_name', 'record_id'), ('medicine_id',), ('user_id',))
+    FILTERS = ('table_name', 'record_id', 'medicine_id', 'user_id', 'action')
+
+    def __init__(self, db):
+        self.db = db
+
+    def get_entries(self, filters=None, record_name=None, start_date=None, end_date=None,
+                    before=None, limit=100):
+        """One page of audit entries, newest first.
+
+        `before` is the (timestamp, id) of the last entry of the previous page;
+        pass None for the first page.
+        """
+        filters = {key: value for key, value in (filters or {}).items() if value not in (None, '')}
+        for key in filters:
+            if key not in self.FILTERS:
+                raise ValueError(f"Unknown audit filter: {key}")
+        by_timestamp = any(all(key in filters for key in keys) for keys in self.INDEXED_FILTERS)
+
+        # Unary + keeps the planner off the indexes when they can't give the page order
+        prefix = 'a.' if by_timestamp else '+a.'
+        conditions = [f'{prefix}{key} = ?' for key in filters]
+        params = list(filters.values())
+
+        if record_name:
+            conditions.append('a.record_name LIKE ?')
+            params.append(f'{record_name}%')
+        if start_date:
+            conditions.append('a.timestamp >= ?')
+            params.append(start_date)
+        if end_date:
+            conditions.append("a.timestamp < date(?, '+1 day')")
+            params.append(end_date)
+
+        if by_timestamp:
+            if before:
+                conditions.append('(a.timestamp, a.id) < (?, ?)')
+                params.extend(before)
+            order_by = 'a.timestamp DESC, a.id DESC'
+        else:
+            if before:
+                conditions.append('a.id < ?')
+                params.append(before[1])
+            order_by = 'a.id DESC'
+
+        where = ' WHERE ' + ' AND '.join(conditions) if conditions else ''
+        with self.db.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+            SELECT a.id, a.timestamp, a.table_name, a.record_id, a.action, a.record_name,
+                   a.medicine_id, a.user_id, u.username, a.old_values, a.new_values
+            FROM AuditLog a
+            LEFT JOIN Users u ON a.user_id = u.id
+            {where}
+            ORDER BY {order_by}
+            LIMIT ?
+            ''', params + [limit])
+            return cursor.fetchall()
+
+    @staticmethod
+    def describe_changes(old_values, new_values, ignore=('updated_at',)):
+        """(column, old, new) for every column that differs between two JSON images.
+
+        Credential columns are always redacted, whatever `ignore` holds: a
+        change to one is shown as '' → CHANGED_MARKER, never with its values.
+        """
+        old = json.loads(old_values) if old_values else {}
+        new = json.loads(new_values) if new_values else {}
+        secrets = {column for columns in AUDIT_SECRET_COLUMNS.values() for column in columns}
+        changes = []
+        for column in dict.fromkeys(list(old) + list(new)):
+            if column in ignore or old.get(column) == new.get(column):
+                continue
+            if column in secrets:
+                changes.append((column, '', CHANGED_MARKER))
+            else:
+                changes.append((column, old.get(column), new.get(column)))
+        return changes
+
+
+class Reports:
+    # Whitelists for the report grids: column key -> (filter expression, value type,
+    # ORDER BY expressions or None when the column cannot be sorted).
+    # Only these expressions are ever interpolated into SQL; user input always
+    # travels as a bound parameter. Every ORDER BY tuple matches an index prefix
+    # (see Database.create_database), so a re-sort is one indexed query.
+    STOCK_REPORT_COLUMNS = {
+        'name': ('m.name', 'text', ('m.name',)),
+        'batch_number': ('m.batch_number', 'text', ('m.batch_number',)),
+        'quantity': ('m.quantity', 'number', ('m.quantity',)),
+        'minimum_stock': ('m.minimum_stock', 'number', ('m.minimum_stock',)),
+        'maximum_stock': ('m.maximum_stock', 'number', None),
+        'price': ('m.price', 'number', ('m.price',)),
+        'stock_value': ('quantity * price', 'number', ('quantity * price',)),
+        'category': ("COALESCE(m.category, '')", 'text', None),
+        'supplier_name': ('s.name', 'text', None),
+        'expiry_date': ('m.expiry_date', 'date', ('m.expiry_date',)),
+        'stock_status': (STOCK_STATUS_SQL, 'text', (STOCK_STATUS_SQL,)),
+    }
+
+    TRANSACTION_REPORT_COLUMNS = {
+        'date': ('t.date', 'date', ('t.date',)),
+        'medicine_name': ('m.name', 'text', None),
+        'transaction_type': ('t.transaction_type', 'text', ('t.transaction_type', 't.date')),
+        'quantity': ('t.quantity', 'number', ('t.quantity',)),
+        'unit_price': ('t.unit_price', 'number', None),
+        'total_amount': ('t.total_amount', 'number', ('t.total_amount',)),
+        'username': ('u.username', 'text', None),
+        'reason': ('t.reason', 'text', None),
+    }
+
+    PURCHASE_REPORT_COLUMNS = {
+        'date': ('t.date', 'date', ('t.date',)),
+        'supplier_name': ('s.name', 'text', None),
+        'medicine_name': ('m.name', 'text', None),
+        'quantity': ('t.quantity', 'number', ('t.quantity',)),
+        'unit_price': ('t.unit_price', 'number', None),
+        'total_amount': ('t.total_amount', 'number', ('t.total_amount',)),
+    }
+
+    # Named reports that can be paged, streamed and exported: name -> (query builder, whitelist)
+    REPORTS = {
+        'stock': ('_stock_report_query', STOCK_REPORT_COLUMNS),
+        'transactions': ('_transaction_report_query', TRANSACTION_REPORT_COLUMNS),
+        'purchases': ('_purchase_report_query', PURCHASE_REPORT_COLUMNS),
+    }
+
+    FILTER_OPERATORS = ('>=', '<=', '!=', '>', '<', '=')
+
+    SALES_PERIODS = ('daily', 'weekly', 'monthly', 'quarterly', 'yearly')
+
+    def __init__(self, db):
+        self.db = db
+        self.archive = TransactionArchive(db)
+
+    def _build_clauses(self, columns, sort_by, descending, filters, tiebreaker):
+        """Translate grid sort/filter state into parameterized WHERE and ORDER BY clauses"""
+        conditions = []
+        params = []
+
+        for key, raw_value in (filters or {}).items():
+            raw_value = str(raw_value).strip() if raw_value is not None else ''
+            if not raw_value:
+                continue
+            if key not in columns:
+                raise ValueError(f"Unknown report column: {key}")
+            expression, value_type, _ = columns[key]
+            condition, values = self._filter_condition(expression, value_type, raw_value)
+            conditions.append(condition)
+            params.extend(values)
+
+        order_by = ''
+        if sort_by:
+            if sort_by not in columns or not columns[sort_by][2]:
+                raise ValueError(f"Report cannot be sorted by: {sort_by}")
+            direction = 'DESC' if descending else 'ASC'
+            terms = columns[sort_by][2] + (tiebreaker,)
+            order_by = ' ORDER BY ' + ', '.join(f'{term} {direction}' for term in terms)
+
+        return conditions, params, order_by
+
+    @staticmethod
+    def _next_day(value):
+        """The day after a YYYY-MM-DD date, the exclusive end of a whole-day range"""
+        value = str(value).strip()[:10]
+        try:
+            day = datetime.strptime(value, '%Y-%m-%d')
+        except ValueError:
+            raise ValueError(f"'{value}' is not a date (YYYY-MM-DD)")
+        return (day + timedelta(days=1)).strftime('%Y-%m-%d')
+
+    def _filter_condition(self, expression, value_type, raw_value):
+        """Build one filter condition, e.g. '>=10' or '2024-01-01..2024-01-31'.
+
+        Dates are stored with a time, so date bounds are whole days: the
+        end of '2024-01-01..2024-01-31' and '<=2024-01-31' is included.
+        """
+        def convert(value):
+            value = value.strip()
+            if value_type == 'number':
+                try:
+                    return float(value)
+                except ValueError:
+                    raise ValueError(f"'{value}' is not a number")
+            return value
+
+        if value_type != 'text' and '..' in raw_value:
+            low, high = raw_value.split('..', 1)
+            if value_type == 'date':
+                return f'{expression} >= ? AND {expression} < ?', [convert(low), self._next_day(high)]
+            return f'{expression} BETWEEN ? AND ?', [convert(low), convert(high)]
+
+        for operator in self.FILTER_OPERATORS:
+            if raw_value.startswith(operator):
+                value = convert(raw_value[len(operator):])
+                if value_type == 'date' and operator in ('<=', '>', '=', '!='):
+                    end = self._next_day(value)
+                    if operator == '<=':
+                        return f'{expression} < ?', [end]
+                    if operator == '>':
+                        return f'{expression} >= ?', [end]
+                    if operator == '=':
+                        return f'{expression} >= ? AND {expression} < ?', [value, end]
+                    return f'({expression} < ? OR {expression} >= ?)', [value, end]
+                return f'{expression} {operator} ?', [value]
+
+        if value_type == 'text':
+            return f'{expression} LIKE ?', [f'%{raw_value}%']
+        if value_type == 'date':
+            # Dates match by prefix so '2024-03' selects the whole month
+            return f'{expression} LIKE ?', [f'{raw_value}%']
+        return f'{expression} = ?', [convert(raw_value)]
+
+    def _stock_report_query(self, sort_by='stock_value', descending=True, filters=None):
+        """Return the stock report SQL and its parameters"""
+        conditions, params, order_by = self._build_clauses(
+            self.STOCK_REPORT_COLUMNS, sort_by, descending, filters, 'm.id'
+        )
+        query = f'''
+            SELECT
+                m.id,
                 m.name,
+                m.batch_number,
                 m.quantity,
                 m.minimum_stock,
                 m.maximum_stock,
                 m.price,
                 (m.quantity * m.price) as stock_value,
+                m.category,
                 s.name as supplier_name,
                 m.expiry_date,
-                CASE 
-                    WHEN m.quantity <= m.minimum_stock THEN 'LOW'
-                    WHEN m.quantity >= m.maximum_stock THEN 'OVERSTOCKED'
-                    ELSE 'NORMAL'
-                END as stock_status
+                {STOCK_STATUS_SQL} as stock_status
             FROM Medicines m
             LEFT JOIN Suppliers s ON m.supplier_id = s.id
-            ORDER BY stock_value DESC
-            ''')
-            return cursor.fetchall()
+            '''
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        return query + order_by, params
 
-    def get_transaction_report(self, start_date=None, end_date=None):
-        """Generate transaction report for date range"""
-        with self.db.get_connection() as conn:
-            cursor = conn.cursor()
-            query = '''
-            SELECT 
+    def _transaction_report_query(self, start_date=None, end_date=None, sort_by='date',
+                                  descending=True, filters=None):
+        """Return the transaction report SQL and its parameters; end_date is included"""
+        conditions, params, order_by = self._build_clauses(
+            self.TRANSACTION_REPORT_COLUMNS, sort_by, descending, filters, 't.id'
+        )
+        if start_date and end_date:
+            conditions.insert(0, 't.date >= ? AND t.date < ?')
+            params[:0] = [str(start_date)[:10], self._next_day(end_date)]
+
+        query = '''
+            SELECT
+                t.id,
                 t.date,
                 m.name as medicine_name,
                 t.transaction_type,
@@ -593,44 +1602,142 @@ class Reports:
                 t.total_amount,
                 u.username,
                 t.reason
-            FROM Transactions t
+            FROM {} t
             JOIN Medicines m ON t.medicine_id = m.id
             JOIN Users u ON t.user_id = u.id
-            '''
-            
-            params = []
-            if start_date and end_date:
-                query += ' WHERE t.date BETWEEN ? AND ?'
-                params = [start_date, end_date]
-            
-            query += ' ORDER BY t.date DESC'
-            
+            '''.format(self.archive.source(start_date, end_date))
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        return query + order_by, params
+
+    def _purchase_report_query(self, start_date=None, end_date=None, supplier_id=None, sort_by='date',
+                               descending=True, filters=None):
+        """Return the purchase report SQL and its parameters.
+
+        Purchases are incoming transactions, credited to the medicine's
+        supplier. Dates are whole days: end_date is included.
+        """
+        conditions, params, order_by = self._build_clauses(
+            self.PURCHASE_REPORT_COLUMNS, sort_by, descending, filters, 't.id'
+        )
+        prefix = ["t.transaction_type = 'incoming'"]
+        prefix_params = []
+        if start_date:
+            prefix.append('t.date >= ?')
+            prefix_params.append(str(start_date)[:10])
+        if end_date:
+            prefix.append('t.date < ?')
+            prefix_params.append(self._next_day(end_date))
+        if supplier_id:
+            prefix.append('m.supplier_id = ?')
+            prefix_params.append(supplier_id)
+
+        query = '''
+            SELECT
+                t.id,
+                t.date,
+                s.name as supplier_name,
+                m.name as medicine_name,
+                t.quantity,
+                t.unit_price,
+                COALESCE(t.total_amount, t.quantity * t.unit_price) as total_amount
+            FROM {} t
+            JOIN Medicines m ON t.medicine_id = m.id
+            LEFT JOIN Suppliers s ON m.supplier_id = s.id
+            '''.format(self.archive.source(start_date, end_date))
+        query += ' WHERE ' + ' AND '.join(prefix + conditions)
+        return query + order_by, prefix_params + params
+
+    def get_purchase_total(self, start_date=None, end_date=None, supplier_id=None, filters=None):
+        """(number of purchases, total cost) matching the purchase report's filters"""
+        query, params = self._purchase_report_query(start_date, end_date, supplier_id, None, filters=filters)
+        with self.db.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'SELECT COUNT(*), COALESCE(SUM(total_amount), 0) FROM ({query})', params)
+            return tuple(cursor.fetchone())
+
+    def _fetch_page(self, query, params, limit, offset):
+        with self.db.get_connection() as conn:
+            cursor = conn.cursor()
+            if limit is not None:
+                query += ' LIMIT ? OFFSET ?'
+                params = list(params) + [limit, offset]
             cursor.execute(query, params)
             return cursor.fetchall()
 
+    def _report_query(self, report_name, **options):
+        if report_name not in self.REPORTS:
+            raise ValueError(f"Unknown report: {report_name}")
+        return getattr(self, self.REPORTS[report_name][0])(**options)
+
+    def report_columns(self, report_name):
+        """Sort/filter whitelist of a named report"""
+        if report_name not in self.REPORTS:
+            raise ValueError(f"Unknown report: {report_name}")
+        return self.REPORTS[report_name][1]
+
+    def get_report(self, report_name, limit=None, offset=0, **options):
+        """Fetch one page of a named report (see REPORTS)"""
+        query, params = self._report_query(report_name, **options)
+        return self._fetch_page(query, params, limit, offset)
+
+    def count_report(self, report_name, **options):
+        """Number of rows a named report would return"""
+        query, params = self._report_query(report_name, **options)
+        with self.db.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'SELECT COUNT(*) FROM ({query})', params)
+            return cursor.fetchone()[0]
+
+    def stream_report(self, report_name, chunk_size=1000, **options):
+        """Yield a named report in chunks of rows without materializing the result set"""
+        query, params = self._report_query(report_name, **options)
+        with self.db.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+
+    def get_stock_report(self, sort_by='stock_value', descending=True, filters=None,
+                         limit=None, offset=0):
+        """Generate comprehensive stock report, optionally one page at a time"""
+        query, params = self._stock_report_query(sort_by, descending, filters)
+        return self._fetch_page(query, params, limit, offset)
+
+    def get_transaction_report(self, start_date=None, end_date=None, sort_by='date',
+                               descending=True, filters=None, limit=None, offset=0):
+        """Generate transaction report for date range, optionally one page at a time"""
+        query, params = self._transaction_report_query(
+            start_date, end_date, sort_by, descending, filters
+        )
+        return self._fetch_page(query, params, limit, offset)
+
     def get_financial_summary(self, start_date=None, end_date=None):
         """Generate financial summary"""
         with self.db.get_connection() as conn:
             cursor = conn.cursor()
             
-            # Total stock value
-            cursor.execute('SELECT SUM(quantity * price) FROM Medicines')
-            total_stock_value = cursor.fetchone()[0] or 0
+            # Total stock value, maintained by the InventoryValue triggers
+            cursor.execute('SELECT COALESCE(SUM(value), 0) FROM InventoryValue')
+            total_stock_value = cursor.fetchone()[0]
             
             # Transaction totals
-            query = '''
+            query = f'''
             SELECT 
                 transaction_type,
                 SUM(total_amount) as total_amount,
                 COUNT(*) as transaction_count
-            FROM Transactions
+            FROM {self.archive.source(start_date, end_date)}
             WHERE total_amount IS NOT NULL
             '''
             
             params = []
             if start_date and end_date:
-                query += ' AND date BETWEEN ? AND ?'
-                params = [start_date, end_date]
+                query += ' AND date >= ? AND date < ?'
+                params = [str(start_date)[:10], self._next_day(end_date)]
             
             query += ' GROUP BY transaction_type'
             
@@ -642,6 +1749,165 @@ class Reports:
                 'transactions': transactions
             }
         
+    def get_supplier_spend(self):
+        """All-time purchases per supplier from the precomputed MedicinePurchaseTotals"""
+        with self.db.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+            SELECT
+                m.supplier_id,
+                COALESCE(s.name, '(no supplier)') as supplier_name,
+                COUNT(*) as medicine_count,
+                SUM(p.purchase_count) as purchase_count,
+                SUM(p.quantity) as quantity,
+                SUM(p.spend) as spend,
+                MAX(p.last_purchase) as last_purchase
+            FROM MedicinePurchaseTotals p
+            JOIN Medicines m ON m.id = p.medicine_id
+            LEFT JOIN Suppliers s ON s.id = m.supplier_id
+            GROUP BY m.supplier_id
+            ORDER BY spend DESC
+            ''')
+            return cursor.fetchall()
+
+    @staticmethod
+    def _period_start(day, period):
+        if period == 'daily':
+            return day
+        if period == 'weekly':
+            return day - timedelta(days=day.weekday())
+        if period == 'monthly':
+            return day.replace(day=1)
+        if period == 'quarterly':
+            return day.replace(month=(day.month - 1) // 3 * 3 + 1, day=1)
+        return day.replace(month=1, day=1)
+
+    @staticmethod
+    def _next_period(start, period):
+        if period == 'daily':
+            return start + timedelta(days=1)
+        if period == 'weekly':
+            return start + timedelta(days=7)
+        month = start.month - 1 + {'monthly': 1, 'quarterly': 3, 'yearly': 12}[period]
+        return start.replace(year=start.year + month // 12, month=month % 12 + 1, day=1)
+
+    @staticmethod
+    def _period_label(start, period):
+        if period == 'weekly':
+            year, week, _ = start.isocalendar()
+            return f'{year}-W{week:02d}'
+        if period == 'monthly':
+            return start.strftime('%Y-%m')
+        if period == 'quarterly':
+            return f'{start.year}-Q{(start.month - 1) // 3 + 1}'
+        if period == 'yearly':
+            return str(start.year)
+        return start.isoformat()
+
+    def sales_periods(self, period, start_date, end_date):
+        """(label, start, end) of each bucket covering the days start_date..end_date.
+
+        Bounds are 'YYYY-MM-DD' strings with `end` exclusive, so each bucket is
+        a plain range on the date column; the first and last buckets are
+        clipped to the requested days. Weeks start on Monday.
+        """
+        if period not in self.SALES_PERIODS:
+            raise ValueError(f"Unknown sales period: {period}")
+        first = datetime.strptime(str(start_date)[:10], '%Y-%m-%d').date()
+        stop = datetime.strptime(str(end_date)[:10], '%Y-%m-%d').date() + timedelta(days=1)
+        if first >= stop:
+            raise ValueError("The start date must not be after the end date")
+
+        periods = []
+        bucket = self._period_start(first, period)
+        while bucket < stop:
+            following = self._next_period(bucket, period)
+            periods.append((self._period_label(bucket, period),
+                            max(bucket, first).isoformat(), min(following, stop).isoformat()))
+            bucket = following
+        return periods
+
+    def _daily_profit(self, cursor, periods):
+        """DailyProfit summed over each (label, start, end) bucket, as Rows"""
+        rows = []
+        for label, start, stop in periods:
+            cursor.execute('''
+            SELECT
+                COALESCE(SUM(sales_count), 0) as transaction_count,
+                COALESCE(SUM(quantity_sold), 0) as quantity,
+                COALESCE(SUM(revenue), 0) as revenue,
+                COALESCE(SUM(cogs), 0) as cogs,
+                COALESCE(SUM(purchases), 0) as purchases
+            FROM DailyProfit
+            WHERE day >= ? AND day < ?
+            ''', (start, stop))
+            rows.append((label, start, stop, cursor.fetchone()))
+        return rows
+
+    def _report_range(self, cursor, start_date, end_date):
+        """Default report range: the first posted day to today"""
+        if not start_date:
+            first_day = cursor.execute('SELECT MIN(day) FROM DailyProfit').fetchone()[0]
+            start_date = first_day or datetime.now().strftime('%Y-%m-%d')
+        return start_date, end_date or datetime.now().strftime('%Y-%m-%d')
+
+    def get_sales_report(self, period='monthly', start_date=None, end_date=None):
+        """Outgoing transactions, quantity, revenue, cost and margin per period bucket.
+
+        Read from DailyProfit, which the cost ledger triggers keep per day (see
+        costing.py), so a bucket is a range over at most a few hundred rows
+        however many transactions it holds, archived years included. Cost is
+        the exact FIFO cost of goods sold. Defaults to every day from the
+        first posting to today.
+        """
+        with self.db.get_connection() as conn:
+            cursor = conn.cursor()
+            start_date, end_date = self._report_range(cursor, start_date, end_date)
+            report = []
+            for label, start, stop, row in self._daily_profit(cursor, self.sales_periods(period, start_date, end_date)):
+                margin = row['revenue'] - row['cogs']
+                report.append({
+                    'period': label,
+                    'start': start,
+                    'end': stop,
+                    'transaction_count': row['transaction_count'],
+                    'quantity': row['quantity'],
+                    'revenue': row['revenue'],
+                    'cost': row['cogs'],
+                    'margin': margin,
+                    'margin_percent': margin / row['revenue'] * 100 if row['revenue'] else 0.0,
+                })
+            return report
+
+    def get_profit_and_loss(self, period='monthly', start_date=None, end_date=None):
+        """Revenue, FIFO cost of goods sold, gross profit and purchases per period bucket"""
+        with self.db.get_connection() as conn:
+            cursor = conn.cursor()
+            start_date, end_date = self._report_range(cursor, start_date, end_date)
+            statement = []
+            for label, start, stop, row in self._daily_profit(cursor, self.sales_periods(period, start_date, end_date)):
+                gross_profit = row['revenue'] - row['cogs']
+                statement.append({
+                    'period': label,
+                    'start': start,
+                    'end': stop,
+                    'revenue': row['revenue'],
+                    'cogs': row['cogs'],
+                    'gross_profit': gross_profit,
+                    'gross_margin': gross_profit / row['revenue'] * 100 if row['revenue'] else 0.0,
+                    'purchases': row['purchases'],
+                })
+            return statement
+
+    @staticmethod
+    def _month_range(month=None, year=None):
+        """[start, end) date strings of a month, so the date index can be used"""
+        today = datetime.now()
+        month = month or today.month
+        year = year or today.year
+        next_year, next_month = (year + 1, 1) if month == 12 else (year, month + 1)
+        return f'{year}-{month:02d}-01', f'{next_year}-{next_month:02d}-01'
+
     def get_total_monthly_sales_report(self, month=None, year=None) -> float:
         """
         Generate total monthly sales report for specified month and year.
@@ -653,19 +1919,20 @@ class Reports:
         Returns:
             float: Total sales amount for the specified month
         """
+        start, end = self._month_range(month, year)
+        source = self.archive.source(start, end)
         with self.db.get_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute('''
+            cursor.execute(f'''
             SELECT 
                 SUM(COALESCE(t.total_amount, t.quantity * t.unit_price, 0)) as total_sales,
                 COUNT(*) as transaction_count,
                 SUM(t.quantity) as total_quantity_sold
-            FROM Transactions t
+            FROM {source} t
             WHERE t.transaction_type = 'outgoing'
-            AND strftime('%Y', t.date) = ?
-            AND strftime('%m', t.date) = ?
+            AND t.date >= ? AND t.date < ?
             AND t.total_amount IS NOT NULL
-            ''', (str(year), f"{month:02d}"))
+            ''', (start, end))
             
             result = cursor.fetchone()
             
@@ -695,10 +1962,12 @@ class Reports:
         Returns:
             dict: Detailed sales report including total, breakdown by medicine, and summary stats
         """
+        start, end = self._month_range(month, year)
+        source = self.archive.source(start, end)
         with self.db.get_connection() as conn:
             cursor = conn.cursor()
             
-            cursor.execute('''
+            cursor.execute(f'''
             SELECT 
                 m.name as medicine_name,
                 m.category,
@@ -707,67 +1976,63 @@ class Reports:
                 SUM(COALESCE(t.total_amount, t.quantity * t.unit_price, 0)) as total_revenue,
                 COUNT(*) as transaction_count,
                 s.name as supplier_name
-            FROM Transactions t
+            FROM {source} t
             JOIN Medicines m ON t.medicine_id = m.id
             LEFT JOIN Suppliers s ON m.supplier_id = s.id
             WHERE t.transaction_type = 'outgoing'
-            AND strftime('%Y', t.date) = ?
-            AND strftime('%m', t.date) = ?
+            AND t.date >= ? AND t.date < ?
             AND t.total_amount IS NOT NULL
             GROUP BY m.id, m.name, m.category, s.name
             ORDER BY total_revenue DESC
-            ''', (str(year), f"{month:02d}"))
+            ''', (start, end))
             
             medicine_breakdown = cursor.fetchall()
 
-            cursor.execute('''
+            cursor.execute(f'''
             SELECT 
                 SUM(COALESCE(t.total_amount, t.quantity * t.unit_price, 0)) as total_sales,
                 COUNT(*) as total_transactions,
                 SUM(t.quantity) as total_quantity_sold,
                 COUNT(DISTINCT t.medicine_id) as unique_medicines_sold
-            FROM Transactions t
+            FROM {source} t
             WHERE t.transaction_type = 'outgoing'
-            AND strftime('%Y', t.date) = ?
-            AND strftime('%m', t.date) = ?
+            AND t.date >= ? AND t.date < ?
             AND t.total_amount IS NOT NULL
-            ''', (str(year), f"{month:02d}"))
+            ''', (start, end))
             
             totals = cursor.fetchone()
             
-            cursor.execute('''
+            cursor.execute(f'''
             SELECT 
                 m.name,
                 SUM(t.quantity) as quantity_sold,
                 SUM(COALESCE(t.total_amount, t.quantity * t.unit_price, 0)) as revenue
-            FROM Transactions t
+            FROM {source} t
             JOIN Medicines m ON t.medicine_id = m.id
             WHERE t.transaction_type = 'outgoing'
-            AND strftime('%Y', t.date) = ?
-            AND strftime('%m', t.date) = ?
+            AND t.date >= ? AND t.date < ?
             AND t.total_amount IS NOT NULL
             GROUP BY m.id, m.name
             ORDER BY quantity_sold DESC
             LIMIT 10
-            ''', (str(year), f"{month:02d}"))
+            ''', (start, end))
             
             top_selling = cursor.fetchall()
             
-            cursor.execute('''
+            cursor.execute(f'''
             SELECT 
                 m.category,
                 SUM(COALESCE(t.total_amount, t.quantity * t.unit_price, 0)) as category_revenue,
                 SUM(t.quantity) as category_quantity,
                 COUNT(*) as category_transactions
-            FROM Transactions t
+            FROM {source} t
             JOIN Medicines m ON t.medicine_id = m.id
             WHERE t.transaction_type = 'outgoing'
-            AND strftime('%Y', t.date) = ?
-            AND strftime('%m', t.date) = ?
+            AND t.date >= ? AND t.date < ?
             AND t.total_amount IS NOT NULL
             GROUP BY m.category
             ORDER BY category_revenue DESC
-            ''', (str(year), f"{month:02d}"))
+            ''', (start, end))
             
             category_breakdown = cursor.fetchall()
             
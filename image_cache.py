@@ -0,0 +1,135 @@
+
+import os
+import threading
+from collections import OrderedDict
+
+from PIL import Image
+
+
+class ByteLRU:
+    """Least recently used mapping bounded by the total size of its values in bytes"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.items = OrderedDict()
+
+    def get(self, key):
+        item = self.items.get(key)
+        if item is None:
+            return None
+        self.items.move_to_end(key)
+        return item[0]
+
+    def put(self, key, value, size):
+        if key in self.items:
+            self.bytes -= self.items.pop(key)[1]
+        if size > self.max_bytes:
+            return
+        self.items[key] = (value, size)
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            _, (_, evicted) = self.items.popitem(last=False)
+            self.bytes -= evicted
+
+    def clear(self):
+        self.items.clear()
+        self.bytes = 0
+
+
+def image_bytes(image):
+    return image.width * image.height * len(image.getbands())
+
+
+class ImageCache:
+    """Process-wide cache of decoded images and of their scaled variants.
+
+    Originals are decoded once per file version (path and mtime) however
+    often the screens showing them are rebuilt. Scaled variants are keyed by
+    size and filter and share a byte budget, so a window dragged back to an
+    earlier size is served without resampling. preview() gives a cheap
+    rendering for use while the size is still changing: JPEGs are decoded
+    in draft mode, which lets libjpeg scale by 1/2 to 1/8 while decoding,
+    and resized with a bilinear filter.
+    """
+
+    def __init__(self, max_original_bytes=64 * 1024 * 1024, max_scaled_bytes=48 * 1024 * 1024):
+        self.originals = ByteLRU(max_original_bytes)
+        self.drafts = ByteLRU(max_original_bytes // 4)
+        self.scaled_images = ByteLRU(max_scaled_bytes)
+        self.lock = threading.RLock()
+
+    @staticmethod
+    def version(path):
+        return path, os.stat(path).st_mtime_ns
+
+    def original(self, path):
+        """The fully decoded image at path"""
+        key = self.version(path)
+        with self.lock:
+            image = self.originals.get(key)
+            if image is None:
+                with Image.open(path) as opened:
+                    image = opened.convert('RGB') if opened.mode not in ('RGB', 'RGBA') else opened.copy()
+                self.originals.put(key, image, image_bytes(image))
+            return image
+
+    def draft(self, path, size):
+        """path reduced by 2, 4 or 8 while staying at least `size` big, for previews"""
+        key = self.version(path)
+        with self.lock:
+            original = self.originals.get(key)
+            opened = Image.open(path) if original is None else None
+            try:
+                width, height = (original if original is not None else opened).size
+                scale = min(width // max(size[0], 1), height // max(size[1], 1))
+                factor = next((f for f in (8, 4, 2) if scale >= f), 1)
+                if factor == 1 or (opened is not None and opened.format != 'JPEG'):
+                    return original if original is not None else self.original(path)
+
+                draft_key = key + (factor,)
+                image = self.drafts.get(draft_key)
+                if image is None:
+                    if original is not None:
+                        image = original.reduce(factor)
+                    else:
+                        # libjpeg scales by 1/2, 1/4 or 1/8 while decoding
+                        opened.draft('RGB', (width // factor, height // factor))
+                        image = opened.convert('RGB')
+                    self.drafts.put(draft_key, image, image_bytes(image))
+                return image
+            finally:
+                if opened is not None:
+                    opened.close()
+
+    def cached(self, path, size, resample=Image.Resampling.LANCZOS):
+        """The scaled variant if it is already in the cache, without doing any work"""
+        with self.lock:
+            return self.scaled_images.get(self.version(path) + (size, resample))
+
+    def scaled(self, path, size, resample=Image.Resampling.LANCZOS):
+        """path resized to size with resample, from the cache when possible"""
+        key = self.version(path) + (size, resample)
+        with self.lock:
+            image = self.scaled_images.get(key)
+            if image is None:
+                image = self.original(path).resize(size, resample)
+                self.scaled_images.put(key, image, image_bytes(image))
+            return image
+
+    def preview(self, path, size):
+        """Cheap rendering of path at size; not cached, it is replaced once the size settles"""
+        image = self.cached(path, size)
+        if image is not None:
+            return image
+        return self.draft(path, size).resize(size, Image.Resampling.BILINEAR)
+
+    def clear(self):
+        with self.lock:
+            self.originals.clear()
+            self.drafts.clear()
+            self.scaled_images.clear()
+
+
+# Shared by every screen, so rebuilding one does not decode its images again
+image_cache = ImageCache()
@@ -1,27 +1,56 @@
+from startup_profile import profiler
+if __name__ == "__main__":
+    # Time zero for the startup report, before any other import
+    profiler.start()
+
+import os
+import queue
+import threading
+import time
 import tkinter as tk
 from tkinter import ttk
 from tkinter import messagebox
-from tkcalendar import DateEntry
-from PIL import Image, ImageTk
-from database_new_Architecture import Database, User, Medicine, Supplier, Reports
-from datetime import date, datetime
+from tkinter import filedialog
+from datetime import date, datetime, timedelta
 import calendar
+import importlib
+import logging
+from collections import OrderedDict
+
+
+logger = logging.getLogger(__name__)
 
+# Imported in the background once the splash is up (data layer) or once the
+# login window is showing (everything only the screens need), so neither
+# delays the first window. See MedicineWarehouseApp.initialize.
+STARTUP_MODULES = ('database_new_Architecture', 'backup', 'retention', 'revenue')
+PREFETCH_MODULES = ('tkcalendar', 'PIL.ImageTk', 'image_cache', 'thumbnails', 'report_export')
+
+
+def DateEntry(*args, **kwargs):
+    """tkcalendar.DateEntry, imported on first use because tkcalendar pulls in babel"""
+    from tkcalendar import DateEntry
+    return DateEntry(*args, **kwargs)
 
 
 class ActivityMonitor:
-    """Monitor user activity and handle automatic logout after inactivity"""
+    """Monitor user activity and handle automatic logout after inactivity.
+
+    Input events only stamp last_activity. One low-frequency timer compares
+    that stamp against the warning and logout thresholds, so a burst of
+    mouse motion costs a clock read per event and no timer churn.
+    """
     
-    def __init__(self, parent, timeout_minutes=10):
+    def __init__(self, parent, timeout_minutes=10, check_ms=5000):
         self.parent = parent
         self.timeout_minutes = timeout_minutes
-        self.timeout_ms = timeout_minutes * 60 * 100 # ms
-        self.last_activity = datetime.now()
+        self.check_ms = check_ms
+        self.last_activity = time.monotonic()
         self.warning_shown = False
-        self.logout_job = None
-        self.warning_job = None
+        self.warning_window = None
         self.check_job = None
         self.is_active = False
+        self.events_bound = False
         
         self.activity_events = [
             '<Motion>', '<Button-1>', '<Button-2>', '<Button-3>', 
@@ -32,7 +61,8 @@ class ActivityMonitor:
     def start_monitoring(self):
         """Start monitoring user activity"""
         self.is_active = True
-        self.reset_timer()
+        self.last_activity = time.monotonic()
+        self.warning_shown = False
         self.bind_activity_events()
         self.schedule_activity_check()
         
@@ -40,69 +70,69 @@ class ActivityMonitor:
         """Stop monitoring user activity"""
         self.is_active = False
         self.cancel_all_jobs()
-        self.unbind_activity_events()
+        self.close_warning()
         
     def bind_activity_events(self):
-        """Bind activity events to the main window and all child widgets"""
-        def bind_recursive(widget):
-            for event in self.activity_events:
-                widget.bind(event, self.on_activity, add=True)
-            
-            for child in widget.winfo_children():
-                bind_recursive(child)
-        
-        bind_recursive(self.parent)
-        
-    def unbind_activity_events(self):
-        """Unbind activity events from all widgets"""
-        def unbind_recursive(widget):
-            for event in self.activity_events:
-                try:
-                    widget.unbind(event)
-                except:
-                    pass
-            
-            for child in widget.winfo_children():
-                unbind_recursive(child)
-        
-        unbind_recursive(self.parent)
+        """Hook the activity events once, on the main window's bindtag.
+
+        Every widget inside the main window has the window's path in its
+        bindtags, so one binding per event sees input on all of them,
+        including screens created later. It stays for the life of the app,
+        so nothing accumulates across frame switches or logouts. (bind_all
+        would be replaced by the scrolling screens' <MouseWheel> binding.)
+        Toplevels are not inside the main window; see watch().
+        """
+        if self.events_bound:
+            return
+        self.watch(self.parent)
+        self.events_bound = True
+
+    def watch(self, window):
+        """Count input anywhere in window (a Toplevel) as activity.
+
+        The bindings go on the window's own bindtag, which all its widgets
+        carry, and are destroyed with it.
+        """
+        for event in self.activity_events:
+            window.bind(event, self.on_activity, add=True)
         
     def on_activity(self, event=None):
         """Handle user activity"""
-        if not self.is_active:
-            return
-            
-        self.last_activity = datetime.now()
-        self.warning_shown = False
-        
-        self.cancel_all_jobs()
-        self.reset_timer()
-        
-    def reset_timer(self):
-        """Reset the inactivity timer"""
-        warning_time = max(1, (self.timeout_minutes - 2) * 60 * 1000)
-        self.warning_job = self.parent.after(warning_time, self.show_warning)
-        
-        self.logout_job = self.parent.after(self.timeout_ms, self.auto_logout)
-        
+        self.last_activity = time.monotonic()
+
+    def idle_seconds(self):
+        return time.monotonic() - self.last_activity
+
     def schedule_activity_check(self):
         """Schedule periodic activity checks"""
         if self.is_active:
             self.check_activity()
-            self.check_job = self.parent.after(30000, self.schedule_activity_check)
+            if self.is_active:
+                self.check_job = self.parent.after(self.check_ms, self.schedule_activity_check)
             
     def check_activity(self):
         """Check if user has been inactive for too long"""
         if not self.is_active:
             return
             
-        time_since_activity = (datetime.now() - self.last_activity).total_seconds()
+        time_since_activity = self.idle_seconds()
+        timeout_seconds = self.timeout_minutes * 60
+        warning_seconds = timeout_seconds - self.warning_lead_seconds()
         
-        if time_since_activity >= (self.timeout_minutes * 60):
+        if time_since_activity >= timeout_seconds:
             self.auto_logout()
-        elif time_since_activity >= ((self.timeout_minutes - 2) * 60) and not self.warning_shown:
-            self.show_warning()
-            
+        elif time_since_activity >= warning_seconds:
+            if not self.warning_shown:
+                self.show_warning()
+        elif self.warning_shown:
+            # The user came back before the logout
+            self.warning_shown = False
+            self.close_warning()
+            
+    def warning_lead_seconds(self):
+        """How long before the logout the warning appears: 2 minutes, at most half the timeout"""
+        return min(120, self.timeout_minutes * 60 // 2)
+
     def show_warning(self):
         """Show inactivity warning dialog"""
         if not self.is_active or self.warning_shown:
@@ -110,7 +140,7 @@ class ActivityMonitor:
             
         self.warning_shown = True
         
-        warning_window = tk.Toplevel(self.parent)
+        warning_window = self.warning_window = tk.Toplevel(self.parent)
         warning_window.title("Session Timeout Warning")
         warning_window.geometry("400x200")
         warning_window.resizable(False, False)
@@ -136,9 +166,14 @@ class ActivityMonitor:
         )
         warning_label.pack(pady=(0, 10))
         
+        lead = self.warning_lead_seconds()
+        if lead >= 60 and lead % 60 == 0:
+            time_left = f"{int(lead // 60)} minute{'s' if lead >= 120 else ''}"
+        else:
+            time_left = f"{lead:g} seconds"
         message_label = tk.Label(
             main_frame,
-            text="You will be logged out in 2 minutes due to inactivity.\nClick 'Stay Logged In' to continue your session.",
+            text=f"You will be logged out in {time_left} due to inactivity.\nClick 'Stay Logged In' to continue your session.",
             font=("Arial", 12),
             bg="#2C3E50",
             fg="#ECF0F1",
@@ -150,11 +185,12 @@ class ActivityMonitor:
         button_frame.pack(pady=20)
         
         def stay_logged_in():
-            self.on_activity() 
-            warning_window.destroy()
+            self.on_activity()
+            self.warning_shown = False
+            self.close_warning()
             
         def logout_now():
-            warning_window.destroy()
+            self.close_warning()
             self.auto_logout()
             
         stay_button = tk.Button(
@@ -205,21 +241,59 @@ class ActivityMonitor:
         
         self.parent.logout()
         
+    def close_warning(self):
+        if self.warning_window is not None and self.warning_window.winfo_exists():
+            self.warning_window.destroy()
+        self.warning_window = None
+
     def cancel_all_jobs(self):
         """Cancel all scheduled jobs"""
-        if self.logout_job:
-            self.parent.after_cancel(self.logout_job)
-            self.logout_job = None
-            
-        if self.warning_job:
-            self.parent.after_cancel(self.warning_job)
-            self.warning_job = None
-            
         if self.check_job:
             self.parent.after_cancel(self.check_job)
             self.check_job = None
 
 
+class SplashScreen(tk.Toplevel):
+    """Borderless window shown while the database is opened in the background"""
+
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.overrideredirect(True)
+        self.configure(bg="#2C3E50")
+        self.create_widgets()
+
+        self.update_idletasks()
+        width, height = 360, 140
+        x = (self.winfo_screenwidth() // 2) - (width // 2)
+        y = (self.winfo_screenheight() // 2) - (height // 2)
+        self.geometry(f'{width}x{height}+{x}+{y}')
+
+    def create_widgets(self):
+        main_frame = tk.Frame(self, bg="#2C3E50", padx=30, pady=25)
+        main_frame.pack(fill="both", expand=True)
+
+        tk.Label(
+            main_frame,
+            text="Medicine Warehouse System",
+            font=("Arial", 14, "bold"),
+            bg="#2C3E50",
+            fg="#ECF0F1"
+        ).pack()
+
+        self.status_label = tk.Label(
+            main_frame,
+            text="Opening database...",
+            font=("Arial", 10),
+            bg="#2C3E50",
+            fg="#BDC3C7"
+        )
+        self.status_label.pack(pady=(8, 10))
+
+        self.progress = ttk.Progressbar(main_frame, mode="indeterminate")
+        self.progress.pack(fill="x")
+        self.progress.start(15)
+
+
 class LoginWindow(tk.Toplevel):
     """A simple login window that prompts for username and password."""
 
@@ -235,6 +309,7 @@ class LoginWindow(tk.Toplevel):
         self.center_window()
 
         self.configure(bg="#2C3E50")
+        self.events = None
         self.create_widgets()
 
     def center_window(self):
@@ -302,7 +377,7 @@ class LoginWindow(tk.Toplevel):
         )
         self.password_entry.pack(fill="x", ipady=8)
 
-        login_button = tk.Button(
+        self.login_button = tk.Button(
             main_frame, 
             text="Login", 
             command=self.login, 
@@ -314,7 +389,18 @@ class LoginWindow(tk.Toplevel):
             cursor="hand2",
             activebackground="#2980B9"
         )
-        login_button.pack(fill="x", pady=(20, 0), ipady=10)
+        self.login_button.pack(fill="x", pady=(20, 0), ipady=10)
+
+        # Shown while the credentials are checked on a worker thread
+        self.spinner = ttk.Progressbar(main_frame, mode="indeterminate")
+        self.status_label = tk.Label(
+            main_frame,
+            text="",
+            bg="#2C3E50",
+            fg="#BDC3C7",
+            font=("Arial", 10)
+        )
+        self.status_label.pack(pady=(10, 0))
 
         self.username_entry.bind("<Return>", self.focus_password_entry)
         self.password_entry.bind("<Return>", self.login)
@@ -325,6 +411,9 @@ class LoginWindow(tk.Toplevel):
         self.password_entry.focus()
 
     def login(self, event=None):
+        if self.events is not None:
+            return
+
         username = self.username_entry.get().strip()
         password = self.password_entry.get().strip()
 
@@ -332,21 +421,66 @@ class LoginWindow(tk.Toplevel):
             messagebox.showerror("Error", "Please enter both username and password!")
             return
 
+        # PBKDF2 takes a noticeable fraction of a second; run it on a worker
+        # so the window keeps repainting and the spinner keeps moving
+        self.set_busy(True)
+        self.events = queue.Queue()
+        threading.Thread(
+            target=self.check_credentials,
+            args=(username, password, self.events),
+            name="login",
+            daemon=True
+        ).start()
+        self.poll_login()
+
+    def check_credentials(self, username, password, events):
+        """Worker thread: verify the password and hand the result to the Tk thread"""
+        user_manager = self.parent.user_manager
         try:
-            user_data = self.parent.user_manager.authenticate(username, password)
+            events.put(user_manager.check_credentials(username, password))
+        except Exception as e:
+            events.put((None, f"Login failed: {str(e)}"))
+        finally:
+            user_manager.db.close_connection()
+
+    def poll_login(self):
+        if not self.winfo_exists():
+            return
+        try:
+            user_data, error = self.events.get_nowait()
+        except queue.Empty:
+            self.after(30, self.poll_login)
+            return
 
-            if user_data:
+        self.events = None
+        if user_data:
+            try:
                 self.parent.set_user(
                     user_data["username"], user_data["role"], user_data["id"]
                 )
                 self.destroy()
                 self.parent.deiconify()
-            else:
-                messagebox.showerror("Error", "Invalid username or password!")
-                self.password_entry.delete(0, tk.END)
-                self.username_entry.focus()
-        except Exception as e:
-            messagebox.showerror("Error", f"Login failed: {str(e)}")
+            except Exception as e:
+                messagebox.showerror("Error", f"Login failed: {str(e)}")
+            return
+
+        self.set_busy(False)
+        messagebox.showerror("Error", error or "Invalid username or password!")
+        self.password_entry.delete(0, tk.END)
+        self.username_entry.focus()
+
+    def set_busy(self, busy):
+        state = "disabled" if busy else "normal"
+        for widget in (self.username_entry, self.password_entry, self.login_button):
+            widget.config(state=state)
+        if busy:
+            self.status_label.config(text="Verifying credentials...")
+            self.spinner.pack(fill="x", pady=(10, 0), before=self.status_label)
+            self.spinner.start(15)
+        else:
+            self.status_label.config(text="")
+            self.spinner.stop()
+            self.spinner.pack_forget()
 
 
 class Sidebar(tk.Frame):
@@ -518,17 +652,31 @@ class Header(tk.Frame):
 
 
 class ResizableImageFrame(tk.Frame):
-    """ """
-    def __init__(self, parent, image_path):
+    """Image scaled to fill the frame, from the process-wide image_cache.
+
+    <Configure> bursts while the window edge is dragged are coalesced: a
+    cheap preview is drawn at most every preview_ms, and the LANCZOS
+    rendering once the size has not changed for settle_ms.
+    """
+    def __init__(self, parent, image_path, preview_ms=50, settle_ms=200):
+        from PIL import ImageTk
+        from image_cache import image_cache
+
         super().__init__(parent)
         self.pack_propagate(False)
+        self.cache = image_cache
+        self.image_path = image_path
+        self.preview_ms = preview_ms
+        self.settle_ms = settle_ms
+        self.size = None
+        self.preview_job = None
+        self.settle_job = None
         try:
-            self.original_image = Image.open(image_path)
-            self.image = ImageTk.PhotoImage(self.original_image)
+            self.image = ImageTk.PhotoImage(self.cache.original(image_path))
         except Exception as e:
             print(f"Error loading image {image_path}: {e}")
-            self.original_image = Image.new('RGB', (400, 300), color='lightblue')
-            self.image = ImageTk.PhotoImage(self.original_image)
+            self.image_path = None
+            self.image = ImageTk.PhotoImage(self.placeholder((400, 300)))
 
         self.canvas = tk.Canvas(self, highlightthickness=0)
         self.canvas.pack(fill="both", expand=True)
@@ -536,18 +684,57 @@ class ResizableImageFrame(tk.Frame):
         self.image_id = self.canvas.create_image(0, 0, anchor="nw", image=self.image)
         self.bind("<Configure>", self.resize_image)
 
+    @staticmethod
+    def placeholder(size):
+        from PIL import Image
+
+        return Image.new('RGB', size, color='lightblue')
+
     def resize_image(self, event):
-        if event.width > 1 and event.height > 1:
-            new_width = event.width
-            new_height = event.height
+        if event.width <= 1 or event.height <= 1 or (event.width, event.height) == self.size:
+            return
+        self.size = (event.width, event.height)
 
-            resized_image = self.original_image.resize(
-                (new_width, new_height), Image.Resampling.LANCZOS
-            )
-            self.image = ImageTk.PhotoImage(resized_image)
+        # A size seen before is already scaled
+        cached = self.image_path and self.cache.cached(self.image_path, self.size)
+        if cached or not self.image_path:
+            self.cancel_jobs()
+            self.show(cached or self.placeholder(self.size))
+            return
+
+        if self.preview_job is None:
+            self.preview_job = self.after(self.preview_ms, self.show_preview)
+        if self.settle_job is not None:
+            self.after_cancel(self.settle_job)
+        self.settle_job = self.after(self.settle_ms, self.show_final)
+
+    def show_preview(self):
+        self.preview_job = None
+        self.show(self.cache.preview(self.image_path, self.size))
+
+    def show_final(self):
+        self.settle_job = None
+        if self.preview_job is not None:
+            self.after_cancel(self.preview_job)
+            self.preview_job = None
+        self.show(self.cache.scaled(self.image_path, self.size))
+
+    def show(self, image):
+        from PIL import ImageTk
 
-            self.canvas.itemconfig(self.image_id, image=self.image)
-            self.canvas.config(width=new_width, height=new_height)
+        self.image = ImageTk.PhotoImage(image)
+        self.canvas.itemconfig(self.image_id, image=self.image)
+        self.canvas.config(width=image.width, height=image.height)
+
+    def cancel_jobs(self):
+        for job in (self.preview_job, self.settle_job):
+            if job is not None:
+                self.after_cancel(job)
+        self.preview_job = self.settle_job = None
+
+    def destroy(self):
+        self.cancel_jobs()
+        super().destroy()
 
 
 class Dashboard(tk.Frame):
@@ -587,19 +774,16 @@ class Dashboard(tk.Frame):
     def create_info_cards(self):
         cards_frame = tk.Frame(self, bg=self.bg, pady=20)
         cards_frame.pack(fill="x", padx=50)
-        total_med = self.parent.medicine_manager.get_medicine_count()
-        active_supp = self.parent.supplier_manager.get_supplier_count()
-        low_stock = len(self.parent.medicine_manager.get_low_stock_medicines())
-        monthly_sales = self.parent.reports.get_total_monthly_sales_report(date.today().month,date.today().year)
 
         cards = [
-            ("Total Medicines", total_med, "#3498DB"),
-            ("Active Suppliers", active_supp, "#2ECC71"),
-            ("Stock Alerts", low_stock, "#E74C3C"),
-            ("Monthly Sales", monthly_sales, "#F39C12")
+            ("Total Medicines", "#3498DB"),
+            ("Active Suppliers", "#2ECC71"),
+            ("Stock Alerts", "#E74C3C"),
+            ("Monthly Sales", "#F39C12")
         ]
+        self.card_labels = []
 
-        for i, (title, value, color) in enumerate(cards):
+        for i, ((title, color), value) in enumerate(zip(cards, self.get_card_values())):
             card_frame = tk.Frame(cards_frame, bg=color, relief="flat", bd=0)
             card_frame.grid(row=0, column=i, padx=15, pady=10, sticky="ew")
             cards_frame.grid_columnconfigure(i, weight=1)
@@ -612,6 +796,7 @@ class Dashboard(tk.Frame):
                 bg=color
             )
             value_label.pack(pady=(15, 5))
+            self.card_labels.append(value_label)
 
             title_label = tk.Label(
                 card_frame,
@@ -622,6 +807,19 @@ class Dashboard(tk.Frame):
             )
             title_label.pack(pady=(0, 15))
 
+    def get_card_values(self):
+        return (
+            self.parent.medicine_manager.get_medicine_count(),
+            self.parent.supplier_manager.get_supplier_count(),
+            len(self.parent.medicine_manager.get_low_stock_medicines()),
+            self.parent.reports.get_total_monthly_sales_report(date.today().month, date.today().year),
+        )
+
+    def refresh(self):
+        """Update the cards when the cached screen is shown again"""
+        for label, value in zip(self.card_labels, self.get_card_values()):
+            label.config(text=value)
+
     def create_image_gallery(self):
         gallery_frame = tk.Frame(self, bg=self.bg)
         gallery_frame.pack(expand=True, fill="both", padx=50, pady=20)
@@ -672,12 +870,410 @@ class Dashboard(tk.Frame):
         gallery_frame.grid_rowconfigure(0, weight=1)
 
 
+class ReportGrid(tk.Frame):
+    """Treeview over a named Reports query whose sorting, filtering and paging are all done in SQL.
+
+    `columns` is a list of (key, heading, width). A column is filterable if the
+    report whitelists it and sortable if the whitelist gives it ORDER BY
+    expressions. `format_row` turns one database row into Treeview values and
+    `options` holds extra query arguments such as a date range. Given a
+    ThumbnailService, each row shows the picture of the medicine whose id is
+    in its `thumbnail_key` column; thumbnails not yet in memory are fetched
+    on the service's pool and filled in as they arrive.
+    """
+    def __init__(self, parent, reports, report_name, columns, format_row, sort_by=None,
+                 descending=False, options=None, page_size=200, height=15, bg="#FFFFFF",
+                 thumbnails=None, thumbnail_key="id"):
+        super().__init__(parent, bg=bg)
+        self.bg = bg
+        self.reports = reports
+        self.report_name = report_name
+        self.columns = columns
+        self.whitelist = reports.report_columns(report_name)
+        self.format_row = format_row
+        self.options = options or {}
+        self.sort_by = sort_by
+        self.descending = descending
+        self.page_size = page_size
+        self.height = height
+        self.offset = 0
+        self.has_more = False
+        self.loading = False
+        self.filter_vars = {}
+        self.thumbnails = thumbnails
+        self.thumbnail_key = thumbnail_key
+        self.thumbnail_images = {}
+        self.thumbnail_events = queue.Queue()
+        self.thumbnail_job = None
+        self.thumbnails_pending = 0
+        self.create_widgets()
 
+    def create_widgets(self):
+        filter_frame = tk.Frame(self, bg=self.bg)
+        filter_frame.grid(row=0, column=0, columnspan=2, sticky="ew", pady=(0, 5))
+
+        column_index = 0
+        for key, heading, width in self.columns:
+            if key not in self.whitelist:
+                continue
+            tk.Label(filter_frame, text=heading, bg=self.bg, fg="#7F8C8D", font=("Arial", 8)).grid(
+                row=0, column=column_index, padx=2, sticky="w"
+            )
+            var = tk.StringVar()
+            entry = tk.Entry(filter_frame, textvariable=var, width=max(8, width // 10), font=("Arial", 9))
+            entry.grid(row=1, column=column_index, padx=2, sticky="ew")
+            entry.bind("<Return>", lambda e: self.reload())
+            self.filter_vars[key] = var
+            column_index += 1
 
+        tk.Button(
+            filter_frame,
+            text="Filter",
+            command=self.reload,
+            bg="#3498DB",
+            fg="white",
+            font=("Arial", 9, "bold"),
+            relief="flat",
+            cursor="hand2"
+        ).grid(row=1, column=column_index, padx=(8, 2))
+
+        tk.Button(
+            filter_frame,
+            text="Clear",
+            command=self.clear_filters,
+            bg="#95A5A6",
+            fg="white",
+            font=("Arial", 9, "bold"),
+            relief="flat",
+            cursor="hand2"
+        ).grid(row=1, column=column_index + 1, padx=2)
+
+        tk.Button(
+            filter_frame,
+            text="Export...",
+            command=self.export,
+            bg="#16A085",
+            fg="white",
+            font=("Arial", 9, "bold"),
+            relief="flat",
+            cursor="hand2"
+        ).grid(row=1, column=column_index + 2, padx=2)
+
+        keys = [key for key, _, _ in self.columns]
+        if self.thumbnails:
+            style = ttk.Style(self)
+            style.configure("Thumbnail.Treeview", rowheight=self.thumbnails.size + 6)
+            self.tree = ttk.Treeview(self, columns=keys, show="tree headings", height=self.height,
+                                     style="Thumbnail.Treeview")
+            self.tree.column("#0", width=self.thumbnails.size + 24, stretch=False)
+        else:
+            self.tree = ttk.Treeview(self, columns=keys, show="headings", height=self.height)
+        for key, heading, width in self.columns:
+            self.tree.column(key, width=width, anchor="center")
+        self.update_headings()
+
+        v_scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.tree.yview)
+        h_scrollbar = ttk.Scrollbar(self, orient="horizontal", command=self.tree.xview)
+        self.v_scrollbar = v_scrollbar
+
+        self.tree.configure(yscrollcommand=self.on_tree_scroll, xscrollcommand=h_scrollbar.set)
+
+        self.tree.grid(row=1, column=0, sticky="nsew")
+        v_scrollbar.grid(row=1, column=1, sticky="ns")
+        h_scrollbar.grid(row=2, column=0, sticky="ew")
+
+        self.status_label = tk.Label(self, text="", bg=self.bg, fg="#7F8C8D", font=("Arial", 9))
+        self.status_label.grid(row=3, column=0, sticky="w", pady=(5, 0))
+
+        self.grid_rowconfigure(1, weight=1)
+        self.grid_columnconfigure(0, weight=1)
+
+    def is_sortable(self, key):
+        return key in self.whitelist and self.whitelist[key][2] is not None
+
+    def update_headings(self):
+        for key, heading, _ in self.columns:
+            if not self.is_sortable(key):
+                self.tree.heading(key, text=heading)
+                continue
+            if key == self.sort_by:
+                heading = f"{heading} {'▼' if self.descending else '▲'}"
+            self.tree.heading(key, text=heading, command=lambda k=key: self.sort_by_column(k))
+
+    def sort_by_column(self, key):
+        """Re-run the query ordered by the clicked column"""
+        if key == self.sort_by:
+            self.descending = not self.descending
+        else:
+            self.sort_by = key
+            self.descending = False
+        self.update_headings()
+        self.reload()
+
+    def apply(self, filters=None, sort_by=None, descending=False):
+        """Replace the grid state programmatically and reload"""
+        for key, var in self.filter_vars.items():
+            var.set((filters or {}).get(key, ""))
+        if sort_by:
+            self.sort_by = sort_by
+            self.descending = descending
+            self.update_headings()
+        self.reload()
+
+    def clear_filters(self):
+        for var in self.filter_vars.values():
+            var.set("")
+        self.reload()
+
+    def get_filters(self):
+        return {key: var.get() for key, var in self.filter_vars.items() if var.get().strip()}
+
+    def query_options(self):
+        """Current grid state as Reports query arguments"""
+        return dict(self.options, sort_by=self.sort_by, descending=self.descending,
+                    filters=self.get_filters())
+
+    def export(self):
+        """Export the report with the grid's current sort and filters"""
+        ExportDialog.ask(self, self.reports, self.report_name, **self.query_options())
+
+    def refresh(self):
+        """Re-run the query if the grid is showing rows; grids start empty until asked"""
+        if self.tree.get_children():
+            self.reload()
+
+    def reload(self):
+        """Drop the loaded rows and fetch the first page again"""
+        self.tree.delete(*self.tree.get_children())
+        self.thumbnail_images.clear()
+        self.offset = 0
+        self.has_more = True
+        self.load_next_page()
+
+    def load_next_page(self):
+        if self.loading or not self.has_more:
+            return
+        self.loading = True
+        try:
+            rows = self.reports.get_report(
+                self.report_name,
+                limit=self.page_size,
+                offset=self.offset,
+                **self.query_options()
+            )
+        except ValueError as e:
+            self.has_more = False
+            messagebox.showerror("Error", f"Invalid filter: {str(e)}")
+            return
+        finally:
+            self.loading = False
+
+        items = [(self.tree.insert("", "end", values=self.format_row(row)), row) for row in rows]
+        if self.thumbnails and items:
+            self.load_thumbnails(items)
+
+        self.offset += len(rows)
+        self.has_more = len(rows) == self.page_size
+        more_text = " (scroll for more)" if self.has_more else ""
+        self.status_label.config(text=f"Showing {self.offset} rows{more_text}")
+
+    def on_tree_scroll(self, first, last):
+        """Scrollbar callback that fetches the next page once the end is reached"""
+        self.v_scrollbar.set(first, last)
+        if self.has_more and not self.loading and float(last) >= 1.0 and self.offset:
+            self.after_idle(self.load_next_page)
+
+    def load_thumbnails(self, items):
+        """Show the rows' pictures: those in memory now, the rest as the pool delivers them"""
+        try:
+            primary = self.thumbnails.images.get_primary_images({row[self.thumbnail_key] for _, row in items})
+        except Exception as e:
+            logger.error(f"Could not look up thumbnails: {e}")
+            return
 
+        for item, row in items:
+            image = primary.get(row[self.thumbnail_key])
+            if image is None:
+                continue
+            image_id, sha256 = image
+            cached = self.thumbnails.cached(sha256)
+            if cached is not None:
+                self.set_thumbnail(item, cached)
+                continue
+            self.thumbnails_pending += 1
+            self.thumbnails.request(image_id, sha256).add_done_callback(
+                lambda future, item=item: self.thumbnail_events.put((item, future))
+            )
+        if self.thumbnails_pending and self.thumbnail_job is None:
+            self.thumbnail_job = self.after(30, self.poll_thumbnails)
 
+    def poll_thumbnails(self):
+        self.thumbnail_job = None
+        while True:
+            try:
+                item, future = self.thumbnail_events.get_nowait()
+            except queue.Empty:
+                break
+            self.thumbnails_pending -= 1
+            if future.cancelled() or future.exception() is not None:
+                if not future.cancelled():
+                    logger.error(f"Thumbnail failed: {future.exception()}")
+                continue
+            # Rows from before a reload are gone
+            if self.tree.exists(item):
+                self.set_thumbnail(item, future.result())
+        if self.thumbnails_pending:
+            self.thumbnail_job = self.after(30, self.poll_thumbnails)
+
+    def set_thumbnail(self, item, image):
+        from PIL import ImageTk
+
+        photo = ImageTk.PhotoImage(image)
+        self.thumbnail_images[item] = photo
+        self.tree.item(item, image=photo)
+
+    def destroy(self):
+        if self.thumbnail_job is not None:
+            self.after_cancel(self.thumbnail_job)
+            self.thumbnail_job = None
+        super().destroy()
+
+
+class LazyNotebook(ttk.Notebook):
+    """Notebook whose tab contents are built the first time each tab is selected.
+
+    Each build is logged with its time, so a screen's cost with every tab
+    built up front is its own build time plus the times of its other tabs.
+    """
+    def __init__(self, parent, **options):
+        super().__init__(parent, **options)
+        self.builders = {}
+        self.bind("<<NotebookTabChanged>>", self.on_tab_changed)
+
+    def add_lazy(self, build, text, bg="#FFFFFF"):
+        """Add an empty tab; build(frame) fills it in when it is first shown"""
+        frame = tk.Frame(self, bg=bg)
+        self.add(frame, text=text)
+        self.builders[str(frame)] = (build, frame)
+        if self.select() == str(frame):
+            self.on_tab_changed()
+        return frame
+
+    def on_tab_changed(self, event=None):
+        build, frame = self.builders.pop(self.select(), (None, None))
+        if build:
+            started = time.perf_counter()
+            build(frame)
+            logger.info(f"Built tab '{self.tab(frame, 'text')}' in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+
+class ExportDialog(tk.Toplevel):
+    """Progress window for a report export running on a worker thread"""
+
+    FILE_TYPES = [
+        ("CSV file", "*.csv"),
+        ("JSON Lines file", "*.jsonl"),
+        ("Excel workbook", "*.xlsx"),
+        ("PDF document", "*.pdf"),
+    ]
+
+    @classmethod
+    def ask(cls, parent, reports, report_name, **options):
+        """Ask for a destination file and start exporting to it"""
+        path = filedialog.asksaveasfilename(
+            parent=parent,
+            title="Export Report",
+            defaultextension=".csv",
+            initialfile=f"{report_name}_report_{date.today().isoformat()}",
+            filetypes=cls.FILE_TYPES,
+        )
+        if path:
+            return cls(parent, reports, report_name, path, **options)
+
+    def __init__(self, parent, reports, report_name, path, **options):
+        super().__init__(parent)
+        self.title("Exporting Report")
+        self.geometry("420x160")
+        self.resizable(False, False)
+        self.configure(bg="#2C3E50")
+        self.transient(parent.winfo_toplevel())
+        monitor = getattr(parent.winfo_toplevel(), 'activity_monitor', None)
+        if monitor:
+            monitor.watch(self)
+        self.path = path
+        self.events = queue.Queue()
+        self.create_widgets()
 
+        from report_export import ReportExporter
+
+        exporter = ReportExporter(reports)
+        self.cancel_event = exporter.export_in_background(
+            report_name,
+            path,
+            progress=lambda done, total: self.events.put(("progress", done, total)),
+            done=lambda rows, error: self.events.put(("done", rows, error)),
+            **options
+        )
+        self.protocol("WM_DELETE_WINDOW", self.cancel)
+        self.poll_events()
+
+    def create_widgets(self):
+        main_frame = tk.Frame(self, bg="#2C3E50", padx=20, pady=15)
+        main_frame.pack(fill="both", expand=True)
+
+        self.status_label = tk.Label(
+            main_frame,
+            text=f"Exporting to {os.path.basename(self.path)}...",
+            font=("Arial", 11),
+            bg="#2C3E50",
+            fg="#ECF0F1"
+        )
+        self.status_label.pack(anchor="w")
+
+        self.progress = ttk.Progressbar(main_frame, mode="determinate", maximum=100)
+        self.progress.pack(fill="x", pady=15)
+
+        tk.Button(
+            main_frame,
+            text="Cancel",
+            command=self.cancel,
+            bg="#E74C3C",
+            fg="white",
+            font=("Arial", 10, "bold"),
+            relief="flat",
+            cursor="hand2"
+        ).pack(side="right")
+
+    def poll_events(self):
+        """Apply progress reported by the worker thread on the Tk thread"""
+        try:
+            while True:
+                event = self.events.get_nowait()
+                if event[0] == "progress":
+                    _, done, total = event
+                    self.progress["value"] = 100 * done / total if total else 100
+                    self.status_label.config(text=f"Exported {done:,} of {total:,} rows...")
+                else:
+                    self.finish(event[1], event[2])
+                    return
+        except queue.Empty:
+            pass
+        self.after(100, self.poll_events)
+
+    def finish(self, rows_written, error):
+        from report_export import ExportCancelled
+
+        self.destroy()
+        if isinstance(error, ExportCancelled):
+            return
+        if error:
+            messagebox.showerror("Error", f"Failed to export report: {str(error)}")
+        else:
+            messagebox.showinfo("Success", f"Exported {rows_written:,} rows to {self.path}")
 
+    def cancel(self):
+        self.cancel_event.set()
+        self.status_label.config(text="Cancelling...")
 
 
 class Financial_Reports(tk.Frame):
@@ -686,6 +1282,7 @@ class Financial_Reports(tk.Frame):
         self.bg = "#E8F6F3"
         super().__init__(box, bg=self.bg)
         self.parent = parent
+        self.sales_events = None
         self.create_scrollable_widgets()
 
     def create_scrollable_widgets(self):
@@ -720,6 +1317,16 @@ class Financial_Reports(tk.Frame):
     def on_mousewheel(self, event):
         self.canvas.yview_scroll(int(-1 * (event.delta / 120)), "units")
 
+    def refresh(self):
+        """Take the mouse wheel back and reload the grids that were shown"""
+        self.bind_all("<MouseWheel>", self.on_mousewheel)
+        if hasattr(self, "inventory_grid"):
+            self.load_valuation()
+            self.inventory_grid.refresh()
+        if hasattr(self, "supplier_spend_tree"):
+            self.load_supplier_spend()
+            self.purchase_grid.refresh()
+
     def create_content(self):
         """Create the main content for financial reports"""
         # Title Section
@@ -745,21 +1352,18 @@ class Financial_Reports(tk.Frame):
         subtitle_label.pack(pady=(5, 0))
 
         # Create notebook for different report types
-        self.notebook = ttk.Notebook(self.scrollable_frame)
+        self.notebook = LazyNotebook(self.scrollable_frame)
         self.notebook.pack(fill="both", expand=True, padx=20, pady=20)
 
-        # Create tabs
-        self.create_summary_tab()
-        self.create_sales_tab()
-        self.create_purchase_tab()
-        self.create_inventory_tab()
-        self.create_profit_loss_tab()
+        # Tabs are built when first opened
+        self.notebook.add_lazy(self.create_summary_tab, "Summary")
+        self.notebook.add_lazy(self.create_sales_tab, "Sales Reports")
+        self.notebook.add_lazy(self.create_purchase_tab, "Purchase Reports")
+        self.notebook.add_lazy(self.create_inventory_tab, "Inventory Valuation")
+        self.notebook.add_lazy(self.create_profit_loss_tab, "Profit & Loss")
 
-    def create_summary_tab(self):
+    def create_summary_tab(self, summary_frame):
         """Create financial summary tab"""
-        summary_frame = tk.Frame(self.notebook, bg="#FFFFFF")
-        self.notebook.add(summary_frame, text="Summary")
-
         # Control panel
         control_panel = tk.Frame(summary_frame, bg="#F8F9FA", relief="solid", bd=1)
         control_panel.pack(fill="x", padx=10, pady=10)
@@ -823,11 +1427,8 @@ class Financial_Reports(tk.Frame):
         self.summary_text.pack(fill="both", expand=True)
         scrollbar.config(command=self.summary_text.yview)
 
-    def create_sales_tab(self):
+    def create_sales_tab(self, sales_frame):
         """Create sales report tab"""
-        sales_frame = tk.Frame(self.notebook, bg="#FFFFFF")
-        self.notebook.add(sales_frame, text="Sales Reports")
-
         # Control panel
         control_panel = tk.Frame(sales_frame, bg="#E8F8F5", relief="solid", bd=1)
         control_panel.pack(fill="x", padx=10, pady=10)
@@ -871,7 +1472,7 @@ class Financial_Reports(tk.Frame):
         )
         self.sales_end_date.grid(row=0, column=5, padx=5, pady=5)
 
-        tk.Button(
+        self.sales_button = tk.Button(
             filter_frame,
             text="Generate Sales Report",
             command=self.generate_sales_report,
@@ -880,13 +1481,14 @@ class Financial_Reports(tk.Frame):
             font=("Arial", 10, "bold"),
             relief="flat",
             cursor="hand2"
-        ).grid(row=0, column=6, padx=10, pady=5)
+        )
+        self.sales_button.grid(row=0, column=6, padx=10, pady=5)
 
         # Sales data table
         table_frame = tk.Frame(sales_frame, bg="#FFFFFF")
         table_frame.pack(fill="both", expand=True, padx=20, pady=20)
 
-        columns = ("Date", "Medicine", "Quantity", "Unit Price", "Total", "Profit")
+        columns = ("Period", "Transactions", "Quantity", "Revenue", "Cost", "Margin", "Margin %")
         self.sales_tree = ttk.Treeview(table_frame, columns=columns, show="headings", height=15)
 
         for col in columns:
@@ -906,11 +1508,8 @@ class Financial_Reports(tk.Frame):
         table_frame.grid_rowconfigure(0, weight=1)
         table_frame.grid_columnconfigure(0, weight=1)
 
-    def create_purchase_tab(self):
+    def create_purchase_tab(self, purchase_frame):
         """Create purchase report tab"""
-        purchase_frame = tk.Frame(self.notebook, bg="#FFFFFF")
-        self.notebook.add(purchase_frame, text="Purchase Reports")
-
         # Control panel
         control_panel = tk.Frame(purchase_frame, bg="#FDF2E9", relief="solid", bd=1)
         control_panel.pack(fill="x", padx=10, pady=10)
@@ -928,11 +1527,12 @@ class Financial_Reports(tk.Frame):
         filter_frame.pack(pady=10)
 
         tk.Label(filter_frame, text="Supplier:", bg="#FDF2E9", fg="#2C3E50").grid(row=0, column=0, padx=5, pady=5)
-        self.supplier_var = tk.StringVar()
+        self.supplier_var = tk.StringVar(value="All suppliers")
         self.supplier_combo = ttk.Combobox(
             filter_frame,
             textvariable=self.supplier_var,
-            width=15
+            state="readonly",
+            width=25
         )
         self.supplier_combo.grid(row=0, column=1, padx=5, pady=5)
 
@@ -961,34 +1561,84 @@ class Financial_Reports(tk.Frame):
             cursor="hand2"
         ).grid(row=0, column=6, padx=10, pady=5)
 
-        # Purchase data table
-        table_frame = tk.Frame(purchase_frame, bg="#FFFFFF")
-        table_frame.pack(fill="both", expand=True, padx=20, pady=20)
+        self.purchase_total_label = tk.Label(
+            control_panel, text="", font=("Arial", 11, "bold"), bg="#FDF2E9", fg="#2C3E50"
+        )
+        self.purchase_total_label.pack(pady=(0, 10))
 
-        columns = ("Date", "Supplier", "Medicine", "Quantity", "Unit Cost", "Total Cost")
-        self.purchase_tree = ttk.Treeview(table_frame, columns=columns, show="headings", height=15)
+        # All-time spend per supplier, read from the precomputed purchase totals
+        spend_frame = tk.Frame(purchase_frame, bg="#FFFFFF")
+        spend_frame.pack(fill="x", padx=20, pady=(10, 0))
 
+        columns = ("Supplier", "Medicines", "Purchases", "Quantity", "Total Spend", "Last Purchase")
+        self.supplier_spend_tree = ttk.Treeview(spend_frame, columns=columns, show="headings", height=6)
         for col in columns:
-            self.purchase_tree.heading(col, text=col)
-            self.purchase_tree.column(col, width=120, anchor="center")
-
-        v_scrollbar = ttk.Scrollbar(table_frame, orient="vertical", command=self.purchase_tree.yview)
-        h_scrollbar = ttk.Scrollbar(table_frame, orient="horizontal", command=self.purchase_tree.xview)
-        
-        self.purchase_tree.configure(yscrollcommand=v_scrollbar.set, xscrollcommand=h_scrollbar.set)
-        
-        self.purchase_tree.grid(row=0, column=0, sticky="nsew")
-        v_scrollbar.grid(row=0, column=1, sticky="ns")
-        h_scrollbar.grid(row=1, column=0, sticky="ew")
-        
-        table_frame.grid_rowconfigure(0, weight=1)
-        table_frame.grid_columnconfigure(0, weight=1)
+            self.supplier_spend_tree.heading(col, text=col)
+            self.supplier_spend_tree.column(col, width=120, anchor="center")
+        spend_scrollbar = ttk.Scrollbar(spend_frame, orient="vertical", command=self.supplier_spend_tree.yview)
+        self.supplier_spend_tree.configure(yscrollcommand=spend_scrollbar.set)
+        self.supplier_spend_tree.grid(row=0, column=0, sticky="nsew")
+        spend_scrollbar.grid(row=0, column=1, sticky="ns")
+        spend_frame.grid_columnconfigure(0, weight=1)
+
+        # Individual purchases, loaded by Generate Purchase Report
+        columns = [
+            ("date", "Date", 140),
+            ("supplier_name", "Supplier", 150),
+            ("medicine_name", "Medicine", 150),
+            ("quantity", "Quantity", 100),
+            ("unit_price", "Unit Cost", 100),
+            ("total_amount", "Total Cost", 110),
+        ]
+        self.purchase_grid = ReportGrid(
+            purchase_frame,
+            self.parent.reports,
+            "purchases",
+            columns,
+            lambda row: (
+                row['date'],
+                row['supplier_name'] or "",
+                row['medicine_name'],
+                row['quantity'],
+                f"${row['unit_price'] or 0:.2f}",
+                f"${row['total_amount'] or 0:.2f}",
+            ),
+            sort_by="date",
+            descending=True,
+        )
+        self.purchase_grid.pack(fill="both", expand=True, padx=20, pady=20)
+
+        self.load_purchase_suppliers()
+        self.load_supplier_spend()
+
+    def load_purchase_suppliers(self):
+        try:
+            suppliers = self.parent.supplier_manager.get_all_suppliers()
+            self.supplier_combo['values'] = ["All suppliers"] + [
+                f"{supplier['name']} (ID: {supplier['id']})" for supplier in suppliers
+            ]
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to load suppliers: {str(e)}")
 
-    def create_inventory_tab(self):
+    def load_supplier_spend(self):
+        try:
+            rows = self.parent.reports.get_supplier_spend()
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to load supplier spend: {str(e)}")
+            return
+        self.supplier_spend_tree.delete(*self.supplier_spend_tree.get_children())
+        for row in rows:
+            self.supplier_spend_tree.insert("", "end", values=(
+                row['supplier_name'],
+                row['medicine_count'],
+                row['purchase_count'],
+                row['quantity'],
+                f"${row['spend']:,.2f}",
+                (row['last_purchase'] or "")[:10],
+            ))
+
+    def create_inventory_tab(self, inventory_frame):
         """Create inventory valuation tab"""
-        inventory_frame = tk.Frame(self.notebook, bg="#FFFFFF")
-        self.notebook.add(inventory_frame, text="Inventory Valuation")
-
         # Control panel
         control_panel = tk.Frame(inventory_frame, bg="#EBF5FB", relief="solid", bd=1)
         control_panel.pack(fill="x", padx=10, pady=10)
@@ -1037,34 +1687,63 @@ class Financial_Reports(tk.Frame):
             cursor="hand2"
         ).pack(side="left", padx=5)
 
-        # Inventory data table
-        table_frame = tk.Frame(inventory_frame, bg="#FFFFFF")
-        table_frame.pack(fill="both", expand=True, padx=20, pady=20)
+        self.valuation_total_label = tk.Label(
+            control_panel, text="", font=("Arial", 11, "bold"), bg="#EBF5FB", fg="#2C3E50"
+        )
+        self.valuation_total_label.pack(pady=(0, 10))
 
-        columns = ("Medicine", "Batch", "Quantity", "Unit Price", "Total Value", "Expiry Date", "Status")
-        self.inventory_tree = ttk.Treeview(table_frame, columns=columns, show="headings", height=15)
+        # Value per category, read from the maintained InventoryValue rows;
+        # selecting a category lists its medicines below
+        valuation_frame = tk.Frame(inventory_frame, bg="#FFFFFF")
+        valuation_frame.pack(fill="x", padx=20, pady=(10, 0))
 
+        columns = ("Category", "Medicines", "Units", "Retail Value", "Cost Value", "Share")
+        self.valuation_tree = ttk.Treeview(valuation_frame, columns=columns, show="headings", height=6)
         for col in columns:
-            self.inventory_tree.heading(col, text=col)
-            self.inventory_tree.column(col, width=100, anchor="center")
-
-        v_scrollbar = ttk.Scrollbar(table_frame, orient="vertical", command=self.inventory_tree.yview)
-        h_scrollbar = ttk.Scrollbar(table_frame, orient="horizontal", command=self.inventory_tree.xview)
-        
-        self.inventory_tree.configure(yscrollcommand=v_scrollbar.set, xscrollcommand=h_scrollbar.set)
-        
-        self.inventory_tree.grid(row=0, column=0, sticky="nsew")
-        v_scrollbar.grid(row=0, column=1, sticky="ns")
-        h_scrollbar.grid(row=1, column=0, sticky="ew")
-        
-        table_frame.grid_rowconfigure(0, weight=1)
-        table_frame.grid_columnconfigure(0, weight=1)
+            self.valuation_tree.heading(col, text=col)
+            self.valuation_tree.column(col, width=120, anchor="center")
+        valuation_scrollbar = ttk.Scrollbar(valuation_frame, orient="vertical", command=self.valuation_tree.yview)
+        self.valuation_tree.configure(yscrollcommand=valuation_scrollbar.set)
+        self.valuation_tree.grid(row=0, column=0, sticky="nsew")
+        valuation_scrollbar.grid(row=0, column=1, sticky="ns")
+        valuation_frame.grid_columnconfigure(0, weight=1)
+        self.valuation_tree.bind("<<TreeviewSelect>>", self.on_valuation_category_selected)
 
-    def create_profit_loss_tab(self):
+        # Inventory data table
+        columns = [
+            ("name", "Medicine", 150),
+            ("category", "Category", 110),
+            ("batch_number", "Batch", 100),
+            ("quantity", "Quantity", 100),
+            ("price", "Unit Price", 100),
+            ("stock_value", "Total Value", 100),
+            ("expiry_date", "Expiry Date", 100),
+            ("stock_status", "Status", 100),
+        ]
+        self.inventory_grid = ReportGrid(
+            inventory_frame,
+            self.parent.reports,
+            "stock",
+            columns,
+            lambda row: (
+                row['name'],
+                row['category'] or "",
+                row['batch_number'],
+                row['quantity'],
+                f"${row['price']:.2f}",
+                f"${row['stock_value']:.2f}",
+                row['expiry_date'],
+                row['stock_status'],
+            ),
+            sort_by="stock_value",
+            descending=True,
+        )
+        self.inventory_grid.pack(fill="both", expand=True, padx=20, pady=20)
+
+        self.load_valuation()
+
+    def create_profit_loss_tab(self, pl_frame):
         """Create profit & loss statement tab"""
-        pl_frame = tk.Frame(self.notebook, bg="#FFFFFF")
-        self.notebook.add(pl_frame, text="Profit & Loss")
-
         # Control panel
         control_panel = tk.Frame(pl_frame, bg="#F4F6F6", relief="solid", bd=1)
         control_panel.pack(fill="x", padx=10, pady=10)
@@ -1223,87 +1902,148 @@ class Financial_Reports(tk.Frame):
             messagebox.showerror("Error", f"Failed to generate summary: {str(e)}")
 
     def generate_sales_report(self):
-        """Generate sales report"""
+        """Aggregate sales per period on a worker thread; the grid is filled when it is done"""
+        if self.sales_events is not None:
+            return
+        period = self.sales_period_var.get()
+        start_date = self.sales_start_date.get()
+        end_date = self.sales_end_date.get()
+        if start_date > end_date:
+            messagebox.showerror("Error", "The start date must not be after the end date")
+            return
+
+        self.sales_events = queue.Queue()
+        self.sales_button.config(state="disabled", text="Generating...")
+        threading.Thread(
+            target=self.run_sales_report,
+            args=(period, start_date, end_date, self.sales_events),
+            name="sales-report",
+            daemon=True
+        ).start()
+        self.poll_sales_report()
+
+    def run_sales_report(self, period, start_date, end_date, events):
+        """Worker thread: run the report on this thread's own connection"""
         try:
-            # Clear existing data
-            for item in self.sales_tree.get_children():
-                self.sales_tree.delete(item)
-            
-            # Sample data (replace with actual database queries)
-            sales_data = [
-                ("2024-01-15", "Paracetamol 500mg", 50, 2.50, 125.00, 37.50),
-                ("2024-01-16", "Amoxicillin 250mg", 30, 4.20, 126.00, 45.00),
-                ("2024-01-17", "Ibuprofen 400mg", 25, 3.80, 95.00, 28.50),
-                ("2024-01-18", "Vitamin C 1000mg", 40, 1.95, 78.00, 23.40),
-                ("2024-01-19", "Aspirin 325mg", 35, 2.10, 73.50, 22.05)
-            ]
-            
-            total_sales = 0
-            total_profit = 0
-            
-            for sale in sales_data:
-                self.sales_tree.insert("", "end", values=sale)
-                total_sales += sale[4]
-                total_profit += sale[5]
-            
-            # Add totals row
-            self.sales_tree.insert("", "end", values=(
-                "TOTAL", "", "", "", f"${total_sales:.2f}", f"${total_profit:.2f}"
-            ), tags=("total",))
-            
-            # Configure total row appearance
-            self.sales_tree.tag_configure("total", background="#E8F6F3", font=("Arial", 10, "bold"))
-            
-            messagebox.showinfo("Success", f"Sales report generated! Total Sales: ${total_sales:.2f}")
-            
+            events.put((self.parent.reports.get_sales_report(period, start_date, end_date), None))
         except Exception as e:
-            messagebox.showerror("Error", f"Failed to generate sales report: {str(e)}")
+            events.put((None, e))
+        finally:
+            self.parent.db.close_connection()
+
+    def poll_sales_report(self):
+        if not self.winfo_exists():
+            return
+        try:
+            periods, error = self.sales_events.get_nowait()
+        except queue.Empty:
+            self.after(50, self.poll_sales_report)
+            return
+
+        self.sales_events = None
+        self.sales_button.config(state="normal", text="Generate Sales Report")
+        if error:
+            messagebox.showerror("Error", f"Failed to generate sales report: {str(error)}")
+            return
+
+        self.sales_tree.delete(*self.sales_tree.get_children())
+        totals = {'transaction_count': 0, 'quantity': 0, 'revenue': 0.0, 'cost': 0.0, 'margin': 0.0}
+        for row in periods:
+            self.sales_tree.insert("", "end", values=(
+                row['period'],
+                row['transaction_count'],
+                row['quantity'],
+                f"${row['revenue']:,.2f}",
+                f"${row['cost']:,.2f}",
+                f"${row['margin']:,.2f}",
+                f"{row['margin_percent']:.1f}%",
+            ))
+            for key in totals:
+                totals[key] += row[key]
+
+        margin_percent = totals['margin'] / totals['revenue'] * 100 if totals['revenue'] else 0.0
+        self.sales_tree.insert("", "end", values=(
+            "TOTAL",
+            totals['transaction_count'],
+            totals['quantity'],
+            f"${totals['revenue']:,.2f}",
+            f"${totals['cost']:,.2f}",
+            f"${totals['margin']:,.2f}",
+            f"{margin_percent:.1f}%",
+        ), tags=("total",))
+        self.sales_tree.tag_configure("total", background="#E8F6F3", font=("Arial", 10, "bold"))
+
+        messagebox.showinfo("Success", f"Sales report generated! Total Sales: ${totals['revenue']:,.2f}")
 
     def generate_purchase_report(self):
-        """Generate purchase report"""
+        """Show the purchases for the chosen supplier and dates"""
+        start_date = self.purchase_start_date.get()
+        end_date = self.purchase_end_date.get()
+        if start_date > end_date:
+            messagebox.showerror("Error", "The start date must not be after the end date")
+            return
+
+        supplier_id = None
+        selected = self.supplier_var.get()
+        if "ID: " in selected:
+            supplier_id = int(selected.split("ID: ")[1].split(")")[0])
+
         try:
-            # Clear existing data
-            for item in self.purchase_tree.get_children():
-                self.purchase_tree.delete(item)
-            
-            # Sample data (replace with actual database queries)
-            purchase_data = [
-                ("2024-01-10", "PharmaCorp", "Paracetamol 500mg", 100, 1.50, 150.00),
-                ("2024-01-11", "MediSupply", "Amoxicillin 250mg", 75, 2.80, 210.00),
-                ("2024-01-12", "HealthDistributors", "Ibuprofen 400mg", 60, 2.50, 150.00),
-                ("2024-01-13", "VitaWholesale", "Vitamin C 1000mg", 120, 1.30, 156.00),
-                ("2024-01-14", "Generic Solutions", "Aspirin 325mg", 90, 1.40, 126.00)
-            ]
-            
-            total_cost = 0
-            
-            for purchase in purchase_data:
-                self.purchase_tree.insert("", "end", values=purchase)
-                total_cost += purchase[5]
-            
-            # Add totals row
-            self.purchase_tree.insert("", "end", values=(
-                "TOTAL", "", "", "", "", f"${total_cost:.2f}"
-            ), tags=("total",))
-            
-            self.purchase_tree.tag_configure("total", background="#FDF2E9", font=("Arial", 10, "bold"))
-            
-            messagebox.showinfo("Success", f"Purchase report generated! Total Cost: ${total_cost:.2f}")
-            
+            self.purchase_grid.options = {
+                'start_date': start_date,
+                'end_date': end_date,
+                'supplier_id': supplier_id,
+            }
+            self.purchase_grid.reload()
+            count, total_cost = self.parent.reports.get_purchase_total(
+                start_date, end_date, supplier_id, self.purchase_grid.get_filters()
+            )
+            self.purchase_total_label.config(text=f"{count} purchases, Total Cost: ${total_cost:,.2f}")
         except Exception as e:
             messagebox.showerror("Error", f"Failed to generate purchase report: {str(e)}")
 
+    def load_valuation(self):
+        try:
+            categories, total = self.parent.inventory_valuation.get_valuation()
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to load inventory valuation: {str(e)}")
+            return
+        self.valuation_tree.delete(*self.valuation_tree.get_children())
+        for row in categories:
+            share = row['value'] / total['value'] * 100 if total['value'] else 0.0
+            # Prefixed, as '' (no category) is not a usable item id
+            self.valuation_tree.insert("", "end", iid=f"category:{row['category']}", values=(
+                row['category'] or "Uncategorized",
+                row['medicine_count'],
+                row['quantity'],
+                f"${row['value']:,.2f}",
+                f"${row['cost_value']:,.2f}",
+                f"{share:.1f}%",
+            ))
+        self.valuation_total_label.config(
+            text=f"{total['medicine_count']} medicines, {total['quantity']} units, "
+                 f"Retail Value: ${total['value']:,.2f}, Cost Value: ${total['cost_value']:,.2f}"
+        )
+
+    def on_valuation_category_selected(self, event=None):
+        selection = self.valuation_tree.selection()
+        if selection:
+            category = selection[0].split(":", 1)[1]
+            self.inventory_grid.apply(filters={"category": f"={category}"}, sort_by="stock_value", descending=True)
+
     def generate_inventory_valuation(self):
-        messagebox.showinfo("clicked", "generate_inventory_valuation")
+        self.load_valuation()
+        self.inventory_grid.apply(sort_by="stock_value", descending=True)
 
     def generate_low_stock_report(self):
-        messagebox.showinfo("clicked", "generate_low_stock_report!")
-    
+        self.inventory_grid.apply(filters={"stock_status": "LOW"}, sort_by="quantity")
+
     def generate_expiry_report(self):
-        messagebox.showinfo("clicked", "generate_expiry_report!")
+        warning_date = (date.today() + timedelta(days=30)).isoformat()
+        self.inventory_grid.apply(filters={"expiry_date": f"<={warning_date}"}, sort_by="expiry_date")
 
     def generate_pl_statement(self):
-        """Generate profit & loss statement"""
+        """Generate profit & loss statement from the FIFO cost ledger"""
         try:
             period = self.pl_period_var.get()
             year = self.pl_year_var.get()
@@ -1311,35 +2051,36 @@ class Financial_Reports(tk.Frame):
             # Clear existing text
             self.pl_text.delete(1.0, tk.END)
             
-            # Sample P&L data (replace with actual database queries)
-            revenue = 50000.00
-            cost_of_goods_sold = 30000.00
-            operating_expenses = 10000.00
-            net_income = revenue - cost_of_goods_sold - operating_expenses
-            
-            pl_statement = f"""
-                PROFIT & LOSS STATEMENT
-                Period: {period.capitalize()} {year}
-                Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-                {'='*60}
-
-                REVENUE:
-                • Total Revenue: ${revenue:,.2f}
-
-                COST OF GOODS SOLD:
-                • Cost of Goods Sold: ${cost_of_goods_sold:,.2f}
-                • Gross Profit: ${revenue - cost_of_goods_sold:,.2f}
-
-                OPERATING EXPENSES:
-                • Total Operating Expenses: ${operating_expenses:,.2f}
-
-                NET INCOME:
-                • Net Income: ${net_income:,.2f}
-            """
+            # Stops at today, so the current year has no empty future periods
+            end_date = min(f"{year}-12-31", date.today().isoformat())
+            statement = self.parent.reports.get_profit_and_loss(period, f"{year}-01-01", end_date)
+            
+            lines = [
+                "PROFIT & LOSS STATEMENT",
+                f"Period: {period.capitalize()} {year}",
+                f"Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
+                "Cost of goods sold: FIFO cost of the stock sold",
+                "=" * 78,
+                f"{'Period':<10}{'Revenue':>14}{'COGS':>14}{'Gross Profit':>14}{'Margin':>9}{'Purchases':>14}",
+                "-" * 78,
+            ]
+            totals = {'revenue': 0.0, 'cogs': 0.0, 'gross_profit': 0.0, 'purchases': 0.0}
+            for row in statement:
+                lines.append(f"{row['period']:<10}{row['revenue']:>14,.2f}{row['cogs']:>14,.2f}"
+                             f"{row['gross_profit']:>14,.2f}{row['gross_margin']:>8.1f}%{row['purchases']:>14,.2f}")
+                for key in totals:
+                    totals[key] += row[key]
+            margin = totals['gross_profit'] / totals['revenue'] * 100 if totals['revenue'] else 0.0
+            lines += [
+                "-" * 78,
+                f"{'TOTAL':<10}{totals['revenue']:>14,.2f}{totals['cogs']:>14,.2f}"
+                f"{totals['gross_profit']:>14,.2f}{margin:>8.1f}%{totals['purchases']:>14,.2f}",
+            ]
             
-            self.pl_text.insert(1.0, pl_statement)
-            messagebox.showinfo("Success", "Profit & Loss statement generated successfully!")
+            self.pl_text.insert(1.0, "\n".join(lines))
             
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
         except Exception as e:
             messagebox.showerror("Error", f"Failed to generate P&L statement: {str(e)}")
 
@@ -1354,55 +2095,420 @@ class Financial_Reports(tk.Frame):
 
 
 class Revenue_Analysis(tk.Frame):
-    """ """
-    def __init__(self, box, parent):
-        super().__init__(box, bg="#E8F8F5")
-        self.create_content("Revenue Analysis", "💰", "Track revenue trends and patterns")
+    """Daily revenue with 7/30/90-day moving averages, cumulative total and trend.
 
-    def create_content(self, title, icon, description):
-        container = tk.Frame(self, bg=self['bg'])
-        container.pack(expand=True, fill="both")
+    Series come from the app's RevenueAnalytics, which loads each scope
+    once and then applies only the sales posted since, so showing the
+    screen again does not recompute history.
+    """
+    SCOPES = ("All revenue", "Category", "Medicine")
+    DAY_CHOICES = ("30", "90", "180", "365")
+    SERIES_COLORS = {"revenue": "#BDC3C7", "ma7": "#3498DB", "ma30": "#27AE60", "ma90": "#E67E22"}
 
-        icon_label = tk.Label(
-            container, text=icon, font=("Arial", 48), bg=self['bg'], fg="#2C3E50"
-        )
-        icon_label.pack(pady=(50, 20))
+    def __init__(self, box, parent):
+        super().__init__(box, bg="#E8F8F5")
+        self.parent = parent
+        self.analytics = parent.revenue_analytics
+        self.rows = []
+        self.redraw_job = None
+        self.create_content()
+        self.show()
 
+    def create_content(self):
         title_label = tk.Label(
-            container, text=title, font=("Arial", 24, "bold"), bg=self['bg'], fg="#2C3E50"
+            self,
+            text="💰 Revenue Analysis",
+            font=("Arial", 20, "bold"),
+            fg="#2C3E50",
+            bg=self['bg'],
         )
-        title_label.pack(pady=10)
+        title_label.pack(pady=20)
 
-        desc_label = tk.Label(
-            container, text=description, font=("Arial", 14), bg=self['bg'], fg="#7F8C8D"
-        )
-        desc_label.pack(pady=10)
+        control_frame = tk.Frame(self, bg=self['bg'])
+        control_frame.pack(fill="x", padx=20)
+
+        self.scope_var = tk.StringVar(value=self.SCOPES[0])
+        self.key_var = tk.StringVar()
+        self.days_var = tk.StringVar(value="90")
+
+        scope_combo = ttk.Combobox(control_frame, textvariable=self.scope_var, values=self.SCOPES,
+                                   state="readonly", width=12)
+        self.key_combo = ttk.Combobox(control_frame, textvariable=self.key_var, state="disabled", width=30)
+        days_combo = ttk.Combobox(control_frame, textvariable=self.days_var, values=self.DAY_CHOICES,
+                                  state="readonly", width=6)
+        for column, (label, widget) in enumerate((("Show", scope_combo), ("Of", self.key_combo),
+                                                  ("Days", days_combo))):
+            tk.Label(control_frame, text=label, bg=self['bg'], fg="#7F8C8D", font=("Arial", 8)).grid(
+                row=0, column=column, padx=2, sticky="w"
+            )
+            widget.grid(row=1, column=column, padx=2, sticky="ew")
+        scope_combo.bind("<<ComboboxSelected>>", self.on_scope_selected)
+        self.key_combo.bind("<<ComboboxSelected>>", lambda e: self.show())
+        days_combo.bind("<<ComboboxSelected>>", lambda e: self.show())
+
+        tk.Button(
+            control_frame,
+            text="Reload",
+            command=self.reload,
+            bg="#95A5A6",
+            fg="white",
+            font=("Arial", 9, "bold"),
+            relief="flat",
+            cursor="hand2"
+        ).grid(row=1, column=3, padx=(8, 2))
+
+        self.cards_frame = tk.Frame(self, bg=self['bg'])
+        self.cards_frame.pack(fill="x", padx=20, pady=10)
+        self.card_labels = {}
+        cards = (("revenue", "Today", "#27AE60"), ("ma7", "7-Day Average", "#3498DB"),
+                 ("ma30", "30-Day Average", "#16A085"), ("ma90", "90-Day Average", "#E67E22"),
+                 ("cumulative", "Cumulative", "#8E44AD"), ("trend", "30-Day Trend", "#2C3E50"))
+        for column, (key, title, color) in enumerate(cards):
+            card = tk.Frame(self.cards_frame, bg=color)
+            card.grid(row=0, column=column, padx=5, sticky="ew")
+            self.cards_frame.grid_columnconfigure(column, weight=1)
+            self.card_labels[key] = tk.Label(card, text="", font=("Arial", 14, "bold"), fg="white", bg=color)
+            self.card_labels[key].pack(pady=(10, 2))
+            tk.Label(card, text=title, font=("Arial", 9), fg="white", bg=color).pack(pady=(0, 10))
+
+        self.chart = tk.Canvas(self, height=220, bg="#FFFFFF", highlightthickness=0)
+        self.chart.pack(fill="x", padx=20, pady=(0, 10))
+        self.chart.bind("<Configure>", self.on_chart_configure)
+
+        table_frame = tk.Frame(self, bg=self['bg'])
+        table_frame.pack(fill="both", expand=True, padx=20, pady=(0, 20))
+        columns = ("Date", "Revenue", "7-Day Avg", "30-Day Avg", "90-Day Avg", "Cumulative")
+        self.tree = ttk.Treeview(table_frame, columns=columns, show="headings", height=10)
+        for col in columns:
+            self.tree.heading(col, text=col)
+            self.tree.column(col, width=120, anchor="center")
+        scrollbar = ttk.Scrollbar(table_frame, orient="vertical", command=self.tree.yview)
+        self.tree.configure(yscrollcommand=scrollbar.set)
+        self.tree.grid(row=0, column=0, sticky="nsew")
+        scrollbar.grid(row=0, column=1, sticky="ns")
+        table_frame.grid_rowconfigure(0, weight=1)
+        table_frame.grid_columnconfigure(0, weight=1)
+
+    def on_scope_selected(self, event=None):
+        scope = self.scope_var.get()
+        self.key_var.set("")
+        try:
+            if scope == "Category":
+                categories, _ = self.parent.inventory_valuation.get_valuation()
+                self.key_combo['values'] = [row['category'] or "Uncategorized" for row in categories]
+            elif scope == "Medicine":
+                self.key_combo['values'] = [
+                    f"{medicine['name']} (ID: {medicine['id']})"
+                    for medicine in self.parent.medicine_manager.get_all_medicines()
+                ]
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to load {scope.lower()} list: {str(e)}")
+            return
+        if scope == self.SCOPES[0]:
+            self.key_combo.config(state="disabled")
+            self.show()
+        else:
+            self.key_combo.config(state="readonly")
+
+    def selected_scope(self):
+        """(scope, key) for RevenueAnalytics.get, or None while no key is chosen"""
+        scope = self.scope_var.get()
+        key = self.key_var.get()
+        if scope == "Category":
+            return ("category", "" if key == "Uncategorized" else key) if key else None
+        if scope == "Medicine":
+            return ("medicine", int(key.split("ID: ")[1].split(")")[0])) if key else None
+        return ("total", None)
+
+    def show(self):
+        selected = self.selected_scope()
+        if selected is None:
+            return
+        try:
+            series = self.analytics.get(*selected)
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to load revenue: {str(e)}")
+            return
+
+        summary = series.summary()
+        for key in ("revenue", "ma7", "ma30", "ma90", "cumulative"):
+            self.card_labels[key].config(text=f"${summary[key]:,.2f}")
+        change = summary['change_percent']
+        self.card_labels["trend"].config(
+            text=f"{summary['trend']:+,.2f}/day" + ("" if change is None else f" ({change:+.1f}%)")
+        )
+
+        self.rows = series.points(int(self.days_var.get()))
+        self.tree.delete(*self.tree.get_children())
+        for row in reversed(self.rows):
+            self.tree.insert("", "end", values=(
+                row['day'].isoformat(),
+                f"${row['revenue']:,.2f}",
+                f"${row['ma7']:,.2f}",
+                f"${row['ma30']:,.2f}",
+                f"${row['ma90']:,.2f}",
+                f"${row['cumulative']:,.2f}",
+            ))
+        self.draw_chart()
+
+    def on_chart_configure(self, event=None):
+        # Resizing sends a burst of events; draw once it settles
+        if self.redraw_job is not None:
+            self.after_cancel(self.redraw_job)
+        self.redraw_job = self.after(100, self.draw_chart)
+
+    def draw_chart(self):
+        self.redraw_job = None
+        self.chart.delete("all")
+        width = self.chart.winfo_width()
+        height = self.chart.winfo_height()
+        if not self.rows or width < 50:
+            return
+        left, right, top, bottom = 60, 10, 20, 25
+        peak = max(max(row[key] for key in self.SERIES_COLORS) for row in self.rows) or 1.0
+        step = (width - left - right) / max(len(self.rows) - 1, 1)
+
+        def y(value):
+            return top + (height - top - bottom) * (1 - value / peak)
+
+        self.chart.create_line(left, y(0), width - right, y(0), fill="#D5DBDB")
+        self.chart.create_text(left - 5, y(peak), text=f"{peak:,.0f}", anchor="e", font=("Arial", 8))
+        self.chart.create_text(left - 5, y(0), text="0", anchor="e", font=("Arial", 8))
+        self.chart.create_text(left, height - 5, text=self.rows[0]['day'].isoformat(), anchor="sw",
+                               font=("Arial", 8))
+        self.chart.create_text(width - right, height - 5, text=self.rows[-1]['day'].isoformat(), anchor="se",
+                               font=("Arial", 8))
+        for key, color in self.SERIES_COLORS.items():
+            points = []
+            for index, row in enumerate(self.rows):
+                points += [left + index * step, y(row[key])]
+            if len(points) >= 4:
+                self.chart.create_line(*points, fill=color, width=1 if key == "revenue" else 2)
+        for index, (key, label) in enumerate((("revenue", "Daily"), ("ma7", "7-day"), ("ma30", "30-day"),
+                                              ("ma90", "90-day"))):
+            self.chart.create_text(left + 10 + index * 70, 10, text=label, fill=self.SERIES_COLORS[key],
+                                   anchor="w", font=("Arial", 8, "bold"))
+
+    def reload(self):
+        """Drop the cached series, e.g. after medicines changed category"""
+        self.analytics.clear()
+        self.show()
+
+    def refresh(self):
+        """Apply the sales posted while the screen was hidden"""
+        self.show()
+
+    def destroy(self):
+        if self.redraw_job is not None:
+            self.after_cancel(self.redraw_job)
+            self.redraw_job = None
+        super().destroy()
 
 
 class Audit_Logs(tk.Frame):
-    """ """
+    """Newest-first view of AuditLog, paged by keyset as the list is scrolled"""
     def __init__(self, box, parent):
         super().__init__(box, bg="#FDF2E9")
-        self.create_content("Audit Logs", "📋", "Review system activities and changes")
-
-    def create_content(self, title, icon, description):
-        container = tk.Frame(self, bg=self['bg'])
-        container.pack(expand=True, fill="both")
-
-        icon_label = tk.Label(
-            container, text=icon, font=("Arial", 48), bg=self['bg'], fg="#2C3E50"
-        )
-        icon_label.pack(pady=(50, 20))
+        self.parent = parent
+        self.audit_trail = parent.audit_trail
+        self.page_size = 100
+        self.last_key = None
+        self.has_more = False
+        self.loading = False
+        self.entries = {}
+        self.users = {user['username']: user['id'] for user in parent.user_manager.get_all_users()}
+        self.create_content()
+        self.reload()
 
+    def create_content(self):
         title_label = tk.Label(
-            container, text=title, font=("Arial", 24, "bold"), bg=self['bg'], fg="#2C3E50"
+            self,
+            text="📋 Audit Logs",
+            font=("Arial", 20, "bold"),
+            fg="#2C3E50",
+            bg=self['bg'],
         )
-        title_label.pack(pady=10)
+        title_label.pack(pady=20)
 
-        desc_label = tk.Label(
-            container, text=description, font=("Arial", 14), bg=self['bg'], fg="#7F8C8D"
-        )
-        desc_label.pack(pady=10)
+        filter_frame = tk.Frame(self, bg=self['bg'])
+        filter_frame.pack(fill="x", padx=20)
+
+        self.table_var = tk.StringVar(value="All")
+        self.record_var = tk.StringVar()
+        self.medicine_var = tk.StringVar()
+        self.name_var = tk.StringVar()
+        self.user_var = tk.StringVar(value="All")
+        self.action_var = tk.StringVar(value="All")
+        self.start_var = tk.StringVar()
+        self.end_var = tk.StringVar()
+
+        fields = [
+            ("Table", ttk.Combobox(filter_frame, textvariable=self.table_var, state="readonly", width=12,
+                                   values=["All", "Medicines", "Suppliers", "Users", "Transactions"])),
+            ("Record ID", tk.Entry(filter_frame, textvariable=self.record_var, width=8, font=("Arial", 9))),
+            ("Medicine ID", tk.Entry(filter_frame, textvariable=self.medicine_var, width=8, font=("Arial", 9))),
+            ("Name starts with", tk.Entry(filter_frame, textvariable=self.name_var, width=16, font=("Arial", 9))),
+            ("User", ttk.Combobox(filter_frame, textvariable=self.user_var, state="readonly", width=14,
+                                  values=["All"] + sorted(self.users))),
+            ("Action", ttk.Combobox(filter_frame, textvariable=self.action_var, state="readonly", width=9,
+                                    values=["All", "INSERT", "UPDATE", "DELETE"])),
+            ("From (YYYY-MM-DD)", tk.Entry(filter_frame, textvariable=self.start_var, width=12, font=("Arial", 9))),
+            ("To (YYYY-MM-DD)", tk.Entry(filter_frame, textvariable=self.end_var, width=12, font=("Arial", 9))),
+        ]
+        for column, (label, widget) in enumerate(fields):
+            tk.Label(filter_frame, text=label, bg=self['bg'], fg="#7F8C8D", font=("Arial", 8)).grid(
+                row=0, column=column, padx=2, sticky="w"
+            )
+            widget.grid(row=1, column=column, padx=2, sticky="ew")
+            widget.bind("<Return>", lambda e: self.reload())
+
+        tk.Button(
+            filter_frame,
+            text="Filter",
+            command=self.reload,
+            bg="#3498DB",
+            fg="white",
+            font=("Arial", 9, "bold"),
+            relief="flat",
+            cursor="hand2"
+        ).grid(row=1, column=len(fields), padx=(8, 2))
+
+        tk.Button(
+            filter_frame,
+            text="Clear",
+            command=self.clear_filters,
+            bg="#95A5A6",
+            fg="white",
+            font=("Arial", 9, "bold"),
+            relief="flat",
+            cursor="hand2"
+        ).grid(row=1, column=len(fields) + 1, padx=2)
+
+        content = tk.Frame(self, bg=self['bg'])
+        content.pack(fill="both", expand=True, padx=20, pady=10)
+
+        columns = [
+            ("timestamp", "Time", 140),
+            ("table_name", "Table", 100),
+            ("record_id", "Record", 70),
+            ("record_name", "Name", 160),
+            ("action", "Action", 70),
+            ("username", "User", 100),
+            ("changes", "Changes", 360),
+        ]
+        self.tree = ttk.Treeview(content, columns=[key for key, _, _ in columns], show="headings", height=18)
+        for key, heading, width in columns:
+            self.tree.heading(key, text=heading)
+            self.tree.column(key, width=width, anchor="w" if key == "changes" else "center")
+
+        self.v_scrollbar = ttk.Scrollbar(content, orient="vertical", command=self.tree.yview)
+        self.tree.configure(yscrollcommand=self.on_tree_scroll)
+        self.tree.bind("<<TreeviewSelect>>", self.show_details)
+
+        self.tree.grid(row=0, column=0, sticky="nsew")
+        self.v_scrollbar.grid(row=0, column=1, sticky="ns")
+
+        self.details_text = tk.Text(content, height=8, font=("Courier", 9), bg="#FFFFFF", wrap="none")
+        self.details_text.grid(row=1, column=0, columnspan=2, sticky="ew", pady=(10, 0))
+
+        self.status_label = tk.Label(content, text="", bg=self['bg'], fg="#7F8C8D", font=("Arial", 9))
+        self.status_label.grid(row=2, column=0, sticky="w", pady=(5, 0))
+
+        content.grid_rowconfigure(0, weight=1)
+        content.grid_columnconfigure(0, weight=1)
+
+    def get_query(self):
+        """Current filter widgets as AuditTrail.get_entries arguments"""
+        filters = {}
+        if self.table_var.get() != "All":
+            filters['table_name'] = self.table_var.get()
+        if self.action_var.get() != "All":
+            filters['action'] = self.action_var.get()
+        if self.user_var.get() != "All":
+            filters['user_id'] = self.users[self.user_var.get()]
+        for key, var in (('record_id', self.record_var), ('medicine_id', self.medicine_var)):
+            if var.get().strip():
+                filters[key] = int(var.get().strip())
+        return dict(
+            filters=filters,
+            record_name=self.name_var.get().strip(),
+            start_date=self.start_var.get().strip(),
+            end_date=self.end_var.get().strip(),
+        )
+
+    def clear_filters(self):
+        for var in (self.table_var, self.user_var, self.action_var):
+            var.set("All")
+        for var in (self.record_var, self.medicine_var, self.name_var, self.start_var, self.end_var):
+            var.set("")
+        self.reload()
+
+    def refresh(self):
+        """Fetch the newest page again; entries logged while the screen was hidden go on top"""
+        self.reload()
+
+    def reload(self):
+        self.tree.delete(*self.tree.get_children())
+        self.details_text.delete("1.0", tk.END)
+        self.entries = {}
+        self.last_key = None
+        self.has_more = True
+        self.load_next_page()
+
+    def load_next_page(self):
+        if self.loading or not self.has_more:
+            return
+        self.loading = True
+        try:
+            rows = self.audit_trail.get_entries(before=self.last_key, limit=self.page_size, **self.get_query())
+        except ValueError:
+            self.has_more = False
+            messagebox.showerror("Error", "Record and medicine IDs must be whole numbers")
+            return
+        finally:
+            self.loading = False
+
+        for row in rows:
+            changes = self.audit_trail.describe_changes(row['old_values'], row['new_values'])
+            if row['action'] == 'UPDATE':
+                summary = ", ".join(f"{column}: {old} → {new}" for column, old, new in changes)
+            else:
+                summary = ", ".join(f"{column}={new if new is not None else old}" for column, old, new in changes[:6])
+            item = self.tree.insert("", "end", values=(
+                row['timestamp'],
+                row['table_name'],
+                row['record_id'],
+                row['record_name'] or "",
+                row['action'],
+                row['username'] or "",
+                summary,
+            ))
+            self.entries[item] = row
+
+        if rows:
+            self.last_key = (rows[-1]['timestamp'], rows[-1]['id'])
+        self.has_more = len(rows) == self.page_size
+        more_text = " (scroll for more)" if self.has_more else ""
+        self.status_label.config(text=f"Showing {len(self.entries)} entries{more_text}")
+
+    def on_tree_scroll(self, first, last):
+        """Scrollbar callback that fetches the next page once the end is reached"""
+        self.v_scrollbar.set(first, last)
+        if self.has_more and not self.loading and float(last) >= 1.0 and self.entries:
+            self.after_idle(self.load_next_page)
+
+    def show_details(self, event=None):
+        """Show the full old/new values of the selected entry"""
+        selection = self.tree.selection()
+        if not selection:
+            return
+        row = self.entries[selection[0]]
+        changes = self.audit_trail.describe_changes(row['old_values'], row['new_values'], ignore=())
+        self.details_text.delete("1.0", tk.END)
+        self.details_text.insert(tk.END, f"{row['action']} {row['table_name']} #{row['record_id']} "
+                                         f"at {row['timestamp']} by {row['username'] or 'system'}\n\n")
+        for column, old, new in changes:
+            self.details_text.insert(tk.END, f"{column:<24} {str(old):<30} {new}\n")
 
 
 class Inventory_Management(tk.Frame):
@@ -1502,6 +2608,12 @@ class System_Management(tk.Frame):
     def on_mousewheel(self, event):
         self.canvas.yview_scroll(int(-1 * (event.delta / 120)), "units")
 
+    def refresh(self):
+        """Take the mouse wheel back and pick up suppliers and medicines added elsewhere"""
+        self.bind_all("<MouseWheel>", self.on_mousewheel)
+        self.load_suppliers()
+        self.load_medicines()
+
     def create_content(self):
         title_label = tk.Label(
             self.scrollable_frame,
@@ -1825,15 +2937,38 @@ class System_Management(tk.Frame):
         operation_dropdown.grid(row=2, column=1, padx=10, pady=5, sticky="ew")
         operation_dropdown.bind("<Return>", self.focus_on_next_widget)
 
+        # Purchase price of incoming stock; blank means the last delivery's cost
+        tk.Label(stock_frame, text="Unit Cost:", bg=self.bg, fg="#2C3E50").grid(
+            row=3, column=0, padx=10, pady=5, sticky="e"
+        )
+        self.unit_cost_entry = tk.Entry(stock_frame, width=30, font=("Arial", 10))
+        self.unit_cost_entry.grid(row=3, column=1, padx=10, pady=5, sticky="ew")
+        self.unit_cost_entry.bind("<Return>", self.focus_on_next_widget)
+
+        # Lot of incoming stock, required for receipts
+        tk.Label(stock_frame, text="Batch:", bg=self.bg, fg="#2C3E50").grid(
+            row=4, column=0, padx=10, pady=5, sticky="e"
+        )
+        self.stock_batch_entry = tk.Entry(stock_frame, width=30, font=("Arial", 10))
+        self.stock_batch_entry.grid(row=4, column=1, padx=10, pady=5, sticky="ew")
+        self.stock_batch_entry.bind("<Return>", self.focus_on_next_widget)
+
+        tk.Label(stock_frame, text="Lot Expiry:", bg=self.bg, fg="#2C3E50").grid(
+            row=5, column=0, padx=10, pady=5, sticky="e"
+        )
+        self.stock_expiry_entry = tk.Entry(stock_frame, width=30, font=("Arial", 10))
+        self.stock_expiry_entry.grid(row=5, column=1, padx=10, pady=5, sticky="ew")
+        self.stock_expiry_entry.bind("<Return>", self.focus_on_next_widget)
+
         tk.Label(stock_frame, text="Reason:", bg=self.bg, fg="#2C3E50").grid(
-            row=3, column=0, padx=10, pady=5, sticky="ne"
+            row=6, column=0, padx=10, pady=5, sticky="ne"
         )
         self.reason_entry = tk.Text(stock_frame, height=3, width=30, font=("Arial", 10))
-        self.reason_entry.grid(row=3, column=1, padx=10, pady=5, sticky="ew")
+        self.reason_entry.grid(row=6, column=1, padx=10, pady=5, sticky="ew")
         self.reason_entry.bind("<Return>", self.focus_on_next_widget)
 
         stock_button_frame = tk.Frame(stock_frame, bg=self.bg)
-        stock_button_frame.grid(row=4, column=0, columnspan=2, pady=15)
+        stock_button_frame.grid(row=7, column=0, columnspan=2, pady=15)
 
         tk.Button(
             stock_button_frame,
@@ -1857,6 +2992,17 @@ class System_Management(tk.Frame):
             cursor="hand2"
         ).pack(side="left", padx=5)
 
+        tk.Button(
+            stock_button_frame,
+            text="Add Image...",
+            command=self.add_medicine_image,
+            bg="#16A085",
+            fg="white",
+            font=("Arial", 10, "bold"),
+            relief="flat",
+            cursor="hand2"
+        ).pack(side="left", padx=5)
+
     def load_suppliers(self):
         try:
             suppliers = self.parent.supplier_manager.get_all_suppliers()
@@ -1898,10 +3044,10 @@ class System_Management(tk.Frame):
             batch_number = self.batch_number_entry.get()
             expiry_date = self.get_expiry_date()
 
-            supplier = self.supplier_var.get()
+            supplier_id = self.supplier_id
             price = float(self.price_entry.get())
             
-            if not all([medicine_name, description, price, batch_number, expiry_date, supplier]):
+            if not all([medicine_name, description, price, batch_number, expiry_date, supplier_id]):
                 tk.messagebox.showerror("Error", "Please fill in all fields")
                 return
             medicine_data = {
@@ -1910,7 +3056,7 @@ class System_Management(tk.Frame):
                 'price': float(price),
                 'batch_number': batch_number,
                 'expiry_date': expiry_date,
-                'supplier_id': supplier
+                'supplier_id': supplier_id
             }
             medicine_id = self.parent.medicine_manager.add_medicine(**medicine_data)
             
@@ -1983,9 +3129,48 @@ class System_Management(tk.Frame):
             if quantity <= 0:
                 messagebox.showerror("Error", "Quantity must be positive")
                 return
+
+            unit_cost = None
+            if operation == "incoming" and self.unit_cost_entry.get().strip():
+                try:
+                    unit_cost = float(self.unit_cost_entry.get())
+                except ValueError:
+                    messagebox.showerror("Error", "Please enter a valid unit cost")
+                    return
+                if unit_cost < 0:
+                    messagebox.showerror("Error", "Unit cost cannot be negative")
+                    return
+            
+            if operation == "outgoing":
+                try:
+                    lots = self.parent.medicine_lots.allocate(
+                        self.medicine_id, quantity, self.parent.user_id, reason=reason
+                    )
+                except ValueError as e:
+                    messagebox.showerror("Error", str(e))
+                    return
+                taken = "\n".join(
+                    f"{lot['quantity']} from batch {lot['batch_number'] or '-'} (expires {lot['expiry_date'] or 'never'})"
+                    for lot in lots
+                )
+                messagebox.showinfo("Success", f"Stock updated successfully!\n\n{taken}")
+                self.clear_stock_form()
+                return
+
+            batch_number = self.stock_batch_entry.get().strip()
+            expiry_date = self.stock_expiry_entry.get().strip()
+            if not batch_number or not expiry_date:
+                messagebox.showerror("Error", "Please enter the batch and lot expiry of the incoming stock")
+                return
+            try:
+                expiry_date = datetime.strptime(expiry_date, "%Y-%m-%d").date().isoformat()
+            except ValueError:
+                messagebox.showerror("Error", "Please enter the lot expiry as YYYY-MM-DD")
+                return
             
             success = self.parent.medicine_manager.update_stock(
-                self.medicine_id, quantity, operation, self.parent.user_id, reason=reason
+                self.medicine_id, quantity, operation, self.parent.user_id,
+                batch_number=batch_number, expiry_date=expiry_date, reason=reason, unit_cost=unit_cost
             )
             
             if success:
@@ -1997,6 +3182,29 @@ class System_Management(tk.Frame):
         except Exception as e:
             messagebox.showerror("Error", f"Failed to update stock: {str(e)}")
 
+    def add_medicine_image(self):
+        """Store product or packaging pictures for the selected medicine"""
+        if not self.medicine_id:
+            messagebox.showerror("Error", "Please select a medicine")
+            return
+
+        paths = filedialog.askopenfilenames(
+            parent=self,
+            title="Add Medicine Images",
+            filetypes=[("Images", "*.jpg *.jpeg *.png *.gif *.bmp *.webp"), ("All files", "*.*")],
+        )
+        if not paths:
+            return
+        kind = "packaging" if messagebox.askyesno("Image Type", "Are these pictures of the packaging?") else "product"
+        try:
+            for path in paths:
+                self.parent.thumbnails.add_image(self.medicine_id, path, kind)
+            messagebox.showinfo("Success", f"{len(paths)} image(s) added")
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to add image: {str(e)}")
+
     def clear_medicine_form(self):
         self.medicine_name_entry.delete(0, tk.END)
         self.description_entry.delete("1.0", tk.END)
@@ -2023,6 +3231,9 @@ class System_Management(tk.Frame):
         self.medicine_var.set("")
         self.quantity_entry.delete(0, tk.END)
         self.operation_var.set("incoming")
+        self.unit_cost_entry.delete(0, tk.END)
+        self.stock_batch_entry.delete(0, tk.END)
+        self.stock_expiry_entry.delete(0, tk.END)
         self.reason_entry.delete("1.0", tk.END)
         self.medicine_id = None
 
@@ -2067,23 +3278,15 @@ class Analytics_and_Reports(tk.Frame):
         title_label.pack(pady=20)
 
 
-        self.notebook = ttk.Notebook(self)
+        self.notebook = LazyNotebook(self)
         self.notebook.pack(fill="both", expand=True, padx=20, pady=20)
 
-        self.stock_tab = tk.Frame(self.notebook, bg="#F8F9FA")
-        self.notebook.add(self.stock_tab, text="Stock Report")
-        self.create_stock_report_tab()
-
-        self.transaction_tab = tk.Frame(self.notebook, bg="#F8F9FA")
-        self.notebook.add(self.transaction_tab, text="Transaction Report")
-        self.create_transaction_report_tab()
-
-        self.financial_tab = tk.Frame(self.notebook, bg="#F8F9FA")
-        self.notebook.add(self.financial_tab, text="Financial Summary")
-        self.create_financial_summary_tab()
+        self.notebook.add_lazy(self.create_stock_report_tab, "Stock Report", bg="#F8F9FA")
+        self.notebook.add_lazy(self.create_transaction_report_tab, "Transaction Report", bg="#F8F9FA")
+        self.notebook.add_lazy(self.create_financial_summary_tab, "Financial Summary", bg="#F8F9FA")
 
-    def create_stock_report_tab(self):
-        control_frame = tk.Frame(self.stock_tab, bg="#F8F9FA")
+    def create_stock_report_tab(self, stock_tab):
+        control_frame = tk.Frame(stock_tab, bg="#F8F9FA")
         control_frame.pack(fill="x", padx=10, pady=10)
 
         tk.Button(
@@ -2097,21 +3300,34 @@ class Analytics_and_Reports(tk.Frame):
             cursor="hand2"
         ).pack(side="left", padx=5)
 
-        self.stock_tree = ttk.Treeview(self.stock_tab, columns=("Name", "Quantity", "Min Stock", "Price", "Status"), show="headings")
-        self.stock_tree.pack(fill="both", expand=True, padx=10, pady=10)
-
-        self.stock_tree.heading("Name", text="Medicine Name")
-        self.stock_tree.heading("Quantity", text="Quantity")
-        self.stock_tree.heading("Min Stock", text="Min Stock")
-        self.stock_tree.heading("Price", text="Price")
-        self.stock_tree.heading("Status", text="Status")
-
-        stock_scrollbar = ttk.Scrollbar(self.stock_tab, orient="vertical", command=self.stock_tree.yview)
-        self.stock_tree.configure(yscrollcommand=stock_scrollbar.set)
-        stock_scrollbar.pack(side="right", fill="y")
+        columns = [
+            ("name", "Medicine Name", 200),
+            ("quantity", "Quantity", 120),
+            ("minimum_stock", "Min Stock", 120),
+            ("price", "Price", 120),
+            ("stock_status", "Status", 120),
+        ]
+        self.stock_grid = ReportGrid(
+            stock_tab,
+            self.parent.reports,
+            "stock",
+            columns,
+            lambda row: (
+                row['name'],
+                row['quantity'],
+                row['minimum_stock'],
+                f"${row['price']:.2f}",
+                row['stock_status'],
+            ),
+            sort_by="stock_value",
+            descending=True,
+            bg="#F8F9FA",
+            thumbnails=self.parent.thumbnails,
+        )
+        self.stock_grid.pack(fill="both", expand=True, padx=10, pady=10)
 
-    def create_transaction_report_tab(self):
-        control_frame = tk.Frame(self.transaction_tab, bg="#F8F9FA")
+    def create_transaction_report_tab(self, transaction_tab):
+        control_frame = tk.Frame(transaction_tab, bg="#F8F9FA")
         control_frame.pack(fill="x", padx=10, pady=10)
 
         tk.Button(
@@ -2125,17 +3341,33 @@ class Analytics_and_Reports(tk.Frame):
             cursor="hand2"
         ).pack(side="left", padx=5)
 
-        self.transaction_tree = ttk.Treeview(self.transaction_tab, columns=("Date", "Medicine", "Type", "Quantity", "User"), show="headings")
-        self.transaction_tree.pack(fill="both", expand=True, padx=10, pady=10)
-
-        self.transaction_tree.heading("Date", text="Date")
-        self.transaction_tree.heading("Medicine", text="Medicine")
-        self.transaction_tree.heading("Type", text="Type")
-        self.transaction_tree.heading("Quantity", text="Quantity")
-        self.transaction_tree.heading("User", text="User")
+        columns = [
+            ("date", "Date", 160),
+            ("medicine_name", "Medicine", 200),
+            ("transaction_type", "Type", 120),
+            ("quantity", "Quantity", 120),
+            ("username", "User", 120),
+        ]
+        self.transaction_grid = ReportGrid(
+            transaction_tab,
+            self.parent.reports,
+            "transactions",
+            columns,
+            lambda row: (
+                row['date'],
+                row['medicine_name'],
+                row['transaction_type'],
+                row['quantity'],
+                row['username'],
+            ),
+            sort_by="date",
+            descending=True,
+            bg="#F8F9FA",
+        )
+        self.transaction_grid.pack(fill="both", expand=True, padx=10, pady=10)
 
-    def create_financial_summary_tab(self):
-        summary_frame = tk.Frame(self.financial_tab, bg="#F8F9FA")
+    def create_financial_summary_tab(self, financial_tab):
+        summary_frame = tk.Frame(financial_tab, bg="#F8F9FA")
         summary_frame.pack(fill="both", expand=True, padx=20, pady=20)
 
         tk.Button(
@@ -2158,23 +3390,15 @@ class Analytics_and_Reports(tk.Frame):
         financial_scrollbar.configure(command=self.financial_text.yview)
         self.financial_text.configure(yscrollcommand=financial_scrollbar.set)
         
+    def refresh(self):
+        for grid in ("stock_grid", "transaction_grid"):
+            if hasattr(self, grid):
+                getattr(self, grid).refresh()
+
     def generate_stock_report(self):
         try:
-            for item in self.stock_tree.get_children():
-                self.stock_tree.delete(item)
+            self.stock_grid.reload()
 
-            stock_data = self.parent.reports.get_stock_report()
-            
-            for row in stock_data:
-                status = "LOW" if row['quantity'] <= row['minimum_stock'] else "OK"
-                self.stock_tree.insert("", "end", values=(
-                    row['name'],
-                    row['quantity'],
-                    row['minimum_stock'],
-                    f"${row['price']:.2f}",
-                    status
-                ))
-            
             messagebox.showinfo("Success", "Stock report generated successfully!")
             
         except Exception as e:
@@ -2182,20 +3406,8 @@ class Analytics_and_Reports(tk.Frame):
 
     def generate_transaction_report(self):
         try:
-            for item in self.transaction_tree.get_children():
-                self.transaction_tree.delete(item)
+            self.transaction_grid.reload()
 
-            transaction_data = self.parent.reports.get_transaction_report()
-            
-            for row in transaction_data:
-                self.transaction_tree.insert("", "end", values=(
-                    row['date'],
-                    row['medicine_name'],
-                    row['transaction_type'],
-                    row['quantity'],
-                    row['username']
-                ))
-            
             messagebox.showinfo("Success", "Transaction report generated successfully!")
             
         except Exception as e:
@@ -2229,17 +3441,13 @@ class Analytics_and_Reports(tk.Frame):
 class MedicineWarehouseApp(tk.Tk):
     """ """
     def __init__(self):
-        super().__init__()
-        
-        self.db = Database()
-        self.user_manager = User(self.db)
-        self.medicine_manager = Medicine(self.db)
-        self.supplier_manager = Supplier(self.db)
-        self.reports = Reports(self.db)
+        with profiler.phase("Tk root"):
+            super().__init__()
+            # Stays hidden until a user has logged in
+            self.withdraw()
 
         self.activity_monitor = ActivityMonitor(self, timeout_minutes=5)
 
-        self.state("zoomed")
         self.wm_minsize(800, 600)
         
         self.user_name = None
@@ -2249,19 +3457,110 @@ class MedicineWarehouseApp(tk.Tk):
         self.title("Medicine Warehouse Management System")
         self.geometry("1200x700")
         self.configure(bg="#ECF0F1")
-        self.state('zoomed')  
         
 
         self.sidebar = None
         self.header = None
         self.main_content = None
         self.current_frame = None
-        
+        self.screens = OrderedDict()
+        self.max_screens = 4
+
+        # The data layer is imported and the schema created or migrated on a
+        # worker thread behind the splash; the login window follows.
+        with profiler.phase("splash screen"):
+            self.splash = SplashScreen(self)
+            self.splash.update_idletasks()
+        self.startup_events = queue.Queue()
+        threading.Thread(
+            target=self.initialize,
+            args=(self.startup_events,),
+            name="startup",
+            daemon=True
+        ).start()
+        self.poll_startup()
+
+    def initialize(self, events):
+        """Worker thread: import the data layer and set up the database"""
+        try:
+            with profiler.phase("import data layer"):
+                for module in STARTUP_MODULES:
+                    importlib.import_module(module)
+            from database_new_Architecture import Database
+
+            db = Database(setup=False)
+            with profiler.phase("Database.create_database"):
+                db.create_database()
+            with profiler.phase("Database.create_default_admin"):
+                db.create_default_admin()
+            db.close_connection()
+            events.put((db, None))
+        except Exception as e:
+            events.put((None, e))
+
+    def poll_startup(self):
+        try:
+            db, error = self.startup_events.get_nowait()
+        except queue.Empty:
+            self.after(20, self.poll_startup)
+            return
+
+        self.splash.destroy()
+        if error:
+            messagebox.showerror("Error", f"Failed to open the database: {str(error)}")
+            self.destroy()
+            return
+        self.finish_startup(db)
+
+    def finish_startup(self, db):
+        """Create the managers and background services, then ask for a login"""
+        # Already imported by initialize()
+        from database_new_Architecture import User, Medicine, MedicineLot, Supplier, Reports, AuditTrail
+        from backup import BackupManager, BackupScheduler
+        from retention import RetentionPurger
+        from valuation import InventoryValuation
+        from revenue import RevenueAnalytics
+
+        profiler.mark("database ready")
+        self.db = db
+        self.user_manager = User(self.db)
+        self.medicine_manager = Medicine(self.db)
+        self.medicine_lots = MedicineLot(self.db)
+        self.supplier_manager = Supplier(self.db)
+        self.reports = Reports(self.db)
+        self.audit_trail = AuditTrail(self.db)
+
+        self.backup_manager = BackupManager(self.db)
+        self.backup_scheduler = BackupScheduler(self.backup_manager, is_idle=self.is_idle)
+        self.backup_scheduler.start()
+        self.retention_purger = RetentionPurger(self.db, backup_manager=self.backup_manager, is_idle=self.is_idle)
+        self.retention_purger.start()
+        self.inventory_valuation = InventoryValuation(self.db, is_idle=self.is_idle)
+        self.inventory_valuation.start()
+        self.revenue_analytics = RevenueAnalytics(self.db)
+
+        self.after(100, self.prefetch_modules)
         self.show_login()
 
+    def prefetch_modules(self):
+        """Import what the screens need while the user is typing credentials"""
+        def run():
+            with profiler.phase("prefetch screen modules"):
+                for module in PREFETCH_MODULES:
+                    try:
+                        importlib.import_module(module)
+                    except ImportError as e:
+                        logger.warning(f"Could not preload {module}: {e}")
+
+        threading.Thread(target=run, name="prefetch", daemon=True).start()
+
     def show_login(self):
         """Show login window"""
-        login_window = LoginWindow(self)
+        with profiler.phase("login window"):
+            login_window = LoginWindow(self)
+            login_window.update_idletasks()
+        profiler.mark("login window shown")
+        profiler.save()
         self.wait_window(login_window)
 
     def set_user(self, username, role, user_id):
@@ -2269,6 +3568,13 @@ class MedicineWarehouseApp(tk.Tk):
         self.user_name = username
         self.user_role = role
         self.user_id = user_id
+        self.db.acting_user_id = user_id
+        if not hasattr(self, 'thumbnails'):
+            # Only the screens use it, and it loads PIL, so it was prefetched during login
+            from thumbnails import ThumbnailService
+            self.thumbnails = ThumbnailService(self.db)
+            self.thumbnails.backfill()
+        self.state("zoomed")
         self.setup_main_interface()
         self.activity_monitor.start_monitoring()
 
@@ -2282,8 +3588,12 @@ class MedicineWarehouseApp(tk.Tk):
         
         self.main_content = tk.Frame(self.main_container, bg="#ECF0F1")
         self.main_content.pack(side="right", fill="both", expand=True)
+        self.screens = OrderedDict()
         
-        self.switch_frame(Dashboard)
+        with profiler.phase("first switch_frame(Dashboard)"):
+            self.switch_frame(Dashboard)
+        profiler.mark("dashboard shown")
+        profiler.finish()
 
     def toggle_sidebar(self):
         """Toggle sidebar visibility"""
@@ -2293,15 +3603,34 @@ class MedicineWarehouseApp(tk.Tk):
             self.sidebar.pack(side="left", fill="y", before=self.main_content)
 
     def switch_frame(self, frame_class):
-        """Switch to a different frame"""
+        """Switch to a different frame.
+
+        Recently used screens are kept alive, hidden with pack_forget, in an
+        LRU of max_screens entries. A cached screen is shown again after its
+        optional refresh() hook has updated anything that may be stale.
+        """
         if self.current_frame:
-            self.current_frame.destroy()
-        
-        self.current_frame = frame_class(self.main_content,self)
+            self.current_frame.pack_forget()
+
+        started = time.perf_counter()
+        frame = self.screens.pop(frame_class, None)
+        cached = frame is not None
+        if not cached:
+            frame = frame_class(self.main_content, self)
+        elif hasattr(frame, 'refresh'):
+            frame.refresh()
+        self.screens[frame_class] = frame
+
+        while len(self.screens) > self.max_screens:
+            _, oldest = self.screens.popitem(last=False)
+            oldest.destroy()
+
+        self.current_frame = frame
         self.current_frame.pack(fill="both", expand=True)
 
-        if hasattr(self, 'activity_monitor') and self.activity_monitor.is_active:
-            self.activity_monitor.bind_activity_events()
+        # Widget creation only; layout happens when Tk is next idle
+        logger.info(f"{'Showed cached' if cached else 'Built'} {frame_class.__name__} "
+                    f"in {(time.perf_counter() - started) * 1000:.0f} ms")
 
     def logout(self):
         """Logout and return to login screen"""
@@ -2310,6 +3639,7 @@ class MedicineWarehouseApp(tk.Tk):
         self.user_name = None
         self.user_role = None
         self.user_id = None
+        self.db.acting_user_id = None
         
         if self.header:
             self.header.destroy()
@@ -2319,12 +3649,25 @@ class MedicineWarehouseApp(tk.Tk):
             self.sidebar.destroy()
         if hasattr(self, 'current_frame'):
             self.current_frame.destroy()
+        for frame in self.screens.values():
+            frame.destroy()
+        self.screens.clear()
+        self.current_frame = None
         self.show_login()
 
+    def is_idle(self, minutes=2):
+        """True when nobody is logged in or the user hasn't touched the app for a while"""
+        monitor = self.activity_monitor
+        return not monitor.is_active or monitor.idle_seconds() >= minutes * 60
+
     def set_session_timeout(self, minutes):
         """Set session timeout in minutes"""
         self.activity_monitor.timeout_minutes = minutes
-        self.activity_monitor.timeout_ms = minutes * 60 * 1000
+
+    def destroy(self):
+        if hasattr(self, 'thumbnails'):
+            self.thumbnails.shutdown()
+        super().destroy()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,145 @@
+
+import argparse
+import hashlib
+import hmac
+import logging
+import os
+import statistics
+import time
+
+
+logger = logging.getLogger(__name__)
+
+
+class PasswordHasher:
+    """Password hashing with the algorithm and cost recorded next to each hash.
+
+    The site's policy (algorithm and cost) lives in the Settings table so it
+    can be tuned per installation with `python passwords.py calibrate`.
+    Hashes made under an older policy keep verifying with their own
+    parameters and are rehashed on the next successful login.
+
+    Cost is the iteration count for PBKDF2 and log2(N) for scrypt.
+    """
+
+    DEFAULT_ALGORITHM = 'pbkdf2_sha256'
+    DEFAULT_COST = {'pbkdf2_sha256': 600000, 'scrypt': 15}
+
+    # Below these the hash is too cheap to be worth storing, whatever the latency target
+    MIN_COST = {'pbkdf2_sha256': 100000, 'scrypt': 14}
+
+    SCRYPT_R = 8
+    SCRYPT_P = 1
+
+    def __init__(self, algorithm=DEFAULT_ALGORITHM, cost=None):
+        if algorithm not in self.DEFAULT_COST:
+            raise ValueError(f"Unknown password algorithm: {algorithm}")
+        self.algorithm = algorithm
+        self.cost = cost or self.DEFAULT_COST[algorithm]
+
+    @classmethod
+    def from_settings(cls, db):
+        """The hasher for the policy saved in db, or the defaults"""
+        with db.get_connection() as conn:
+            settings = dict(conn.execute('''
+                SELECT key, value FROM Settings WHERE key IN ('password_algorithm', 'password_cost')
+            ''').fetchall())
+        cost = settings.get('password_cost')
+        return cls(settings.get('password_algorithm', cls.DEFAULT_ALGORITHM), int(cost) if cost else None)
+
+    def save(self, db):
+        with db.get_connection() as conn:
+            conn.executemany('''
+                INSERT INTO Settings (key, value) VALUES (?, ?)
+                ON CONFLICT(key) DO UPDATE SET value = excluded.value, updated_at = CURRENT_TIMESTAMP
+            ''', (('password_algorithm', self.algorithm), ('password_cost', str(self.cost))))
+            conn.commit()
+        logger.info(f"Password policy set to {self.algorithm} at cost {self.cost}")
+
+    @classmethod
+    def derive(cls, password, salt, algorithm, cost):
+        """Hex digest of password under the given parameters"""
+        password, salt = password.encode('utf-8'), salt.encode('utf-8')
+        if algorithm == 'pbkdf2_sha256':
+            return hashlib.pbkdf2_hmac('sha256', password, salt, cost).hex()
+        if algorithm == 'scrypt':
+            n = 1 << cost
+            return hashlib.scrypt(password, salt=salt, n=n, r=cls.SCRYPT_R, p=cls.SCRYPT_P,
+                                  maxmem=256 * cls.SCRYPT_R * n, dklen=32).hex()
+        raise ValueError(f"Unknown password algorithm: {algorithm}")
+
+    def hash(self, password, salt=None):
+        """Returns (hash, salt, algorithm, cost) to store together"""
+        if salt is None:
+            salt = os.urandom(16).hex()
+        return self.derive(password, salt, self.algorithm, self.cost), salt, self.algorithm, self.cost
+
+    def verify(self, password, stored_hash, salt, algorithm, cost):
+        return hmac.compare_digest(self.derive(password, salt, algorithm, cost), stored_hash)
+
+    def needs_rehash(self, algorithm, cost):
+        return algorithm != self.algorithm or cost != self.cost
+
+    @classmethod
+    def measure(cls, algorithm, cost, samples=3):
+        """Median seconds for one hash at the given parameters"""
+        times = []
+        for _ in range(samples):
+            started = time.perf_counter()
+            cls.derive('calibration', 'calibration-salt', algorithm, cost)
+            times.append(time.perf_counter() - started)
+        return statistics.median(times)
+
+    @classmethod
+    def calibrate(cls, algorithm=DEFAULT_ALGORITHM, target_ms=250):
+        """Highest cost whose hash takes no longer than target_ms on this machine"""
+        target = target_ms / 1000
+        if algorithm == 'pbkdf2_sha256':
+            # PBKDF2 time is linear in the iteration count
+            probe = 100000
+            cost = int(probe * target / cls.measure(algorithm, probe)) // 10000 * 10000
+            while cost > 10000 and cls.measure(algorithm, cost) > target:
+                cost -= 10000
+        else:
+            cost = 10
+            while cls.measure(algorithm, cost + 1) <= target:
+                cost += 1
+        return max(cost, cls.MIN_COST[algorithm])
+
+
+def main(argv=None):
+    from database_new_Architecture import Database
+
+    parser = argparse.ArgumentParser(description="Show or calibrate the password hashing policy")
+    parser.add_argument('command', choices=['show', 'calibrate'])
+    parser.add_argument('--db', default='medicine_warehouse.db', help="database file")
+    parser.add_argument('--algorithm', choices=sorted(PasswordHasher.DEFAULT_COST),
+                        default=PasswordHasher.DEFAULT_ALGORITHM, help="calibrate: algorithm for new hashes")
+    parser.add_argument('--target-ms', type=int, default=250,
+                        help="calibrate: longest acceptable time for one login hash on this machine")
+    parser.add_argument('--dry-run', action='store_true', help="calibrate: print the cost without saving it")
+    args = parser.parse_args(argv)
+
+    db = Database(args.db)
+    hasher = PasswordHasher.from_settings(db)
+
+    if args.command == 'calibrate':
+        cost = PasswordHasher.calibrate(args.algorithm, args.target_ms)
+        hasher = PasswordHasher(args.algorithm, cost)
+        print(f"{args.algorithm} cost {cost}: {PasswordHasher.measure(args.algorithm, cost) * 1000:.0f} ms per hash")
+        if args.dry_run:
+            return
+        hasher.save(db)
+
+    print(f"Policy: {hasher.algorithm} at cost {hasher.cost}")
+    with db.get_connection() as conn:
+        for algorithm, cost, users in conn.execute('''
+            SELECT password_algorithm, password_cost, COUNT(*) FROM Users WHERE is_active = 1
+            GROUP BY password_algorithm, password_cost
+        ''').fetchall():
+            outdated = " (rehashed on next login)" if hasher.needs_rehash(algorithm, cost) else ""
+            print(f"  {users} user(s) on {algorithm} at cost {cost}{outdated}")
+
+
+if __name__ == '__main__':
+    main()
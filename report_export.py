@@ -0,0 +1,475 @@
+
+import argparse
+import csv
+import json
+import logging
+import os
+import re
+import threading
+import zipfile
+import zlib
+from array import array
+from datetime import datetime
+from xml.sax.saxutils import escape
+
+
+logger = logging.getLogger(__name__)
+
+# Characters that are not allowed anywhere in an XML 1.0 document
+INVALID_XML_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+class CsvReportWriter:
+    """Write report rows to a CSV file (UTF-8 with BOM so Excel detects the encoding)"""
+
+    def __init__(self, path, columns):
+        self.file = open(path, 'w', newline='', encoding='utf-8-sig')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(columns)
+
+    def write_rows(self, rows):
+        self.writer.writerows(tuple(row) for row in rows)
+
+    def close(self):
+        self.file.close()
+
+
+class JsonlReportWriter:
+    """Write report rows as one JSON object per line"""
+
+    def __init__(self, path, columns):
+        self.file = open(path, 'w', encoding='utf-8')
+        self.columns = columns
+
+    def write_rows(self, rows):
+        self.file.writelines(
+            json.dumps(dict(zip(self.columns, row)), ensure_ascii=False, default=str) + '\n'
+            for row in rows
+        )
+
+    def close(self):
+        self.file.close()
+
+
+class XlsxReportWriter:
+    """Minimal single-sheet XLSX writer built on zipfile only.
+
+    The worksheet XML is streamed straight into the zip member and strings are
+    written inline, so no shared-strings table has to be kept in memory.
+    """
+    MAX_ROWS = 1048576
+
+    CONTENT_TYPES = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    )
+    ROOT_RELS = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    )
+    WORKBOOK = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="{name}" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    )
+    WORKBOOK_RELS = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    )
+
+    def __init__(self, path, columns, sheet_name='Report'):
+        self.zip = zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED)
+        self.zip.writestr('[Content_Types].xml', self.CONTENT_TYPES)
+        self.zip.writestr('_rels/.rels', self.ROOT_RELS)
+        self.zip.writestr('xl/workbook.xml', self.WORKBOOK.format(name=escape(sheet_name[:31])))
+        self.zip.writestr('xl/_rels/workbook.xml.rels', self.WORKBOOK_RELS)
+
+        self.sheet = self.zip.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True)
+        self.sheet.write(
+            b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+            b'<sheetData>'
+        )
+        self.row_count = 0
+        self.write_rows([columns])
+
+    def cell(self, value):
+        if value is None:
+            return '<c/>'
+        if isinstance(value, bool):
+            return f'<c t="b"><v>{int(value)}</v></c>'
+        if isinstance(value, (int, float)):
+            return f'<c><v>{value!r}</v></c>'
+        text = escape(INVALID_XML_CHARS.sub('', str(value)))
+        return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+    def write_rows(self, rows):
+        chunk = []
+        for row in rows:
+            self.row_count += 1
+            if self.row_count > self.MAX_ROWS:
+                raise ValueError(f"XLSX supports at most {self.MAX_ROWS} rows; use CSV or JSONL instead")
+            chunk.append('<row>' + ''.join(self.cell(value) for value in row) + '</row>')
+        self.sheet.write(''.join(chunk).encode('utf-8'))
+
+    def close(self):
+        self.sheet.write(b'</sheetData></worksheet>')
+        self.sheet.close()
+        self.zip.close()
+
+
+class PdfReportWriter:
+    """Paginated PDF writer that emits each page as soon as it is full.
+
+    Only the rows of the current page are buffered; finished pages are
+    compressed and written straight to the file. The only state that grows
+    with the report is the cross-reference table (8 bytes per PDF object, two
+    objects per page), so a 50,000 row report needs about 20 KB of it.
+    Columns listed in `total_columns` get a subtotal on every page and a
+    grand total on the last one. Uses the standard Helvetica fonts, so no
+    font files or external services are needed.
+    """
+    PAGE_WIDTH = 842   # A4 landscape, in points
+    PAGE_HEIGHT = 595
+    MARGIN = 36
+    FONT_SIZE = 8
+    LEADING = 12
+    CATALOG, PAGES, FONT, BOLD_FONT = 1, 2, 3, 4
+    FIRST_PAGE_OBJECT = 5
+    ESCAPES = str.maketrans({'\\': '\\\\', '(': '\\(', ')': '\\)'})
+
+    def __init__(self, path, columns, title='Report', total_columns=()):
+        self.file = open(path, 'wb')
+        self.columns = list(columns)
+        self.title = title
+        self.total_indexes = [i for i, column in enumerate(self.columns) if column in total_columns]
+        self.page_totals = dict.fromkeys(self.total_indexes, 0)
+        self.grand_totals = dict.fromkeys(self.total_indexes, 0)
+        self.generated_at = datetime.now().strftime('%Y-%m-%d %H:%M')
+        self.buffer = []
+        self.page_count = 0
+        self.column_widths = None
+        self.offsets = array('Q', [0] * self.FIRST_PAGE_OBJECT)
+
+        usable_height = self.PAGE_HEIGHT - 2 * self.MARGIN - 5 * self.LEADING
+        self.rows_per_page = usable_height // self.LEADING
+
+        self.file.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+        self.write_object(self.FONT, b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica '
+                                     b'/Encoding /WinAnsiEncoding >>')
+        self.write_object(self.BOLD_FONT, b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold '
+                                          b'/Encoding /WinAnsiEncoding >>')
+
+    def write_object(self, number, body):
+        if number >= len(self.offsets):
+            self.offsets.extend([0] * (number - len(self.offsets) + 1))
+        self.offsets[number] = self.file.tell()
+        self.file.write(b'%d 0 obj\n' % number + body + b'\nendobj\n')
+
+    @staticmethod
+    def pdf_string(text):
+        data = str(text).encode('cp1252', errors='replace')
+        return b'(' + data.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)') + b')'
+
+    @staticmethod
+    def format_value(value):
+        if value is None:
+            return ''
+        if isinstance(value, float):
+            return f'{value:,.2f}'
+        return str(value)
+
+    def text_width(self, text, size):
+        # Helvetica averages a little over half an em per character
+        return len(text) * size * 0.55
+
+    def fit(self, text, width, size):
+        max_chars = int(width / (size * 0.55))
+        return text if len(text) <= max_chars else text[:max(1, max_chars - 1)] + '~'
+
+    def layout_columns(self):
+        """Size columns from the header and the rows of the first page"""
+        lengths = [len(column) for column in self.columns]
+        for row in self.buffer:
+            for i, value in enumerate(row):
+                lengths[i] = max(lengths[i], len(self.format_value(value)))
+        lengths = [min(max(length, 4), 40) for length in lengths]
+        usable_width = self.PAGE_WIDTH - 2 * self.MARGIN
+        scale = usable_width / sum(lengths)
+        self.column_widths = [length * scale for length in lengths]
+
+    def write_rows(self, rows):
+        for row in rows:
+            row = tuple(row)
+            self.buffer.append(row)
+            for i in self.total_indexes:
+                if isinstance(row[i], (int, float)):
+                    self.page_totals[i] += row[i]
+                    self.grand_totals[i] += row[i]
+            if len(self.buffer) == self.rows_per_page:
+                self.flush_page()
+
+    def draw_row(self, ops, values, y, bold=False):
+        """Append one table row as a single text object with relative moves between cells"""
+        parts = ['BT /F2' if bold else 'BT /F1', f' {self.FONT_SIZE} Tf']
+        x = self.MARGIN
+        previous_x = 0
+        for value, width in zip(values, self.column_widths):
+            text = self.fit(self.format_value(value), width - 4, self.FONT_SIZE)
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                text_x = x + width - 4 - self.text_width(text, self.FONT_SIZE)
+            else:
+                text_x = x + 2
+            if text:
+                move_y = y if previous_x == 0 else 0
+                parts.append(f' {text_x - previous_x:.2f} {move_y:.2f} Td ({text.translate(self.ESCAPES)}) Tj')
+                previous_x = text_x
+            x += width
+        parts.append(' ET')
+        ops.append(''.join(parts).encode('cp1252', errors='replace'))
+
+    def draw_totals(self, ops, label, totals, y):
+        values = [''] * len(self.columns)
+        for i in self.total_indexes:
+            values[i] = totals[i]
+        self.draw_row(ops, values, y, bold=True)
+        ops.append(b'BT /F2 %d Tf %d %.2f Td %s Tj ET' % (
+            self.FONT_SIZE, self.MARGIN + 2, y, self.pdf_string(label)))
+
+    def flush_page(self, last=False):
+        if self.column_widths is None:
+            self.layout_columns()
+        self.page_count += 1
+
+        top = self.PAGE_HEIGHT - self.MARGIN
+        left, right = self.MARGIN, self.PAGE_WIDTH - self.MARGIN
+        ops = [
+            b'BT /F2 12 Tf %d %d Td %s Tj ET' % (left, top - 12, self.pdf_string(self.title)),
+            b'BT /F1 8 Tf %d %d Td %s Tj ET' % (
+                right - 150, top - 12, self.pdf_string(f'Generated {self.generated_at}')),
+        ]
+
+        y = top - 2 * self.LEADING - 8
+        self.draw_row(ops, self.columns, y, bold=True)
+        ops.append(b'0.5 w %d %.2f m %d %.2f l S' % (left, y - 3, right, y - 3))
+
+        for row in self.buffer:
+            y -= self.LEADING
+            self.draw_row(ops, row, y)
+
+        if self.total_indexes:
+            y -= self.LEADING
+            ops.append(b'0.5 w %d %.2f m %d %.2f l S' % (left, y + 8, right, y + 8))
+            self.draw_totals(ops, 'Page subtotal', self.page_totals, y)
+            if last:
+                y -= self.LEADING
+                self.draw_totals(ops, 'Grand total', self.grand_totals, y)
+
+        ops.append(b'BT /F1 8 Tf %d %d Td %s Tj ET' % (
+            left, self.MARGIN - 12, self.pdf_string(f'Page {self.page_count}')))
+
+        content = zlib.compress(b'\n'.join(ops))
+        page_object = self.FIRST_PAGE_OBJECT + 2 * (self.page_count - 1)
+        self.write_object(page_object, b'<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %d %d] '
+                                       b'/Resources << /Font << /F1 %d 0 R /F2 %d 0 R >> >> '
+                                       b'/Contents %d 0 R >>' % (
+                                           self.PAGES, self.PAGE_WIDTH, self.PAGE_HEIGHT,
+                                           self.FONT, self.BOLD_FONT, page_object + 1))
+        self.write_object(page_object + 1, b'<< /Length %d /Filter /FlateDecode >>\nstream\n' % len(content)
+                          + content + b'\nendstream')
+
+        self.buffer = []
+        self.page_totals = dict.fromkeys(self.total_indexes, 0)
+
+    def close(self):
+        if self.buffer or self.page_count == 0:
+            self.flush_page(last=True)
+        elif self.total_indexes:
+            # The last page filled up exactly; put the grand total on a page of its own
+            self.flush_page(last=True)
+
+        self.offsets[self.PAGES] = self.file.tell()
+        self.file.write(b'%d 0 obj\n<< /Type /Pages /Count %d /Kids [' % (self.PAGES, self.page_count))
+        for page in range(self.page_count):
+            self.file.write(b'%d 0 R ' % (self.FIRST_PAGE_OBJECT + 2 * page))
+        self.file.write(b'] >>\nendobj\n')
+        self.write_object(self.CATALOG, b'<< /Type /Catalog /Pages %d 0 R >>' % self.PAGES)
+
+        xref_offset = self.file.tell()
+        self.file.write(b'xref\n0 %d\n0000000000 65535 f \n' % len(self.offsets))
+        for offset in self.offsets[1:]:
+            self.file.write(b'%010d 00000 n \n' % offset)
+        self.file.write(b'trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (
+            len(self.offsets), self.CATALOG, xref_offset))
+        self.file.close()
+
+
+EXPORT_FORMATS = {
+    'csv': CsvReportWriter,
+    'jsonl': JsonlReportWriter,
+    'xlsx': XlsxReportWriter,
+    'pdf': PdfReportWriter,
+}
+
+# PDF presentation of the named reports: title and the columns that get subtotals
+PDF_REPORT_OPTIONS = {
+    'stock': {'title': 'Stock Report', 'total_columns': ('quantity', 'stock_value')},
+    'transactions': {'title': 'Transaction Report', 'total_columns': ('quantity', 'total_amount')},
+}
+
+
+class ExportCancelled(Exception):
+    """Raised inside an export when the caller asked it to stop"""
+
+
+class ReportExporter:
+    """Stream any named Reports query to a file (CSV, JSONL, XLSX or PDF), one chunk at a time"""
+
+    def __init__(self, reports, chunk_size=1000):
+        self.reports = reports
+        self.chunk_size = chunk_size
+
+    @staticmethod
+    def format_from_path(path):
+        extension = os.path.splitext(path)[1].lower().lstrip('.')
+        if extension not in EXPORT_FORMATS:
+            raise ValueError(f"Unsupported export format: .{extension}")
+        return extension
+
+    def export(self, report_name, path, file_format=None, progress=None, cancel_event=None, **options):
+        """Export a report and return the number of rows written.
+
+        `progress(rows_written, total_rows)` is called after every chunk and
+        `cancel_event` (a threading.Event) stops the export between chunks.
+        A cancelled or failed export removes the partial file.
+        """
+        file_format = file_format or self.format_from_path(path)
+        writer_class = EXPORT_FORMATS.get(file_format)
+        if writer_class is None:
+            raise ValueError(f"Unsupported export format: {file_format}")
+
+        writer_options = PDF_REPORT_OPTIONS.get(report_name, {}) if file_format == 'pdf' else {}
+        total_rows = self.reports.count_report(report_name, **options) if progress else None
+        rows_written = 0
+        writer = None
+        try:
+            for rows in self.reports.stream_report(report_name, self.chunk_size, **options):
+                if cancel_event is not None and cancel_event.is_set():
+                    raise ExportCancelled()
+                if writer is None:
+                    writer = writer_class(path, list(rows[0].keys()), **writer_options)
+                writer.write_rows(rows)
+                rows_written += len(rows)
+                if progress:
+                    progress(rows_written, total_rows)
+
+            if writer is None:
+                columns = self.empty_report_columns(report_name, **options)
+                writer = writer_class(path, columns, **writer_options)
+            writer.close()
+            writer = None
+        except BaseException:
+            if writer is not None:
+                writer.close()
+            if os.path.exists(path):
+                os.remove(path)
+            raise
+
+        logger.info(f"Exported {rows_written} rows of '{report_name}' report to {path}")
+        return rows_written
+
+    def empty_report_columns(self, report_name, **options):
+        """Column names of a report that returned no rows"""
+        query, params = self.reports._report_query(report_name, **options)
+        with self.reports.db.get_connection() as conn:
+            cursor = conn.execute(f'SELECT * FROM ({query}) LIMIT 0', params)
+            return [column[0] for column in cursor.description]
+
+    def export_in_background(self, report_name, path, progress=None, done=None, **options):
+        """Run export() on a worker thread.
+
+        Returns the cancel event. `done(rows_written, error)` is called from the
+        worker thread when the export finishes, fails or is cancelled.
+        """
+        cancel_event = threading.Event()
+
+        def worker():
+            try:
+                rows_written = self.export(report_name, path, progress=progress,
+                                           cancel_event=cancel_event, **options)
+            except BaseException as e:
+                if done:
+                    done(0, e)
+                return
+            if done:
+                done(rows_written, None)
+
+        threading.Thread(target=worker, daemon=True).start()
+        return cancel_event
+
+
+def parse_filters(filter_args):
+    """Turn ['quantity=>=10', 'name=para'] into {'quantity': '>=10', 'name': 'para'}"""
+    filters = {}
+    for item in filter_args or []:
+        key, separator, value = item.partition('=')
+        if not separator:
+            raise ValueError(f"Filters must look like column=value, got: {item}")
+        filters[key] = value
+    return filters
+
+
+def main(argv=None):
+    from database_new_Architecture import Database, Reports
+
+    parser = argparse.ArgumentParser(description="Export a report from the medicine warehouse database")
+    parser.add_argument('report', help="report name, e.g. stock or transactions")
+    parser.add_argument('output', help="output file (.csv, .jsonl, .xlsx or .pdf)")
+    parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), help="override the format implied by the extension")
+    parser.add_argument('--db', default='medicine_warehouse.db', help="database file")
+    parser.add_argument('--sort', dest='sort_by', help="column to sort by")
+    parser.add_argument('--desc', action='store_true', help="sort in descending order")
+    parser.add_argument('--filter', action='append', default=[], metavar='COLUMN=VALUE',
+                        help="column filter, e.g. quantity=>=10 (repeatable)")
+    parser.add_argument('--from', dest='start_date', help="start date (transactions report)")
+    parser.add_argument('--to', dest='end_date', help="end date, included (transactions report)")
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    options = {'filters': parse_filters(args.filter)}
+    if args.sort_by:
+        options['sort_by'] = args.sort_by
+        options['descending'] = args.desc
+    if args.start_date or args.end_date:
+        options['start_date'] = args.start_date
+        options['end_date'] = args.end_date
+
+    reports = Reports(Database(args.db))
+    exporter = ReportExporter(reports, chunk_size=args.chunk_size)
+
+    def progress(rows_written, total_rows):
+        print(f"\r{rows_written}/{total_rows} rows", end='', flush=True)
+
+    rows_written = exporter.export(args.report, args.output, args.format, progress=progress, **options)
+    print(f"\nExported {rows_written} rows to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
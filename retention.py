@@ -0,0 +1,206 @@
+
+import argparse
+import logging
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+
+logger = logging.getLogger(__name__)
+
+
+class RetentionRule:
+    """Rows of `table` that may be deleted once `age_column` is more than `days` old.
+
+    `condition` narrows the rule further (e.g. only resolved alerts).
+    `order_column` must grow with the rowid (an insert timestamp); it bounds
+    the id range the purger walks and defaults to `age_column`.
+    """
+
+    def __init__(self, table, days, age_column, condition=None, order_column=None):
+        self.table = table
+        self.days = days
+        self.age_column = age_column
+        self.condition = condition
+        self.order_column = order_column or age_column
+
+    def cutoff(self, now=None):
+        """Oldest timestamp kept, in the UTC CURRENT_TIMESTAMP format the tables use"""
+        now = now or datetime.now(timezone.utc)
+        return (now - timedelta(days=self.days)).strftime('%Y-%m-%d %H:%M:%S')
+
+
+DEFAULT_RULES = (
+    RetentionRule('AuditLog', days=365, age_column='timestamp'),
+    RetentionRule('StockAlerts', days=90, age_column='resolved_at', condition='is_resolved = 1',
+                  order_column='created_at'),
+)
+
+
+class RetentionPurger:
+    """Deletes expired rows in small rowid-ranged batches from a background thread.
+
+    Each batch is its own short transaction followed by a pause, and the
+    batch size adapts so one delete holds the write lock for about
+    `batch_ms`, never long enough to stall Stock Operations. AuditLog
+    rows newer than the oldest backup are always kept because
+    BackupManager.restore_to_point replays them.
+    """
+
+    def __init__(self, db, rules=DEFAULT_RULES, backup_manager=None, batch_size=500, batch_ms=10,
+                 pause=0.05, is_idle=lambda: True, interval=timedelta(hours=24), check_seconds=300):
+        self.db = db
+        self.rules = rules
+        self.backup_manager = backup_manager
+        self.batch_size = batch_size
+        self.batch_ms = batch_ms
+        self.pause = pause
+        self.is_idle = is_idle
+        self.interval = interval
+        self.check_seconds = check_seconds
+        self.last_run = None
+        self.last_report = None
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def cutoff(self, rule):
+        cutoff = rule.cutoff()
+        if rule.table == 'AuditLog' and self.backup_manager:
+            backups = self.backup_manager.list_backups()
+            if backups:
+                oldest = backups[-1]['created'].astimezone(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+                cutoff = min(cutoff, oldest)
+        return cutoff
+
+    @staticmethod
+    def last_id_before(cursor, table, column, cutoff):
+        """Highest id whose `column` is older than cutoff, by binary search over the rowid"""
+        low, high = cursor.execute(f'SELECT MIN(id), MAX(id) FROM {table}').fetchone()
+        if low is None:
+            return None
+        found = None
+        while low <= high:
+            middle = (low + high) // 2
+            row = cursor.execute(f'SELECT id, {column} FROM {table} WHERE id >= ? ORDER BY id LIMIT 1',
+                                 (middle,)).fetchone()
+            if row is None or row[1] is None or row[1] >= cutoff:
+                high = middle - 1
+            else:
+                found = row[0]
+                low = row[0] + 1
+        return found
+
+    def purge_rule(self, conn, rule):
+        """Delete the rule's expired rows batch by batch; returns the number of rows deleted"""
+        cursor = conn.cursor()
+        cutoff = self.cutoff(rule)
+        last = self.last_id_before(cursor, rule.table, rule.order_column, cutoff)
+        if last is None:
+            return 0
+
+        condition = f'{rule.age_column} < ?'
+        if rule.condition:
+            condition += f' AND {rule.condition}'
+
+        deleted = 0
+        batch_size = self.batch_size
+        low = cursor.execute(f'SELECT MIN(id) FROM {rule.table}').fetchone()[0] - 1
+        while low < last and not self.stop_event.is_set():
+            high = cursor.execute(f'''
+                SELECT MAX(id) FROM (
+                    SELECT id FROM {rule.table} WHERE id > ? AND id <= ? ORDER BY id LIMIT ?
+                )
+            ''', (low, last, batch_size)).fetchone()[0]
+            if high is None:
+                break
+            started = time.perf_counter()
+            cursor.execute(f'DELETE FROM {rule.table} WHERE id > ? AND id <= ? AND {condition}',
+                           (low, high, cutoff))
+            deleted += cursor.rowcount
+            conn.commit()
+            elapsed_ms = (time.perf_counter() - started) * 1000
+
+            # Aim each write transaction at batch_ms
+            if elapsed_ms > self.batch_ms:
+                batch_size = max(50, batch_size // 2)
+            elif elapsed_ms < self.batch_ms / 2:
+                batch_size = min(10000, batch_size * 3 // 2)
+            low = high
+            time.sleep(self.pause)
+        return deleted
+
+    def purge(self):
+        """Apply every rule and report rows deleted and pages reclaimed"""
+        started = time.perf_counter()
+        with self.db.get_connection() as conn:
+            page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+            free_before = conn.execute('PRAGMA freelist_count').fetchone()[0]
+
+            rows = {rule.table: self.purge_rule(conn, rule) for rule in self.rules}
+
+            # Freed pages go on the freelist and are reused by new rows before
+            # the file grows again; VACUUM (archive.py --vacuum) shrinks the file.
+            pages_freed = max(conn.execute('PRAGMA freelist_count').fetchone()[0] - free_before, 0)
+
+        report = {
+            'rows': rows,
+            'pages_freed': pages_freed,
+            'bytes_freed': pages_freed * page_size,
+            'seconds': time.perf_counter() - started,
+        }
+        self.last_run = datetime.now()
+        self.last_report = report
+        logger.info(f"Retention purge: {rows}, {pages_freed} pages ({report['bytes_freed']:,} bytes) "
+                    f"freed in {report['seconds']:.1f}s")
+        return report
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, name='retention-purger', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def run(self):
+        while not self.stop_event.wait(self.check_seconds):
+            try:
+                due = self.last_run is None or datetime.now() - self.last_run >= self.interval
+                if due and self.is_idle():
+                    self.purge()
+            except Exception as e:
+                logger.error(f"Retention purge failed: {e}")
+
+
+def main(argv=None):
+    from database_new_Architecture import Database
+    from backup import BackupManager
+
+    parser = argparse.ArgumentParser(description="Delete expired audit log entries and resolved stock alerts")
+    parser.add_argument('--db', default='medicine_warehouse.db', help="database file")
+    parser.add_argument('--backup-dir', default='backups',
+                        help="backups whose point-in-time restore must keep working")
+    parser.add_argument('--audit-days', type=int, default=365, help="keep AuditLog entries this many days")
+    parser.add_argument('--alert-days', type=int, default=90, help="keep resolved StockAlerts this many days")
+    parser.add_argument('--batch-ms', type=int, default=10, help="target duration of one delete transaction")
+    args = parser.parse_args(argv)
+
+    db = Database(args.db)
+    rules = (
+        RetentionRule('AuditLog', days=args.audit_days, age_column='timestamp'),
+        RetentionRule('StockAlerts', days=args.alert_days, age_column='resolved_at',
+                      condition='is_resolved = 1', order_column='created_at'),
+    )
+    purger = RetentionPurger(db, rules, BackupManager(db, backup_dir=args.backup_dir),
+                             batch_ms=args.batch_ms)
+    report = purger.purge()
+    for table, count in report['rows'].items():
+        print(f"{table}: {count} rows deleted")
+    print(f"{report['pages_freed']} pages ({report['bytes_freed']:,} bytes) freed for reuse "
+          f"in {report['seconds']:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
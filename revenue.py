@@ -0,0 +1,272 @@
+
+import argparse
+import logging
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, timedelta, timezone
+
+
+logger = logging.getLogger(__name__)
+
+MOVING_AVERAGE_DAYS = (7, 30, 90)
+
+
+def utc_today():
+    """Transaction dates are UTC, so the series' days are too"""
+    return datetime.now(timezone.utc).date()
+
+
+class RevenueSeries:
+    """Daily revenue of one scope from `start` to the last day added.
+
+    Alongside the daily values it keeps prefix sums of revenue and of
+    day index * revenue, so any window's total, moving average or
+    least-squares trend is a couple of subtractions. Revenue added for the
+    last day updates both sums in O(1); a backdated amount updates them
+    from its day on.
+    """
+
+    def __init__(self, start, last_id=0):
+        self.start = start
+        self.last_id = last_id  # highest Transactions id included
+        self.daily = []
+        self.cumulative = []
+        self.weighted = []
+
+    @property
+    def end(self):
+        """The last day in the series"""
+        return self.start + timedelta(days=len(self.daily) - 1)
+
+    def extend_to(self, day):
+        """Append zero days up to and including day"""
+        total = self.cumulative[-1] if self.cumulative else 0.0
+        weighted = self.weighted[-1] if self.weighted else 0.0
+        for _ in range((day - self.start).days + 1 - len(self.daily)):
+            self.daily.append(0.0)
+            self.cumulative.append(total)
+            self.weighted.append(weighted)
+
+    def add(self, day, amount):
+        if day < self.start:
+            # Rare: a sale dated before the first one moves the start back
+            self.daily = [0.0] * (self.start - day).days + self.daily
+            self.start = day
+            self.cumulative, self.weighted = [], []
+            total = weighted = 0.0
+            for index, value in enumerate(self.daily):
+                total += value
+                weighted += index * value
+                self.cumulative.append(total)
+                self.weighted.append(weighted)
+
+        self.extend_to(day)
+        index = (day - self.start).days
+        self.daily[index] += amount
+        for i in range(index, len(self.daily)):
+            self.cumulative[i] += amount
+            self.weighted[i] += index * amount
+
+    def index(self, day):
+        """Position of day clamped to the series, -1 if it is before the start"""
+        return min((day - self.start).days, len(self.daily) - 1)
+
+    def window_total(self, end, days):
+        """Revenue of the `days` days ending at index end"""
+        if end < 0:
+            return 0.0
+        before = end - days
+        return self.cumulative[end] - (self.cumulative[before] if before >= 0 else 0.0)
+
+    def moving_average(self, end, days):
+        """Mean daily revenue over `days` days ending at index end; shorter at the start"""
+        if end < 0:
+            return 0.0
+        return self.window_total(end, days) / min(days, end + 1)
+
+    def trend(self, end, days):
+        """Least-squares slope of daily revenue over `days` days ending at index end, per day"""
+        first = max(end - days + 1, 0)
+        n = end - first + 1
+        if n < 2:
+            return 0.0
+        sum_y = self.window_total(end, n)
+        sum_xy = self.weighted[end] - (self.weighted[first - 1] if first else 0.0)
+        sum_x = (first + end) * n / 2
+        sum_xx = (end * (end + 1) * (2 * end + 1) - (first - 1) * first * (2 * first - 1)) / 6
+        return (n * sum_xy - sum_x * sum_y) / (n * sum_xx - sum_x * sum_x)
+
+    def summary(self, day=None):
+        """Statistics as of day (default: the last day)"""
+        end = self.index(day or self.end)
+        previous = self.window_total(end - 30, 30)
+        current = self.window_total(end, 30)
+        summary = {
+            'day': self.start + timedelta(days=end) if end >= 0 else day,
+            'revenue': self.daily[end] if end >= 0 else 0.0,
+            'cumulative': self.cumulative[end] if end >= 0 else 0.0,
+            'trend': self.trend(end, 30),
+            'change_percent': (current - previous) / previous * 100 if previous else None,
+        }
+        for days in MOVING_AVERAGE_DAYS:
+            summary[f'ma{days}'] = self.moving_average(end, days)
+        return summary
+
+    def points(self, days, day=None):
+        """Daily rows of the `days` days ending at day, oldest first"""
+        end = self.index(day or self.end)
+        rows = []
+        for index in range(max(end - days + 1, 0), end + 1):
+            row = {
+                'day': self.start + timedelta(days=index),
+                'revenue': self.daily[index],
+                'cumulative': self.cumulative[index],
+            }
+            for window in MOVING_AVERAGE_DAYS:
+                row[f'ma{window}'] = self.moving_average(index, window)
+            rows.append(row)
+        return rows
+
+
+class RevenueAnalytics:
+    """Revenue series per scope, loaded once and kept current incrementally.
+
+    A scope is ('total', None), ('category', name) or ('medicine', id). A
+    series is loaded from the daily aggregates the triggers maintain
+    (DailyProfit for the total, MedicineDailySales otherwise), never from
+    the transactions, and remembers the highest Transactions id it
+    includes. get() first applies the outgoing transactions posted since,
+    read by rowid, so opening the screen again costs only what is new.
+    A medicine's category is looked up when its sales are applied, so
+    recategorising moves only later sales until the series is reloaded.
+    """
+
+    def __init__(self, db, max_series=32):
+        self.db = db
+        self.max_series = max_series
+        self.series = OrderedDict()
+        self.lock = threading.Lock()
+
+    def load(self, scope, key):
+        with self.db.get_connection() as conn:
+            cursor = conn.cursor()
+            # One read transaction, so the watermark matches the rows read
+            cursor.execute('BEGIN')
+            try:
+                last_id = cursor.execute('SELECT COALESCE(MAX(id), 0) FROM Transactions').fetchone()[0]
+                if scope == 'total':
+                    cursor.execute('SELECT day, revenue FROM DailyProfit WHERE sales_count > 0 ORDER BY day')
+                elif scope == 'category':
+                    cursor.execute('''
+                    SELECT d.day, SUM(d.revenue)
+                    FROM MedicineDailySales d
+                    JOIN Medicines m ON m.id = d.medicine_id
+                    WHERE COALESCE(m.category, '') = ?
+                    GROUP BY d.day
+                    ORDER BY d.day
+                    ''', (key,))
+                elif scope == 'medicine':
+                    cursor.execute('SELECT day, revenue FROM MedicineDailySales WHERE medicine_id = ? ORDER BY day',
+                                   (key,))
+                else:
+                    raise ValueError(f"Unknown revenue scope: {scope}")
+                rows = cursor.fetchall()
+            finally:
+                conn.commit()
+
+        start = date.fromisoformat(rows[0][0]) if rows else utc_today()
+        series = RevenueSeries(start, last_id)
+        # In day order every add is at the end of the series, so O(1)
+        for day, revenue in rows:
+            series.add(date.fromisoformat(day), revenue)
+        series.extend_to(utc_today())
+        return series
+
+    def sync(self):
+        """Apply the outgoing transactions posted since the oldest watermark"""
+        if not self.series:
+            return 0
+        since = min(series.last_id for series in self.series.values())
+        with self.db.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('BEGIN')
+            try:
+                last_id = cursor.execute('SELECT COALESCE(MAX(id), 0) FROM Transactions').fetchone()[0]
+                if last_id < since:
+                    # Ids went backwards: the database was restored
+                    logger.info("Transactions rewound, reloading revenue series")
+                    self.series.clear()
+                    return 0
+                cursor.execute('''
+                SELECT t.id, substr(t.date, 1, 10), t.medicine_id, COALESCE(m.category, ''),
+                       COALESCE(t.total_amount, t.quantity * t.unit_price, 0)
+                FROM Transactions t
+                LEFT JOIN Medicines m ON m.id = t.medicine_id
+                WHERE t.id > ? AND t.transaction_type = 'outgoing'
+                ORDER BY t.id
+                ''', (since,))
+                rows = cursor.fetchall()
+            finally:
+                conn.commit()
+
+        for transaction_id, day, medicine_id, category, amount in rows:
+            day = date.fromisoformat(day)
+            for (scope, key), series in self.series.items():
+                if transaction_id <= series.last_id:
+                    continue
+                if scope == 'total' or (scope, key) in (('medicine', medicine_id), ('category', category)):
+                    series.add(day, amount)
+        today = utc_today()
+        for series in self.series.values():
+            series.last_id = last_id
+            series.extend_to(today)
+        return len(rows)
+
+    def get(self, scope='total', key=None):
+        """The current series of a scope"""
+        with self.lock:
+            self.sync()
+            series = self.series.pop((scope, key), None)
+            if series is None:
+                series = self.load(scope, key)
+            self.series[(scope, key)] = series
+            while len(self.series) > self.max_series:
+                self.series.popitem(last=False)
+            return series
+
+    def clear(self):
+        with self.lock:
+            self.series.clear()
+
+
+def main(argv=None):
+    from database_new_Architecture import Database
+
+    parser = argparse.ArgumentParser(description="Revenue moving averages, cumulative total and trend")
+    parser.add_argument('--db', default='medicine_warehouse.db', help="database file")
+    scope = parser.add_mutually_exclusive_group()
+    scope.add_argument('--category', help="only this category ('' for none)")
+    scope.add_argument('--medicine', type=int, help="only this medicine id")
+    parser.add_argument('--days', type=int, default=14, help="daily rows to print")
+    args = parser.parse_args(argv)
+
+    analytics = RevenueAnalytics(Database(args.db))
+    if args.medicine is not None:
+        series = analytics.get('medicine', args.medicine)
+    elif args.category is not None:
+        series = analytics.get('category', args.category)
+    else:
+        series = analytics.get()
+
+    print(f"{'Day':<12}{'Revenue':>12}{'7-day':>12}{'30-day':>12}{'90-day':>12}{'Cumulative':>16}")
+    for row in series.points(args.days):
+        print(f"{row['day'].isoformat():<12}{row['revenue']:>12,.2f}{row['ma7']:>12,.2f}"
+              f"{row['ma30']:>12,.2f}{row['ma90']:>12,.2f}{row['cumulative']:>16,.2f}")
+    summary = series.summary()
+    change = summary['change_percent']
+    print(f"30-day trend {summary['trend']:+,.2f}/day; last 30 days "
+          f"{'n/a' if change is None else f'{change:+.1f}%'} vs the 30 before")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+
+# Imported before everything else in main.py, so it keeps its own imports
+# light; argparse and platform are imported where they are used.
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PATH = 'startup_profile.json'
+
+
+class ImportTimer:
+    """Meta path hook that times each module's first execution, like `-X importtime`.
+
+    It finds nothing itself: it asks the finders after it, then wraps the
+    exec_module of the spec's own loader instance. Built-in and frozen
+    modules, whose loader is a shared class, are left alone.
+    """
+
+    def __init__(self, profiler):
+        self.profiler = profiler
+        self.local = threading.local()
+
+    def find_spec(self, name, path, target=None):
+        if getattr(self.local, 'finding', False):
+            return None
+        self.local.finding = True
+        try:
+            for finder in sys.meta_path:
+                if finder is self or not hasattr(finder, 'find_spec'):
+                    continue
+                spec = finder.find_spec(name, path, target)
+                if spec is not None:
+                    break
+            else:
+                return None
+        finally:
+            self.local.finding = False
+
+        loader = spec.loader
+        if loader is not None and not isinstance(loader, type) and hasattr(loader, 'exec_module'):
+            exec_module = loader.exec_module
+
+            def timed_exec_module(module):
+                with self.timing(name):
+                    exec_module(module)
+
+            loader.exec_module = timed_exec_module
+        return spec
+
+    @contextmanager
+    def timing(self, name):
+        if not self.profiler.active:
+            yield
+            return
+        stack = self.local.__dict__.setdefault('stack', [])
+        entry = [time.perf_counter(), 0.0]
+        stack.append(entry)
+        try:
+            yield
+        finally:
+            stack.pop()
+            cumulative = time.perf_counter() - entry[0]
+            if stack:
+                stack[-1][1] += cumulative
+            self.profiler.imports.append({
+                'module': name,
+                'thread': threading.current_thread().name,
+                'self_us': round((cumulative - entry[1]) * 1e6),
+                'cumulative_us': round(cumulative * 1e6),
+                'depth': len(stack),
+            })
+
+
+class StartupProfiler:
+    """Durations of the startup phases and of every import, saved as JSON.
+
+    start() installs the import hook and sets time zero; phase() and mark()
+    record from any thread until finish() saves the report and removes the
+    hook. Interpreter startup before start() is not included.
+    """
+
+    def __init__(self):
+        self.started = None
+        self.finished = False
+        self.phases = []
+        self.marks = {}
+        self.imports = []
+        self.import_timer = ImportTimer(self)
+
+    @property
+    def active(self):
+        return self.started is not None and not self.finished
+
+    def elapsed_ms(self, moment=None):
+        return round(((moment or time.perf_counter()) - self.started) * 1000, 1)
+
+    def start(self):
+        self.started = time.perf_counter()
+        sys.meta_path.insert(0, self.import_timer)
+
+    @contextmanager
+    def phase(self, name):
+        if not self.active:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            if self.active:
+                self.phases.append({
+                    'name': name,
+                    'thread': threading.current_thread().name,
+                    'start_ms': self.elapsed_ms(started),
+                    'duration_ms': round((time.perf_counter() - started) * 1000, 1),
+                })
+
+    def mark(self, name):
+        """Record a milestone as milliseconds since start()"""
+        if self.active:
+            self.marks[name] = self.elapsed_ms()
+
+    def report(self):
+        import platform
+
+        return {
+            'recorded_at': datetime.now().isoformat(timespec='seconds'),
+            'host': platform.node(),
+            'platform': platform.platform(),
+            'python': platform.python_version(),
+            'marks_ms': self.marks,
+            'phases': self.phases,
+            'imports_total_ms': round(sum(entry['self_us'] for entry in self.imports) / 1000, 1),
+            'imports': self.imports,
+        }
+
+    def save(self, path=DEFAULT_PATH):
+        if self.started is None:
+            return
+        try:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(self.report(), f, indent=2)
+        except OSError as e:
+            logger.warning(f"Could not write startup profile {path}: {e}")
+
+    def finish(self, path=DEFAULT_PATH):
+        """Stop recording, remove the import hook and write the report"""
+        if not self.active:
+            return
+        self.finished = True
+        if self.import_timer in sys.meta_path:
+            sys.meta_path.remove(self.import_timer)
+        self.save(path)
+        logger.info(f"Startup profile written to {os.path.abspath(path)}")
+
+
+# The application's profiler; main.py starts it before its own imports
+profiler = StartupProfiler()
+
+
+def format_report(report, imports=15):
+    lines = [f"Startup profile recorded {report['recorded_at']} on {report['host']} "
+             f"({report['platform']}, Python {report['python']})", ""]
+    for name, ms in report['marks_ms'].items():
+        lines.append(f"{name:<40} at {ms:>9.1f} ms")
+    lines += ["", f"{'Phase':<40} {'Thread':<12} {'Start ms':>9} {'Duration ms':>12}"]
+    for phase in report['phases']:
+        lines.append(f"{phase['name']:<40} {phase['thread']:<12} {phase['start_ms']:>9.1f} "
+                     f"{phase['duration_ms']:>12.1f}")
+    lines += ["", f"Imports: {len(report['imports'])} modules, {report['imports_total_ms']:.1f} ms",
+              f"{'self [us]':>10} | {'cumulative':>10} | module"]
+    slowest = sorted(report['imports'], key=lambda entry: entry['cumulative_us'], reverse=True)[:imports]
+    for entry in slowest:
+        lines.append(f"{entry['self_us']:>10} | {entry['cumulative_us']:>10} | "
+                     f"{'  ' * entry['depth']}{entry['module']} [{entry['thread']}]")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Show the startup timing report written by the last launch")
+    parser.add_argument('file', nargs='?', default=DEFAULT_PATH, help="startup profile JSON file")
+    parser.add_argument('--imports', type=int, default=15, help="number of slowest imports to list")
+    args = parser.parse_args(argv)
+
+    with open(args.file, encoding='utf-8') as f:
+        print(format_report(json.load(f), args.imports))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+from costing import CostLedger
+from database_new_Architecture import Database
+
+
+class CostLedgerRebuildTest(unittest.TestCase):
+    """The cost_layers_* triggers and CostLedger.rebuild implement the same FIFO rules"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.db = Database(os.path.join(self.directory, 'costing.db'))
+        with self.db.get_connection() as conn:
+            conn.executemany('INSERT INTO Medicines (name, quantity, price) VALUES (?, 0, ?)',
+                             [(f'Medicine {i}', 2.5 * i) for i in range(1, 6)])
+            conn.commit()
+
+    def tearDown(self):
+        self.db.close_connection()
+        shutil.rmtree(self.directory)
+
+    def post(self, movements):
+        """Insert (medicine_id, type, quantity, unit_price, total_amount, date) rows, firing the triggers"""
+        with self.db.get_connection() as conn:
+            conn.executemany('''
+            INSERT INTO Transactions (medicine_id, transaction_type, quantity, unit_price, total_amount, date, user_id)
+            VALUES (?, ?, ?, ?, ?, ?, 1)
+            ''', movements)
+            conn.commit()
+
+    def ledger(self):
+        with self.db.get_connection() as conn:
+            layers = conn.execute('''
+            SELECT id, medicine_id, transaction_id, received_at, round(unit_cost, 6), quantity, remaining
+            FROM CostLayers ORDER BY id
+            ''').fetchall()
+            allocations = conn.execute('''
+            SELECT transaction_id, medicine_id, layer_id, quantity, round(unit_cost, 6)
+            FROM CostAllocations ORDER BY id
+            ''').fetchall()
+            days = conn.execute('''
+            SELECT day, sales_count, quantity_sold, round(revenue, 6), round(cogs, 6), round(purchases, 6)
+            FROM DailyProfit ORDER BY day
+            ''').fetchall()
+        return [tuple(row) for row in layers], [tuple(row) for row in allocations], [tuple(row) for row in days]
+
+    def assertRebuildMatchesTriggers(self):
+        posted = self.ledger()
+        self.assertTrue(posted[0] and posted[1] and posted[2])
+        with self.db.get_connection() as conn:
+            CostLedger.rebuild(conn.cursor())
+            conn.commit()
+        rebuilt = self.ledger()
+        for table, trigger_rows, rebuild_rows in zip(CostLedger.TABLES, posted, rebuilt):
+            self.assertEqual(trigger_rows, rebuild_rows, table)
+
+    def test_mixed_movements(self):
+        self.post([
+            (1, 'incoming', 10, 2.0, 20.0, '2025-01-02 09:00:00'),
+            (1, 'incoming', 5, None, 17.5, '2025-01-02 10:00:00'),     # cost from the total
+            (1, 'outgoing', 12, 4.0, 48.0, '2025-01-03 11:00:00'),     # spans both layers
+            (1, 'outgoing', 6, 4.0, None, '2025-01-03 12:00:00'),      # shortfall at the last cost
+            (2, 'outgoing', 3, 6.0, 18.0, '2025-01-03 13:00:00'),      # never received: sale price
+            (2, 'incoming', 4, None, None, '2025-01-04 09:00:00'),     # no cost at all
+            (2, 'outgoing', 2, None, None, '2025-01-04 10:00:00'),
+            (3, 'incoming', 8, 1.25, None, '2025-01-05 09:00:00'),
+            (3, 'outgoing', 8, 3.0, 24.0, '2025-01-05 10:00:00'),      # empties the layer exactly
+            (3, 'incoming', 2, 1.5, 3.0, '2025-01-06 09:00:00'),
+        ])
+        self.assertRebuildMatchesTriggers()
+
+    def test_zero_quantity_rows(self):
+        # The CHECK (quantity > 0) came after data that breaks it; the ledger must still agree
+        with self.db.get_connection() as conn:
+            conn.execute('PRAGMA ignore_check_constraints = ON')
+        try:
+            self.post([
+                (1, 'incoming', 0, None, 5.0, '2025-02-01 09:00:00'),
+                (1, 'incoming', 3, 2.0, 6.0, '2025-02-01 10:00:00'),
+                (1, 'outgoing', 0, 4.0, 0.0, '2025-02-02 09:00:00'),
+                (1, 'outgoing', 2, 4.0, 8.0, '2025-02-02 10:00:00'),
+                (4, 'incoming', 0, None, None, '2025-02-03 09:00:00'),
+                (4, 'outgoing', 1, 10.0, 10.0, '2025-02-03 10:00:00'),
+            ])
+        finally:
+            with self.db.get_connection() as conn:
+                conn.execute('PRAGMA ignore_check_constraints = OFF')
+        self.assertRebuildMatchesTriggers()
+
+    def test_random_history(self):
+        generator = random.Random(47)
+        movements = []
+        for i in range(2000):
+            medicine_id = generator.randint(1, 5)
+            day = f'2025-{1 + i // 200:02d}-{1 + i % 28:02d} {generator.randint(8, 18):02d}:00:00'
+            if generator.random() < 0.4:
+                unit_price = generator.choice([None, round(generator.uniform(0.5, 20), 2)])
+                quantity = generator.randint(1, 50)
+                total = round(quantity * unit_price, 2) if unit_price else generator.choice([None, 12.0])
+                movements.append((medicine_id, 'incoming', quantity, unit_price, total, day))
+            else:
+                quantity = generator.randint(1, 30)
+                unit_price = round(generator.uniform(1, 30), 2)
+                movements.append((medicine_id, 'outgoing', quantity, unit_price, None, day))
+        self.post(movements)
+        self.assertRebuildMatchesTriggers()
+
+
+if __name__ == '__main__':
+    unittest.main()
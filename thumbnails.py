@@ -0,0 +1,195 @@
+
+import argparse
+import io
+import logging
+import os
+import tempfile
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from PIL import Image, ImageOps
+
+from database_new_Architecture import Database, MedicineImage
+from image_cache import ByteLRU, image_bytes
+
+
+logger = logging.getLogger(__name__)
+
+
+class ThumbnailService:
+    """Thumbnails of the MedicineImages originals, made on a small thread pool.
+
+    A lookup tries memory, then the on-disk cache, then the thumbnails
+    precomputed in MedicineImageThumbnails, and only then decodes the
+    original from its blob (JPEGs in draft mode, at 1/2 to 1/8 scale).
+    Disk cache files are named after the original's sha256, so they never
+    go stale; the table keeps thumbnails with the database, so another
+    workstation or a restored backup does not decode the originals again.
+    """
+
+    def __init__(self, db, size=48, cache_dir=None, workers=2, max_memory_bytes=8 * 1024 * 1024):
+        self.db = db
+        self.images = MedicineImage(db)
+        self.size = size
+        self.cache_dir = cache_dir or os.path.join(os.path.dirname(os.path.abspath(db.db_name)), 'thumbnails')
+        self.memory = ByteLRU(max_memory_bytes)
+        self.pending = {}
+        self.lock = threading.RLock()
+        self.stopping = False
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='thumbnail')
+
+    def cache_path(self, sha256, size):
+        return os.path.join(self.cache_dir, sha256[:2], f'{sha256}-{size}.png')
+
+    def cached(self, sha256, size=None):
+        """The thumbnail if it is already in memory, without doing any work"""
+        with self.lock:
+            return self.memory.get((sha256, size or self.size))
+
+    def request(self, image_id, sha256, size=None):
+        """Future of the thumbnail of an image as a PIL image, produced on the pool"""
+        key = (sha256, size or self.size)
+        with self.lock:
+            image = self.memory.get(key)
+            if image is not None:
+                future = Future()
+                future.set_result(image)
+                return future
+            # Rows showing the same picture share one job
+            future = self.pending.get(key)
+            if future is None:
+                future = self.pool.submit(self.thumbnail, image_id, *key)
+                self.pending[key] = future
+                future.add_done_callback(lambda done: self.pending.pop(key, None))
+            return future
+
+    def thumbnail(self, image_id, sha256, size):
+        """Worker thread: the thumbnail from the fastest place that has it"""
+        path = self.cache_path(sha256, size)
+        image = self.read_cache_file(path)
+        if image is None:
+            data = self.images.get_thumbnail(image_id, size)
+            if data is None:
+                data, width, height = self.make_thumbnail(image_id, size)
+                self.images.save_thumbnail(image_id, size, width, height, data)
+            self.write_cache_file(path, data)
+            image = Image.open(io.BytesIO(data))
+            image.load()
+        with self.lock:
+            self.memory.put((sha256, size), image, image_bytes(image))
+        return image
+
+    def make_thumbnail(self, image_id, size):
+        """Decode an original straight from its blob; returns (PNG bytes, width, height)"""
+        with self.images.open_image(image_id) as blob, Image.open(blob) as original:
+            # thumbnail() asks JPEGs for a draft decode at the smallest sufficient scale
+            original.thumbnail((size, size), Image.Resampling.LANCZOS)
+            image = ImageOps.exif_transpose(original)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info or 'A' in image.mode else 'RGB')
+        output = io.BytesIO()
+        image.save(output, 'PNG', optimize=True)
+        return output.getvalue(), image.width, image.height
+
+    @staticmethod
+    def read_cache_file(path):
+        try:
+            with Image.open(path) as cached:
+                cached.load()
+                return cached.copy()
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable thumbnail {path}: {e}")
+            return None
+
+    @staticmethod
+    def write_cache_file(path, data):
+        """Write atomically, so a reader never sees half a file; the cache is optional"""
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not cache thumbnail {path}: {e}")
+
+    def add_image(self, medicine_id, path, kind='product'):
+        """Store a picture for a medicine and start on its thumbnail; returns the image id"""
+        try:
+            # Reads the header only
+            with Image.open(path) as image:
+                width, height = image.size
+                mime_type = Image.MIME.get(image.format)
+        except (OSError, Image.DecompressionBombError) as e:
+            raise ValueError(f"{os.path.basename(path)} is not a readable image: {e}")
+
+        image_id = self.images.add_image(medicine_id, path, kind, mime_type, width, height)
+        self.request(image_id, self.images.get_image(image_id)['sha256'])
+        return image_id
+
+    def backfill(self, size=None):
+        """Precompute the missing thumbnails at size on one worker; returns a Future of the count"""
+        return self.pool.submit(self.run_backfill, size or self.size)
+
+    def run_backfill(self, size):
+        made = 0
+        after_id = 0
+        while not self.stopping:
+            batch = self.images.get_images_without_thumbnail(size, after_id)
+            if not batch:
+                break
+            for image_id, sha256 in batch:
+                if self.stopping:
+                    break
+                try:
+                    data, width, height = self.make_thumbnail(image_id, size)
+                    self.images.save_thumbnail(image_id, size, width, height, data)
+                    self.write_cache_file(self.cache_path(sha256, size), data)
+                    made += 1
+                except Exception as e:
+                    logger.error(f"Thumbnail of image {image_id} failed: {e}")
+                after_id = image_id
+        if made:
+            logger.info(f"Precomputed {made} thumbnails at {size}px")
+        return made
+
+    def shutdown(self):
+        """Drop queued work so closing the application does not wait for it"""
+        self.stopping = True
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Store medicine pictures and precompute their thumbnails")
+    parser.add_argument('--db', default='medicine_warehouse.db', help="database file")
+    parser.add_argument('--size', type=int, default=48, help="thumbnail size in pixels")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    add_parser = subparsers.add_parser('add', help="store pictures for a medicine")
+    add_parser.add_argument('medicine_id', type=int)
+    add_parser.add_argument('files', nargs='+')
+    add_parser.add_argument('--kind', choices=['product', 'packaging'], default='product')
+    export_parser = subparsers.add_parser('export', help="copy a stored original to a file")
+    export_parser.add_argument('image_id', type=int)
+    export_parser.add_argument('file')
+    subparsers.add_parser('backfill', help="precompute every missing thumbnail")
+    args = parser.parse_args(argv)
+
+    service = ThumbnailService(Database(args.db), size=args.size)
+    try:
+        if args.command == 'add':
+            for path in args.files:
+                image_id = service.add_image(args.medicine_id, path, args.kind)
+                print(f"{path}: image {image_id}")
+        elif args.command == 'export':
+            service.images.export_image(args.image_id, args.file)
+            print(f"Image {args.image_id} written to {args.file}")
+        if args.command in ('add', 'backfill'):
+            print(f"{service.backfill().result()} thumbnails precomputed")
+    finally:
+        service.pool.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,247 @@
+
+import argparse
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+
+logger = logging.getLogger(__name__)
+
+# Medicines without a category are valued under ''
+CATEGORY_SQL = "COALESCE(category, '')"
+
+
+class InventoryValuation:
+    """Inventory value per category, kept current by triggers, with a drift check.
+
+    InventoryValue holds one row per category: the number of medicines,
+    units on hand, their value at the sale price (quantity * price) and at
+    cost (the remaining quantity of the FIFO cost layers, see costing.py).
+    Triggers on Medicines and CostLayers apply each change as a delta in
+    the transaction that makes it, so stock movements, price edits and
+    recategorisations are reflected on commit and the total is a sum over
+    a handful of rows.
+
+    Running sums of floats drift by rounding, and a change made with the
+    triggers missing (an old restore, a manual edit of the file) is never
+    applied, so check() recomputes everything and rewrites the table when
+    a category is off by more than `tolerance`. start() runs it from a
+    background thread every `interval` while the application is idle.
+    """
+
+    def __init__(self, db, tolerance=0.01, is_idle=lambda: True, interval=timedelta(hours=1),
+                 check_seconds=300):
+        self.db = db
+        self.tolerance = tolerance
+        self.is_idle = is_idle
+        self.interval = interval
+        self.check_seconds = check_seconds
+        self.last_check = None
+        self.last_report = None
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    @staticmethod
+    def create_schema(cursor):
+        """Create the table and triggers; True if the table did not exist yet"""
+        created = cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'InventoryValue'"
+        ).fetchone() is None
+
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS InventoryValue (
+            category TEXT PRIMARY KEY,
+            medicine_count INTEGER NOT NULL DEFAULT 0,
+            quantity INTEGER NOT NULL DEFAULT 0,
+            value FLOAT NOT NULL DEFAULT 0,
+            cost_value FLOAT NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+        ''')
+
+        def apply(row, sign, cost_value):
+            """Upsert adding (sign = '+') or removing (sign = '-') one medicine row"""
+            return f'''
+            INSERT INTO InventoryValue (category, medicine_count, quantity, value, cost_value)
+            VALUES (COALESCE({row}.category, ''), {sign}1, {sign}{row}.quantity,
+                    {sign}{row}.quantity * COALESCE({row}.price, 0), {sign}({cost_value}))
+            ON CONFLICT(category) DO UPDATE SET
+                medicine_count = medicine_count + excluded.medicine_count,
+                quantity = quantity + excluded.quantity,
+                value = value + excluded.value,
+                cost_value = cost_value + excluded.cost_value;
+            '''
+
+        open_cost = ('SELECT COALESCE(SUM(remaining * unit_cost), 0) FROM CostLayers '
+                     'WHERE medicine_id = {row}.id AND remaining > 0')
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS inventory_value_insert AFTER INSERT ON Medicines
+        BEGIN
+            {apply('NEW', '+', open_cost.format(row='NEW'))}
+        END
+        ''')
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS inventory_value_delete AFTER DELETE ON Medicines
+        BEGIN
+            {apply('OLD', '-', open_cost.format(row='OLD'))}
+        END
+        ''')
+        # The cost value only moves when the category does; CostLayers carries the rest
+        moved_cost = f"CASE WHEN OLD.category IS NOT NEW.category THEN ({open_cost.format(row='NEW')}) ELSE 0 END"
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS inventory_value_update
+        AFTER UPDATE OF quantity, price, category ON Medicines
+        WHEN OLD.quantity IS NOT NEW.quantity OR OLD.price IS NOT NEW.price
+            OR OLD.category IS NOT NEW.category
+        BEGIN
+            {apply('OLD', '-', moved_cost)}
+            {apply('NEW', '+', moved_cost)}
+        END
+        ''')
+
+        for name, event, row, delta in (
+            ('inventory_cost_layer_insert', 'INSERT', 'NEW', 'NEW.remaining * NEW.unit_cost'),
+            ('inventory_cost_layer_update', 'UPDATE OF remaining', 'NEW',
+             '(NEW.remaining - OLD.remaining) * NEW.unit_cost'),
+            ('inventory_cost_layer_delete', 'DELETE', 'OLD', '-OLD.remaining * OLD.unit_cost'),
+        ):
+            cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {name} AFTER {event} ON CostLayers
+            BEGIN
+                INSERT INTO InventoryValue (category, cost_value)
+                SELECT {CATEGORY_SQL}, {delta} FROM Medicines WHERE id = {row}.medicine_id
+                ON CONFLICT(category) DO UPDATE SET cost_value = cost_value + excluded.cost_value;
+            END
+            ''')
+        return created
+
+    @staticmethod
+    def recompute(cursor):
+        """{category: (medicine_count, quantity, value, cost_value)} from the base tables"""
+        cursor.execute(f'''
+        SELECT {CATEGORY_SQL} as category, COUNT(*), COALESCE(SUM(quantity), 0),
+               COALESCE(SUM(quantity * COALESCE(price, 0)), 0),
+               COALESCE(SUM((SELECT SUM(remaining * unit_cost) FROM CostLayers l
+                             WHERE l.medicine_id = m.id AND l.remaining > 0)), 0)
+        FROM Medicines m
+        GROUP BY 1
+        ''')
+        return {row[0]: tuple(row[1:]) for row in cursor.fetchall()}
+
+    @staticmethod
+    def rebuild(cursor, values=None):
+        """Rewrite InventoryValue from the base tables (or from recompute()'s result)"""
+        values = InventoryValuation.recompute(cursor) if values is None else values
+        cursor.execute('DELETE FROM InventoryValue')
+        cursor.executemany('''
+        INSERT INTO InventoryValue (category, medicine_count, quantity, value, cost_value)
+        VALUES (?, ?, ?, ?, ?)
+        ''', [(category,) + totals for category, totals in values.items()])
+        logger.info(f"Inventory value rebuilt for {len(values)} categories")
+
+    def get_valuation(self):
+        """Per-category rows, largest value first, and their total as a dict"""
+        with self.db.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+            SELECT category, medicine_count, quantity, value, cost_value
+            FROM InventoryValue
+            WHERE medicine_count != 0
+            ORDER BY value DESC
+            ''')
+            categories = cursor.fetchall()
+        total = {
+            'medicine_count': sum(row['medicine_count'] for row in categories),
+            'quantity': sum(row['quantity'] for row in categories),
+            'value': sum(row['value'] for row in categories),
+            'cost_value': sum(row['cost_value'] for row in categories),
+        }
+        return categories, total
+
+    def get_total_value(self):
+        with self.db.get_connection() as conn:
+            return conn.execute('SELECT COALESCE(SUM(value), 0) FROM InventoryValue').fetchone()[0]
+
+    def check(self):
+        """Compare the maintained values with a full recompute and repair any drift.
+
+        Runs in one write transaction, so no movement commits between the
+        recompute and the comparison. Returns a report with the categories
+        that were off.
+        """
+        started = time.perf_counter()
+        with self.db.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('BEGIN IMMEDIATE')
+            try:
+                expected = self.recompute(cursor)
+                cursor.execute('SELECT category, medicine_count, quantity, value, cost_value FROM InventoryValue')
+                stored = {row[0]: tuple(row[1:]) for row in cursor.fetchall()}
+
+                drift = {}
+                for category in expected.keys() | stored.keys():
+                    want = expected.get(category, (0, 0, 0.0, 0.0))
+                    have = stored.get(category, (0, 0, 0.0, 0.0))
+                    if any(abs(w - h) > self.tolerance for w, h in zip(want, have)):
+                        drift[category] = {'expected': want, 'stored': have}
+                if drift:
+                    self.rebuild(cursor, expected)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+        report = {'drift': drift, 'seconds': time.perf_counter() - started}
+        self.last_check = datetime.now()
+        self.last_report = report
+        if drift:
+            logger.warning(f"Inventory value drifted in {len(drift)} categories, rebuilt: {drift}")
+        else:
+            logger.info(f"Inventory value checked in {report['seconds']:.2f}s, no drift")
+        return report
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, name='inventory-valuation', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def run(self):
+        while not self.stop_event.wait(self.check_seconds):
+            try:
+                due = self.last_check is None or datetime.now() - self.last_check >= self.interval
+                if due and self.is_idle():
+                    self.check()
+            except Exception as e:
+                logger.error(f"Inventory valuation check failed: {e}")
+
+
+def main(argv=None):
+    from database_new_Architecture import Database
+
+    parser = argparse.ArgumentParser(description="Show or check the maintained inventory value")
+    parser.add_argument('command', choices=['show', 'check'])
+    parser.add_argument('--db', default='medicine_warehouse.db', help="database file")
+    args = parser.parse_args(argv)
+
+    valuation = InventoryValuation(Database(args.db))
+    if args.command == 'check':
+        report = valuation.check()
+        for category, values in report['drift'].items():
+            print(f"{category or 'Uncategorized'}: stored {values['stored']}, expected {values['expected']}")
+        print(f"{len(report['drift'])} categories repaired in {report['seconds']:.2f}s")
+
+    categories, total = valuation.get_valuation()
+    for row in categories:
+        print(f"{row['category'] or 'Uncategorized':<24}{row['medicine_count']:>6}{row['quantity']:>10}"
+              f"{row['value']:>16,.2f}{row['cost_value']:>16,.2f}")
+    print(f"{'TOTAL':<24}{total['medicine_count']:>6}{total['quantity']:>10}"
+          f"{total['value']:>16,.2f}{total['cost_value']:>16,.2f}")
+
+
+if __name__ == '__main__':
+    main()